@@ -1,19 +1,71 @@
-from django.contrib import admin
-from .models import UserProfile, TravelOption, Booking
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db.models import Q
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+from . import ids, timetable
+from .cache import bump_all_versions
+from .forms import TimetableImportForm
+from .models import (
+    UserProfile, City, CityAlias, TravelOption, Booking, Itinerary, Passenger, RouteDaySummary,
+    ArchivedTravelOption, ArchivedBooking,
+)
+from .pagination import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with millions of rows.
+    
+    Counts come from EstimatedCountPaginator, and the second, unfiltered
+    COUNT(*) behind "N total" is skipped.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        # Capped counts reach past the requested page, so deep pages stay reachable
+        try:
+            page_num = max(int(request.GET.get(PAGE_VAR, 1)), 1)
+        except ValueError:
+            page_num = 1
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page, rows_before=(page_num - 1) * per_page
+        )
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(LargeTableAdmin):
     list_display = ('user', 'phone', 'date_of_birth')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
     search_fields = ('user__username', 'user__email', 'phone')
     list_filter = ('date_of_birth',)
 
 
+class CityAliasInline(admin.TabularInline):
+    model = CityAlias
+    extra = 1
+
+
+@admin.register(City)
+class CityAdmin(admin.ModelAdmin):
+    list_display = ('name', 'name_key')
+    search_fields = ('name_key', 'aliases__alias_key')
+    inlines = [CityAliasInline]
+
+
 @admin.register(TravelOption)
-class TravelOptionAdmin(admin.ModelAdmin):
-    list_display = ('travel_id', 'type', 'source', 'destination', 'departure_date', 'departure_time', 'price', 'available_seats')
-    list_filter = ('type', 'departure_date', 'source', 'destination')
-    search_fields = ('travel_id', 'source', 'destination')
+class TravelOptionAdmin(LargeTableAdmin):
+    list_display = ('travel_id', 'type', 'source', 'destination', 'departure_date', 'departure_time', 'price', 'available_seats', 'manifest')
+    # City filters list the small City table instead of DISTINCT over every option
+    list_filter = ('type', 'departure_date', 'source_city', 'destination_city')
+    # Prefix match on the unique travel_id (also serves the booking autocomplete)
+    search_fields = ('^travel_id',)
+    # Walks travel_departure_idx (departure_date, departure_time, id)
     ordering = ('departure_date', 'departure_time')
     
     fieldsets = (
@@ -27,19 +79,85 @@ class TravelOptionAdmin(admin.ModelAdmin):
             'fields': ('price', 'total_seats', 'available_seats')
         }),
     )
+    
+    @admin.display(description='Manifest')
+    def manifest(self, obj):
+        return format_html('<a href="{}">CSV</a>', reverse('travel_manifest', args=[obj.pk]))
+    
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_timetable), name='booking_traveloption_import'),
+        ]
+        return urls + super().get_urls()
+    
+    def import_timetable(self, request):
+        """Upsert the options of an uploaded timetable file (see booking.timetable)"""
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            raise PermissionDenied
+        form = TimetableImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            rows = timetable.read_rows(timetable.open_text(form.cleaned_data['timetable']), form.file_format)
+            try:
+                result = timetable.TimetableImport().run(rows)
+            except ValidationError as e:
+                form.add_error('timetable', e)
+            else:
+                self.message_user(
+                    request,
+                    f'Imported {result.rows} rows: {result.created} created, {result.updated} updated, '
+                    f'{result.invalid} invalid.',
+                    messages.SUCCESS if not result.invalid else messages.WARNING,
+                )
+                for line, message in result.errors[:10]:
+                    self.message_user(request, f'Line {line}: {message}', messages.ERROR)
+                return redirect('admin:booking_traveloption_changelist')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import timetable',
+            'form': form,
+            'columns': timetable.COLUMNS,
+        }
+        return TemplateResponse(request, 'admin/booking/traveloption/import_timetable.html', context)
+    
+    def delete_queryset(self, request, queryset):
+        # Bulk deletes skip TravelOption.delete(), so drop every cached search
+        # and recount the day summaries the options belonged to
+        keys = list(queryset.values_list(*RouteDaySummary.KEY_FIELDS).distinct())
+        super().delete_queryset(request, queryset)
+        bump_all_versions()
+        RouteDaySummary.objects.refresh(keys)
+
+
+class PassengerInline(admin.TabularInline):
+    model = Passenger
+    fields = ('position', 'name')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(LargeTableAdmin):
     list_display = ('booking_id', 'user', 'travel_option', 'number_of_seats', 'total_price', 'status', 'booking_date')
+    list_select_related = ('user', 'travel_option')
     list_filter = ('status', 'booking_date', 'travel_option__type')
-    search_fields = ('booking_id', 'user__username', 'travel_option__travel_id')
+    # Matched exactly in get_search_results()
+    search_fields = ('booking_id', 'user__username', 'travel_option__travel_id', 'passengers__name_key')
+    search_help_text = 'Exact booking ID, username, travel ID or passenger name'
     readonly_fields = ('booking_id', 'booking_date', 'total_price')
-    ordering = ('-booking_date',)
+    autocomplete_fields = ('user', 'travel_option', 'itinerary')
+    # Ids grow with booking_date, and the primary key index needs no sort
+    ordering = ('-id',)
+    # Passengers are parsed from passenger_names whenever the booking is saved
+    inlines = [PassengerInline]
     
     fieldsets = (
         ('Booking Information', {
-            'fields': ('booking_id', 'user', 'travel_option', 'status')
+            'fields': ('booking_id', 'user', 'travel_option', 'itinerary', 'status')
         }),
         ('Travel Details', {
             'fields': ('number_of_seats', 'total_price', 'booking_date')
@@ -49,7 +167,72 @@ class BookingAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_search_results(self, request, queryset, search_term):
+        """One indexed lookup per field instead of LIKE '%term%' scans across joins"""
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        matches = (
+            Q(booking_id=ids.normalize(term))
+            | Q(user__in=User.objects.filter(username=term).values('pk'))
+            | Q(travel_option__in=TravelOption.objects.filter(travel_id=term.upper()).values('pk'))
+            | Q(pk__in=Passenger.objects.filter(name_key=Passenger.normalize(term)).values('booking_id'))
+        )
+        return queryset.filter(matches), False
+    
     def save_model(self, request, obj, form, change):
         if not change:  # If creating new booking
             obj.total_price = obj.travel_option.price * obj.number_of_seats
         super().save_model(request, obj, form, change)
+
+
+class ItineraryBookingInline(admin.TabularInline):
+    model = Booking
+    fields = ('booking_id', 'travel_option', 'number_of_seats', 'total_price', 'status')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('travel_option')
+
+
+@admin.register(Itinerary)
+class ItineraryAdmin(LargeTableAdmin):
+    list_display = ('reference', 'user', 'total_price', 'created_at')
+    list_select_related = ('user',)
+    search_fields = ('=reference', '=user__username')
+    autocomplete_fields = ('user',)
+    ordering = ('-id',)
+    readonly_fields = ('reference', 'total_price', 'created_at')
+    inlines = [ItineraryBookingInline]
+
+
+class ReadOnlyArchiveAdmin(LargeTableAdmin):
+    """Archive rows are written only by the archive_departed command"""
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedTravelOption)
+class ArchivedTravelOptionAdmin(ReadOnlyArchiveAdmin):
+    list_display = ('travel_id', 'type', 'source', 'destination', 'departure_date', 'departure_time', 'archived_at')
+    list_filter = ('type', 'departure_date')
+    search_fields = ('=travel_id',)
+    ordering = ('-departure_date', '-departure_time')
+
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(ReadOnlyArchiveAdmin):
+    list_display = ('booking_id', 'user', 'travel_option', 'number_of_seats', 'total_price', 'status', 'booking_date')
+    list_select_related = ('user', 'travel_option')
+    list_filter = ('status', 'booking_date')
+    search_fields = ('=booking_id', '=user__username', '=travel_option__travel_id')
+    ordering = ('-id',)
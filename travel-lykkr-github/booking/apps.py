@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class BookingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'booking'
+    
+    def ready(self):
+        from .metrics import install_query_recorder
+        connection_created.connect(install_query_recorder, dispatch_uid='booking.metrics.query_recorder')
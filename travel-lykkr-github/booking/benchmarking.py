@@ -0,0 +1,70 @@
+"""Small helpers shared by the benchmark management commands"""
+import json
+import threading
+import time
+
+from django.db import connection
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize_latencies(samples):
+    """Return count and p50/p95/p99/max latency in milliseconds"""
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(max(samples) * 1000, 3) if samples else 0.0,
+    }
+
+
+def run_concurrently(worker, jobs, threads):
+    """Run ``worker(job)`` for every job on ``threads`` threads released together.
+
+    Returns ``(results, elapsed_seconds)`` where results is a list of
+    ``(job, outcome, latency_seconds)``. Every thread closes its own database
+    connection when it runs out of work.
+    """
+    jobs = list(jobs)
+    results = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(threads + 1)
+
+    def run():
+        start_barrier.wait()
+        try:
+            while True:
+                with lock:
+                    if not jobs:
+                        return
+                    job = jobs.pop()
+                started = time.perf_counter()
+                outcome = worker(job)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    results.append((job, outcome, elapsed))
+        finally:
+            connection.close()
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def write_report(path, report):
+    """Write a benchmark report as JSON so runs can be diffed across commits"""
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(report, handle, indent=2, sort_keys=True, default=str)
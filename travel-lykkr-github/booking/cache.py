@@ -0,0 +1,176 @@
+"""Version counters and hit/miss statistics for the travel search cache.
+
+Search results are cached under keys that embed version numbers for the
+routes they cover. Changing seats or schedules on a route bumps that
+route's versions, which makes every cached search touching the route
+unreachable without having to find and delete the entries.
+
+Versions exist at four granularities so that partial searches stay
+precise: the exact route, every route from a source city, every route
+into a destination city, and an ``all`` scope for searches without a
+route. A global ``epoch`` is mixed into every key for bulk changes.
+
+The versions and the hit/miss counters live in their own cache alias
+(TRAVEL_SEARCH_STATE_CACHE_ALIAS), apart from the results. A results
+cache culls entries once it is full; culling a version key would let a
+later search find entries stored before the last bump.
+
+With read replicas, a bump also marks its scopes as recently bumped for
+REPLICA_PIN_SECONDS, the longest a replica is expected to lag; searches
+over those scopes fill the cache from the primary meanwhile (see
+booking.search).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+KEY_PREFIX = 'travel-search'
+# Above this many (source, destination) pairs a search keys on source versions instead
+MAX_ROUTE_KEYS = 50
+
+
+def search_cache():
+    return caches[settings.TRAVEL_SEARCH_CACHE_ALIAS]
+
+
+def state_cache():
+    return caches[settings.TRAVEL_SEARCH_STATE_CACHE_ALIAS]
+
+
+def _initial_version():
+    # Time based so a version that is evicted or lost on restart never
+    # comes back with a value an older cache entry was stored under
+    return time.time_ns() // 1000
+
+
+def _increment(cache, key, initial=1):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, initial, timeout=None):
+            return initial
+        return cache.incr(key)
+
+
+async def _aincrement(cache, key, initial=1):
+    try:
+        return await cache.aincr(key)
+    except ValueError:
+        if await cache.aadd(key, initial, timeout=None):
+            return initial
+        return await cache.aincr(key)
+
+
+def version_scopes(source_ids, destination_ids):
+    """Version scopes a search over these city id lists depends on"""
+    if source_ids is not None and destination_ids is not None:
+        if len(source_ids) * len(destination_ids) <= MAX_ROUTE_KEYS:
+            return [f"route:{s}:{d}" for s in sorted(source_ids) for d in sorted(destination_ids)]
+        return [f"src:{s}" for s in sorted(source_ids)]
+    if source_ids is not None:
+        return [f"src:{s}" for s in sorted(source_ids)]
+    if destination_ids is not None:
+        return [f"dst:{d}" for d in sorted(destination_ids)]
+    return ['all']
+
+
+def get_versions(scopes):
+    """Current version for each scope (plus the epoch), creating missing ones"""
+    cache = state_cache()
+    keys = [f"{KEY_PREFIX}:version:{scope}" for scope in ['epoch'] + list(scopes)]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        cache.add(key, _initial_version(), timeout=None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+async def aget_versions(scopes):
+    """Async version of get_versions()"""
+    cache = state_cache()
+    keys = [f"{KEY_PREFIX}:version:{scope}" for scope in ['epoch'] + list(scopes)]
+    versions = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        await cache.aadd(key, _initial_version(), timeout=None)
+    if missing:
+        versions.update(await cache.aget_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def _bump(scopes):
+    cache = state_cache()
+    for scope in scopes:
+        _increment(cache, f"{KEY_PREFIX}:version:{scope}", initial=_initial_version())
+    if settings.DATABASE_REPLICAS:
+        cache.set_many({f"{KEY_PREFIX}:bumped:{scope}": True for scope in scopes}, settings.REPLICA_PIN_SECONDS)
+
+
+def _bumped_keys(scopes):
+    return [f"{KEY_PREFIX}:bumped:{scope}" for scope in ['epoch'] + list(scopes)]
+
+
+def recently_bumped(scopes):
+    """Whether any of these scopes (or the epoch) was bumped within the last REPLICA_PIN_SECONDS"""
+    return bool(state_cache().get_many(_bumped_keys(scopes)))
+
+
+async def arecently_bumped(scopes):
+    """Async version of recently_bumped()"""
+    return bool(await state_cache().aget_many(_bumped_keys(scopes)))
+
+
+def bump_route_version(source_city_id, destination_city_id):
+    """Invalidate cached searches covering one route.
+
+    Bumps now and again after the surrounding transaction commits, so a
+    search that re-cached the pre-commit rows in between is dropped too.
+    """
+    scopes = [
+        f"route:{source_city_id}:{destination_city_id}",
+        f"src:{source_city_id}",
+        f"dst:{destination_city_id}",
+        'all',
+    ]
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def bump_all_versions():
+    """Invalidate every cached search (bulk imports, bulk deletes)"""
+    _bump(['epoch'])
+    transaction.on_commit(lambda: _bump(['epoch']))
+
+
+def record_hit():
+    _increment(state_cache(), f"{KEY_PREFIX}:hits")
+
+
+def record_miss():
+    _increment(state_cache(), f"{KEY_PREFIX}:misses")
+
+
+async def arecord_hit():
+    await _aincrement(state_cache(), f"{KEY_PREFIX}:hits")
+
+
+async def arecord_miss():
+    await _aincrement(state_cache(), f"{KEY_PREFIX}:misses")
+
+
+def search_cache_stats():
+    """Hit/miss counters shared by every process using the same cache backend"""
+    counters = state_cache().get_many([f"{KEY_PREFIX}:hits", f"{KEY_PREFIX}:misses"])
+    hits = counters.get(f"{KEY_PREFIX}:hits", 0)
+    misses = counters.get(f"{KEY_PREFIX}:misses", 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+    }
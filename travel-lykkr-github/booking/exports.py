@@ -0,0 +1,116 @@
+"""Streaming CSV extracts of bookings.
+
+Rows are read as ``values_list`` tuples in keyset chunks: each chunk is
+one query for the next ``chunk_size`` rows after the last (booking_date,
+id) seen, over booking_date_idx. Only one chunk is held at a time, so
+memory stays flat however many rows match, and no cursor or transaction
+stays open between chunks (MySQL's client would otherwise buffer a whole
+unbounded result). Rows are written to a ``csv.writer`` as they arrive,
+either to a file or to a StreamingHttpResponse.
+
+Bookings of departed trips that ``archive_departed`` moved to
+ArchivedBooking are exported too: the live and archived tables are read
+in chunks side by side and merged in the same order, as My Bookings does.
+"""
+import csv
+import heapq
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ArchivedBooking, Booking, City
+
+
+# (CSV header, values_list lookup)
+COLUMNS = (
+    ('booking_id', 'booking_id'),
+    ('booking_date', 'booking_date'),
+    ('status', 'status'),
+    ('seats', 'number_of_seats'),
+    ('total_price', 'total_price'),
+    ('travel_id', 'travel_option__travel_id'),
+    ('type', 'travel_option__type'),
+    ('source', 'travel_option__source'),
+    ('destination', 'travel_option__destination'),
+    ('departure_date', 'travel_option__departure_date'),
+    ('departure_time', 'travel_option__departure_time'),
+    ('username', 'user__username'),
+    ('contact_email', 'contact_email'),
+    ('contact_phone', 'contact_phone'),
+    ('passenger_names', 'passenger_names'),
+)
+HEADER = [header for header, _ in COLUMNS]
+CHUNK_SIZE = 2000
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def booking_export(date_from=None, date_to=None, status=None, source=None, destination=None):
+    """Live and archived bookings made between the two dates (inclusive, local time) with these filters.
+
+    Returns one queryset per table, for iter_rows(). ``source`` and
+    ``destination`` are city names or aliases; an unknown city matches
+    nothing.
+    """
+    querysets = []
+    for bookings in (Booking.objects.all(), ArchivedBooking.objects.all()):
+        if date_from:
+            bookings = bookings.filter(booking_date__gte=day_start(date_from))
+        if date_to:
+            bookings = bookings.filter(booking_date__lt=day_start(date_to + timedelta(days=1)))
+        if status:
+            bookings = bookings.filter(status=status)
+        for field, name in (('source_city', source), ('destination_city', destination)):
+            if name:
+                city = City.objects.lookup(name)
+                if city is None:
+                    bookings = bookings.none()
+                    break
+                bookings = bookings.filter(**{f'travel_option__{field}': city})
+        querysets.append(bookings)
+    return querysets
+
+
+def iter_chunks(bookings, lookups, chunk_size):
+    """Yield ``lookups`` of ``bookings`` in (booking_date, id) order, one chunk in memory at a time"""
+    rows = bookings.order_by('booking_date', 'id').values_list(*lookups)
+    date_index = lookups.index('booking_date')
+    after = Q()
+    while True:
+        chunk = list(rows.filter(after)[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last_date, last_id = chunk[-1][date_index], chunk[-1][-1]
+        after = Q(booking_date__gt=last_date) | Q(booking_date=last_date, id__gt=last_id)
+
+
+def iter_rows(querysets, chunk_size=CHUNK_SIZE):
+    """Yield the export columns of the bookings in ``querysets``, merged in (booking_date, id) order"""
+    lookups = [lookup for _, lookup in COLUMNS] + ['id']
+    date_index = lookups.index('booking_date')
+    # Archived bookings keep their ids, so (booking_date, id) is unique across both tables
+    rows = heapq.merge(
+        *(iter_chunks(bookings, lookups, chunk_size) for bookings in querysets),
+        key=lambda row: (row[date_index], row[-1]),
+    )
+    for row in rows:
+        yield row[:-1]
+
+
+class Echo:
+    """File-like object whose write() returns the line, for csv.writer in a streaming response"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, rows):
+    """CSV-encoded lines for a header and rows, generated lazily"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
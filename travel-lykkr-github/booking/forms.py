@@ -1,7 +1,9 @@
 from django import forms
+from django.utils import timezone
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .models import UserProfile, Booking, TravelOption
+from . import timetable
+from .models import UserProfile, Booking, TravelOption, City, Passenger
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Row, Column, Field
 from crispy_forms.bootstrap import FormActions
@@ -104,9 +106,36 @@ class TravelSearchForm(forms.Form):
                 Submit('submit', 'Search', css_class='btn btn-primary')
             )
         )
+    
+    def clean_source(self):
+        return City.normalize(self.cleaned_data['source'])
+    
+    def clean_destination(self):
+        return City.normalize(self.cleaned_data['destination'])
+    
+    def route_city_ids(self):
+        """Resolve the source/destination text to lists of City ids (None when blank)"""
+        source = self.cleaned_data.get('source')
+        destination = self.cleaned_data.get('destination')
+        return (
+            City.objects.ids_matching(source) if source else None,
+            City.objects.ids_matching(destination) if destination else None,
+        )
+    
+    async def aroute_city_ids(self):
+        """Async version of route_city_ids()"""
+        source = self.cleaned_data.get('source')
+        destination = self.cleaned_data.get('destination')
+        return (
+            await City.objects.aids_matching(source) if source else None,
+            await City.objects.aids_matching(destination) if destination else None,
+        )
 
 
 class BookingForm(forms.ModelForm):
+    # Sent back unchanged so a resubmitted form is not booked twice (booking.idempotency)
+    idempotency_key = forms.CharField(required=False, widget=forms.HiddenInput)
+    
     class Meta:
         model = Booking
         fields = ['number_of_seats', 'passenger_names', 'contact_email', 'contact_phone']
@@ -116,13 +145,16 @@ class BookingForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         self.travel_option = kwargs.pop('travel_option', None)
+        # Seats this user already holds on the option are theirs to book
+        self.held_seats = kwargs.pop('held_seats', 0)
         super().__init__(*args, **kwargs)
         
         if self.travel_option:
-            self.fields['number_of_seats'].widget.attrs['max'] = min(10, self.travel_option.available_seats)
+            self.fields['number_of_seats'].widget.attrs['max'] = min(10, self.seats_limit)
         
         self.helper = FormHelper()
         self.helper.layout = Layout(
+            'idempotency_key',
             'number_of_seats',
             'passenger_names',
             Row(
@@ -135,10 +167,14 @@ class BookingForm(forms.ModelForm):
             )
         )
     
+    @property
+    def seats_limit(self):
+        return self.travel_option.available_seats + self.held_seats
+    
     def clean_number_of_seats(self):
         seats = self.cleaned_data['number_of_seats']
-        if self.travel_option and seats > self.travel_option.available_seats:
-            raise forms.ValidationError(f'Only {self.travel_option.available_seats} seats available.')
+        if self.travel_option and seats > self.seats_limit:
+            raise forms.ValidationError(f'Only {self.seats_limit} seats available.')
         return seats
     
     def clean_passenger_names(self):
@@ -146,8 +182,109 @@ class BookingForm(forms.ModelForm):
         number_of_seats = self.cleaned_data.get('number_of_seats', 0)
         
         if names:
-            name_list = [name.strip() for name in names.split(',') if name.strip()]
+            name_list = Passenger.split(names)
             if len(name_list) != number_of_seats:
                 raise forms.ValidationError(f'Please provide exactly {number_of_seats} passenger names.')
         
         return names
+
+
+class ItineraryBookingForm(forms.Form):
+    """Book the same passengers on several travel options at once"""
+    MAX_LEGS = 4
+    
+    legs = forms.CharField(widget=forms.HiddenInput)
+    idempotency_key = forms.CharField(required=False, widget=forms.HiddenInput)
+    number_of_seats = forms.IntegerField(min_value=1, max_value=10, initial=1)
+    passenger_names = forms.CharField(
+        help_text="Enter passenger names separated by commas",
+        widget=forms.Textarea(attrs={'rows': 3, 'placeholder': 'Enter passenger names separated by commas'}),
+    )
+    contact_email = forms.EmailField()
+    contact_phone = forms.CharField(max_length=15)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.layout = Layout(
+            'legs',
+            'idempotency_key',
+            'number_of_seats',
+            'passenger_names',
+            Row(
+                Column('contact_email', css_class='form-group col-md-6 mb-0'),
+                Column('contact_phone', css_class='form-group col-md-6 mb-0'),
+                css_class='form-row'
+            ),
+            FormActions(
+                Submit('submit', 'Confirm Itinerary', css_class='btn btn-success')
+            )
+        )
+    
+    @staticmethod
+    def parse_legs(value):
+        """Travel options for a comma-separated list of ids, in travel order"""
+        try:
+            ids = [int(part) for part in value.split(',') if part.strip()]
+        except ValueError:
+            raise forms.ValidationError('Invalid itinerary.')
+        if len(ids) < 2 or len(ids) > ItineraryBookingForm.MAX_LEGS:
+            raise forms.ValidationError(f'An itinerary has 2 to {ItineraryBookingForm.MAX_LEGS} legs.')
+        if len(set(ids)) != len(ids):
+            raise forms.ValidationError('Each travel option can only appear once.')
+        
+        travels = list(TravelOption.objects.filter(id__in=ids).order_by('departure_date', 'departure_time'))
+        if len(travels) != len(ids):
+            raise forms.ValidationError('One of these travel options no longer exists.')
+        today = timezone.now().date()
+        for travel in travels:
+            if travel.departure_date < today:
+                raise forms.ValidationError(f'{travel.travel_id} has already departed.')
+        return travels
+    
+    def clean_legs(self):
+        return self.parse_legs(self.cleaned_data['legs'])
+    
+    def clean_number_of_seats(self):
+        seats = self.cleaned_data['number_of_seats']
+        # Fields clean in declaration order, so the legs are resolved by now
+        for travel in self.cleaned_data.get('legs', []):
+            if seats > travel.available_seats:
+                raise forms.ValidationError(f'Only {travel.available_seats} seats available on {travel.travel_id}.')
+        return seats
+    
+    def clean_passenger_names(self):
+        names = self.cleaned_data['passenger_names']
+        number_of_seats = self.cleaned_data.get('number_of_seats', 0)
+        
+        name_list = Passenger.split(names)
+        if len(name_list) != number_of_seats:
+            raise forms.ValidationError(f'Please provide exactly {number_of_seats} passenger names.')
+        
+        return names
+
+
+class TimetableImportForm(forms.Form):
+    """Admin upload for booking.timetable"""
+    timetable = forms.FileField(help_text='CSV or JSON lines (.csv, .jsonl, .ndjson), one travel option per row')
+    
+    def clean_timetable(self):
+        upload = self.cleaned_data['timetable']
+        self.file_format = timetable.format_for(upload.name)
+        return upload
+
+
+class BookingExportForm(forms.Form):
+    """Filters of the staff booking export (booking.exports); all optional"""
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+    status = forms.ChoiceField(choices=[('', 'Any')] + Booking.STATUS_CHOICES, required=False)
+    source = forms.CharField(max_length=100, required=False)
+    destination = forms.CharField(max_length=100, required=False)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from, date_to = cleaned_data.get('date_from'), cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError('The start date must not be after the end date.')
+        return cleaned_data
@@ -0,0 +1,62 @@
+"""Cached rendering of per-option template fragments.
+
+Each travel card (and the body of the detail page) is cached under the
+option id plus a digest of every field the fragment shows, together with
+the two bits of viewer state that change its markup: signed in or not,
+and still bookable or not. A price, seat or schedule change produces a
+new key, so stale fragments are never served and simply age out; nothing
+has to be deleted when an option changes.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import get_template
+
+
+FRAGMENT_TEMPLATES = {
+    'card': 'booking/includes/travel_card.html',
+    'detail': 'booking/includes/travel_detail_body.html',
+}
+# Everything the fragments display; a change to any of them changes the version
+VERSION_FIELDS = (
+    'travel_id', 'type', 'source', 'destination', 'departure_date', 'departure_time',
+    'arrival_date', 'arrival_time', 'price', 'available_seats', 'total_seats',
+)
+
+
+def fragment_cache():
+    return caches[settings.TRAVEL_CARD_CACHE_ALIAS]
+
+
+def travel_version(travel):
+    """Digest of the displayed fields of ``travel``"""
+    raw = '|'.join(str(getattr(travel, field)) for field in VERSION_FIELDS)
+    return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+
+def fragment_key(kind, travel, user):
+    viewer = 'user' if user.is_authenticated else 'anon'
+    bookable = 'open' if travel.is_available else 'closed'
+    return f"travel-fragment:{kind}:{travel.pk}:{travel_version(travel)}:{viewer}:{bookable}"
+
+
+def render_fragments(kind, travels, user):
+    """Rendered ``kind`` fragments for ``travels`` in order, rendering only cache misses"""
+    template = get_template(FRAGMENT_TEMPLATES[kind])
+    if not settings.TRAVEL_CARD_CACHE:
+        return [template.render({'travel': travel, 'user': user}) for travel in travels]
+
+    cache = fragment_cache()
+    keys = [fragment_key(kind, travel, user) for travel in travels]
+    cached = cache.get_many(keys)
+    rendered = {}
+    fragments = []
+    for key, travel in zip(keys, travels):
+        html = cached.get(key)
+        if html is None:
+            html = rendered[key] = template.render({'travel': travel, 'user': user})
+        fragments.append(html)
+    if rendered:
+        cache.set_many(rendered, settings.TRAVEL_CARD_CACHE_TIMEOUT)
+    return fragments
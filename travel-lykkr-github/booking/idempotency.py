@@ -0,0 +1,128 @@
+"""Idempotency keys for the booking and cancellation POSTs.
+
+Clients on flaky networks resend POSTs whose response they never saw.
+A view wrapped in ``idempotent(scope)`` claims the request's key in the
+same transaction as its own writes and, once it has recorded what it did
+with ``remember()``, stores where it redirected to. A retry with the same
+key is answered from that record without running the view again, so no
+TravelOption row is touched twice. Failed attempts store nothing and can
+simply be retried.
+
+A record also stores a fingerprint of the path and form fields the key
+came with. A key reused for a different request (another travel option,
+booking or set of legs) gets a 422 instead of the earlier, unrelated
+outcome.
+"""
+import hashlib
+import json
+import uuid
+from functools import wraps
+
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.http.response import HttpResponseRedirectBase
+from django.shortcuts import redirect
+
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+FIELD = 'idempotency_key'
+MAX_LENGTH = 64
+# Form fields that differ between identical retries
+UNFINGERPRINTED_FIELDS = {FIELD, 'csrfmiddlewaretoken'}
+
+
+def new_key():
+    """A fresh key for the hidden form field of a page that POSTs"""
+    return uuid.uuid4().hex
+
+
+def request_key(request):
+    """The key sent with a POST (header first, then form field), or None"""
+    key = request.headers.get(HEADER) or request.POST.get(FIELD) or ''
+    return key.strip() or None
+
+
+def request_fingerprint(request):
+    """Digest of the path and the form fields of a POST"""
+    fields = sorted(
+        (name, values) for name, values in request.POST.lists() if name not in UNFINGERPRINTED_FIELDS
+    )
+    raw = json.dumps([request.path, fields])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def remember(request, booking=None, itinerary=None):
+    """Mark the outcome of the current request as complete, to be replayed on retries"""
+    record = getattr(request, 'idempotency_record', None)
+    if record is not None:
+        record.booking = booking
+        record.itinerary = itinerary
+        record.completed = True
+
+
+def replay(request, record, fingerprint):
+    # Keys stored before fingerprints were recorded have none to compare
+    if record.fingerprint and record.fingerprint != fingerprint:
+        return HttpResponse(
+            f'This {HEADER} was already used for a different request; send a new key.',
+            status=422,
+            content_type='text/plain',
+        )
+    if record.itinerary_id:
+        messages.info(request, f'Itinerary {record.itinerary.reference} was already booked; this request was not repeated.')
+    elif record.booking_id:
+        messages.info(request, f'Booking {record.booking.booking_id} was already processed; this request was not repeated.')
+    else:
+        messages.info(request, 'This request was already processed.')
+    return redirect(record.location)
+
+
+def idempotent(scope):
+    """Replay the stored outcome of POSTs that repeat an idempotency key.
+
+    Requests without a key run as before. Apply inside login_required.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request_key(request) if request.method == 'POST' else None
+            if key is None:
+                return view(request, *args, **kwargs)
+            if len(key) > MAX_LENGTH:
+                return HttpResponseBadRequest(f'{HEADER} must be at most {MAX_LENGTH} characters.')
+
+            fingerprint = request_fingerprint(request)
+            records = IdempotencyKey.objects.select_related('booking', 'itinerary').filter(
+                user=request.user, scope=scope, key=key
+            )
+            previous = records.first()
+            if previous is not None:
+                return replay(request, previous, fingerprint)
+
+            try:
+                with transaction.atomic():
+                    # Claim the key before the view writes anything: a concurrent
+                    # retry blocks on the unique index until this one commits
+                    record = IdempotencyKey.objects.create(
+                        user=request.user, scope=scope, key=key, location='', fingerprint=fingerprint
+                    )
+                    record.completed = False
+                    request.idempotency_record = record
+                    response = view(request, *args, **kwargs)
+                    if record.completed and isinstance(response, HttpResponseRedirectBase):
+                        record.location = response['Location']
+                        record.save(update_fields=['booking', 'itinerary', 'location'])
+                    else:
+                        # Nothing to replay; let a retry run the view again
+                        record.delete()
+                    return response
+            except IntegrityError:
+                previous = records.first()
+                if previous is None:
+                    raise
+                return replay(request, previous, fingerprint)
+        return wrapper
+    return decorator
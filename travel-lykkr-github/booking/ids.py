@@ -0,0 +1,74 @@
+"""Short, time-ordered public ids for bookings and itineraries.
+
+An id is a two letter prefix, 9 Crockford base32 characters of
+milliseconds since 2024-01-01 and 5 more for a per-millisecond sequence,
+e.g. ``BK01JC8Z3QW7K2D``. New ids sort after older ones, so inserts land
+on the right-hand edge of the unique index instead of at random pages.
+
+Each process starts every millisecond's sequence at a random value and
+counts up from there, so ids from one process never repeat and two
+processes only clash if they pick neighbouring sequences in the same
+millisecond. Booking.save() retries on the unique index for that case.
+
+Ids issued before this scheme (``BK`` + 8 hex digits, 10 characters)
+stay valid as they are: they are shorter than new ids, so the two
+schemes can never produce the same value.
+"""
+import secrets
+import threading
+import time
+
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+TIME_CHARS = 9  # 45 bits of milliseconds, enough until the year 3139
+SEQUENCE_CHARS = 5  # 25 bits
+SEQUENCE_LIMIT = 1 << (5 * SEQUENCE_CHARS)
+
+# Typed-in ids: Crockford base32 reads I and L as 1 and O as 0
+_TYPO_TABLE = str.maketrans({'I': '1', 'L': '1', 'O': '0'})
+
+
+def encode(number, length):
+    chars = []
+    for _ in range(length):
+        number, remainder = divmod(number, 32)
+        chars.append(ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+
+class IdGenerator:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_ms = -1
+        self.sequence = 0
+
+    def __call__(self, prefix):
+        with self.lock:
+            now = int(time.time() * 1000) - EPOCH_MS
+            if now > self.last_ms:
+                # Start low enough in the range to leave room for the ids after it
+                self.last_ms, self.sequence = now, secrets.randbelow(SEQUENCE_LIMIT // 2)
+            else:
+                # Same millisecond, or the clock stepped back: keep counting up
+                self.sequence += 1
+                if self.sequence == SEQUENCE_LIMIT:
+                    self.last_ms, self.sequence = self.last_ms + 1, secrets.randbelow(SEQUENCE_LIMIT // 2)
+            return prefix + encode(self.last_ms, TIME_CHARS) + encode(self.sequence, SEQUENCE_CHARS)
+
+
+new_id = IdGenerator()
+
+
+def new_booking_id():
+    return new_id('BK')
+
+
+def new_itinerary_reference():
+    return new_id('IT')
+
+
+def normalize(public_id):
+    """Undo the usual typing slips in an id (case, O for 0, I or L for 1)"""
+    public_id = public_id.strip().upper()
+    return public_id[:2] + public_id[2:].translate(_TYPO_TABLE)
@@ -0,0 +1,74 @@
+import time as clock
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from booking.models import ArchivedTravelOption, RouteDaySummary
+
+
+class Command(BaseCommand):
+    help = (
+        'Move departed travel options and their bookings into the archive tables in small '
+        'transactions (run daily)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='Archive options that departed more than this many days ago',
+        )
+        parser.add_argument(
+            '--before',
+            type=date.fromisoformat,
+            help='Archive options departing before this date (YYYY-MM-DD) instead; must not be in the future',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Travel options moved per transaction',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help='Seconds to sleep between transactions, to leave the database to live traffic',
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        cutoff = options['before'] or today - timedelta(days=options['days'])
+        if cutoff > today:
+            raise CommandError('Only departed travel options can be archived.')
+
+        started = clock.perf_counter()
+        last_report = started
+        moved_options = moved_bookings = 0
+        while True:
+            options_moved, bookings_moved = ArchivedTravelOption.objects.archive_chunk(cutoff, options['batch_size'])
+            if not options_moved:
+                break
+            moved_options += options_moved
+            moved_bookings += bookings_moved
+
+            now = clock.perf_counter()
+            if now - last_report >= 5:
+                last_report = now
+                self.stdout.write(
+                    f'{moved_options} travel options, {moved_bookings} bookings '
+                    f'({(moved_options + moved_bookings) / (now - started):,.0f} rows/s)'
+                )
+            if options['pause']:
+                clock.sleep(options['pause'])
+
+        # Nothing reads summaries of past days
+        RouteDaySummary.objects.filter(departure_date__lt=cutoff).delete()
+
+        elapsed = clock.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved_options} travel options and {moved_bookings} bookings departing before '
+            f'{cutoff} in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time as clock
+from io import BytesIO
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.urls import reverse
+from django.utils import timezone
+
+from booking.benchmarking import run_concurrently, summarize_latencies, write_report
+from booking.models import City, TravelOption
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare WSGI and ASGI throughput of the browsing views (travel_list, travel_detail) at high '
+        'concurrency. Each mode runs in its own process and drives the WSGI or ASGI handler directly, '
+        'as a server would, without network overhead'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per mode')
+        parser.add_argument('--concurrency', type=int, default=100,
+                            help='Requests in flight: WSGI threads, or concurrent ASGI tasks on one event loop')
+        parser.add_argument('--detail-ratio', type=float, default=0.3, help='Share of travel_detail requests')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the request mix')
+        parser.add_argument('--host', default='localhost', help='Host header sent with every request')
+        parser.add_argument('--mode', choices=['both', 'wsgi', 'asgi'], default='both')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        self.options = options
+        if options['mode'] == 'both':
+            report = {mode: self.run_child(mode) for mode in ('wsgi', 'asgi')}
+            report['asgi_speedup'] = (
+                round(report['asgi']['requests_per_s'] / report['wsgi']['requests_per_s'], 2)
+                if report['wsgi']['requests_per_s'] else None
+            )
+        else:
+            expected = options['mode'] == 'asgi'
+            if settings.BOOKING_ASYNC_VIEWS != expected:
+                raise CommandError(f"Run --mode {options['mode']} with BOOKING_ASYNC_VIEWS={int(expected)}.")
+            report = {options['mode']: self.run_mode(options['mode'])}
+
+        if options['output']:
+            write_report(options['output'], report)
+        self.print_report(report)
+
+    def run_child(self, mode):
+        """Run one mode in a fresh process so the URLconf picks the matching views"""
+        env = dict(os.environ, BOOKING_ASYNC_VIEWS='1' if mode == 'asgi' else '0')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+            command = [
+                sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_async_views',
+                '--mode', mode, '--output', path,
+                '--requests', str(self.options['requests']),
+                '--concurrency', str(self.options['concurrency']),
+                '--detail-ratio', str(self.options['detail_ratio']),
+                '--seed', str(self.options['seed']),
+                '--host', self.options['host'],
+            ]
+            if self.options['settings']:
+                command += ['--settings', self.options['settings']]
+            subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+            with open(path, encoding='utf-8') as handle:
+                return json.load(handle)[mode]
+
+    def build_requests(self):
+        rng = random.Random(self.options['seed'])
+        detail_ids = list(
+            TravelOption.objects.filter(departure_date__gte=timezone.now().date())
+            .order_by('id').values_list('id', flat=True)[:5000]
+        )
+        city_names = list(City.objects.values_list('name', flat=True))
+        if not detail_ids or not city_names:
+            raise CommandError('No upcoming travel options; run populate_sample_data first.')
+
+        requests = []
+        for _ in range(self.options['requests']):
+            if rng.random() < self.options['detail_ratio']:
+                requests.append((reverse('travel_detail', args=[rng.choice(detail_ids)]), ''))
+            else:
+                query = f"source={rng.choice(city_names)[:3]}&page={rng.randint(1, 3)}"
+                requests.append((reverse('travel_list'), query))
+        return requests
+
+    def run_mode(self, mode):
+        requests = self.build_requests()
+        if mode == 'wsgi':
+            app = get_wsgi_application()
+            results, elapsed = run_concurrently(
+                lambda request: self.wsgi_request(app, *request), requests, self.options['concurrency']
+            )
+        else:
+            app = get_asgi_application()
+            results, elapsed = asyncio.run(self.run_asgi(app, requests))
+
+        latencies = [latency for _, _, latency in results]
+        report = summarize_latencies(latencies)
+        report.update({
+            'concurrency': self.options['concurrency'],
+            'elapsed_s': round(elapsed, 3),
+            'requests_per_s': round(len(results) / elapsed, 1) if elapsed else 0.0,
+            'errors': sum(1 for _, status, _ in results if status >= 400),
+        })
+        return report
+
+    def wsgi_request(self, app, path, query):
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.options['host'],
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': self.options['host'],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        status = []
+        response = app(environ, lambda line, headers, exc_info=None: status.append(int(line.split()[0])))
+        try:
+            b''.join(response)
+        finally:
+            # Fires request_finished, which closes the connection as under a real server
+            response.close()
+        return status[0]
+
+    async def run_asgi(self, app, requests):
+        semaphore = asyncio.Semaphore(self.options['concurrency'])
+        results = []
+
+        async def run(request):
+            async with semaphore:
+                started = clock.perf_counter()
+                status = await self.asgi_request(app, *request)
+                results.append((request, status, clock.perf_counter() - started))
+
+        started = clock.perf_counter()
+        await asyncio.gather(*(run(request) for request in requests))
+        return results, clock.perf_counter() - started
+
+    async def asgi_request(self, app, path, query):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'headers': [(b'host', self.options['host'].encode())],
+            'server': (self.options['host'], 80),
+            'client': ('127.0.0.1', 0),
+        }
+        body_sent = False
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # Django listens for a disconnect while the view runs; the client never leaves
+            await asyncio.Event().wait()
+
+        status = []
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await app(scope, receive, send)
+        return status[0]
+
+    def print_report(self, report):
+        self.stdout.write(f"{'mode':<6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for mode in ('wsgi', 'asgi'):
+            if mode in report:
+                stats = report[mode]
+                self.stdout.write(
+                    f"{mode:<6}{stats['requests_per_s']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+                    f"{stats['p99_ms']:>10}{stats['errors']:>8}"
+                )
+        if report.get('asgi_speedup') is not None:
+            self.stdout.write(self.style.SUCCESS(f"ASGI / WSGI throughput: {report['asgi_speedup']}x"))
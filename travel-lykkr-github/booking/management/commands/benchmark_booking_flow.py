@@ -0,0 +1,259 @@
+import random
+import subprocess
+from collections import defaultdict
+from datetime import timedelta
+import time as clock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.paginator import Paginator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from booking.benchmarking import run_concurrently, summarize_latencies, write_report
+from booking.forms import TravelSearchForm
+from booking.fragments import fragment_cache
+from booking.metrics import QueryTimer
+from booking.models import Booking, TravelOption
+
+
+BENCH_USER_PREFIX = 'bench_user_'
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay a mix of user sessions (search, detail, book, my_bookings, cancel) against the '
+        'booking views in-process and report throughput, latency and queries per view'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=200, help='Number of user sessions to replay')
+        parser.add_argument('--concurrency', type=int, default=10, help='Sessions running at once')
+        parser.add_argument('--users', type=int, default=50, help='Benchmark users to spread sessions over')
+        parser.add_argument('--hot-options', type=int, default=20,
+                            help='Bookings target this many options, so buyers contend for seats')
+        parser.add_argument('--book-ratio', type=float, default=0.4, help='Share of sessions that book')
+        parser.add_argument('--cancel-ratio', type=float, default=0.3, help='Share of bookings cancelled again')
+        parser.add_argument('--seed', type=int, help='Random seed for the session mix')
+        parser.add_argument('--host', default='localhost', help='Host header sent with every request')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--keep-bookings', action='store_true',
+                            help='Leave the benchmark bookings in place instead of cancelling them')
+        parser.add_argument('--card-render-pages', type=int, default=0,
+                            help='Also time rendering this many travel_list pages without, cold and warm card cache')
+
+    def handle(self, *args, **options):
+        self.options = options
+        rng = random.Random(options['seed'])
+
+        # Bookings need at least 24 hours of headroom so they can be cancelled again
+        upcoming = TravelOption.objects.filter(
+            departure_date__gt=timezone.now().date() + timedelta(days=1),
+            available_seats__gt=0,
+        ).order_by('id')
+        pool = list(upcoming.values_list('id', 'source', 'destination')[:5000])
+        if not pool:
+            raise CommandError('No upcoming travel options; run populate_sample_data first.')
+        self.detail_ids = [row[0] for row in pool]
+        self.hot_ids = rng.sample(self.detail_ids, min(options['hot_options'], len(self.detail_ids)))
+        self.routes = sorted({(row[1], row[2]) for row in pool})
+        self.users = self.bench_users(options['users'])
+
+        jobs = [(n, rng.randrange(2 ** 32)) for n in range(options['sessions'])]
+        results, elapsed = run_concurrently(self.run_session, jobs, options['concurrency'])
+
+        report = self.build_report([sample for _, samples, _ in results for sample in samples], elapsed)
+        if options['card_render_pages']:
+            report['card_rendering'] = self.compare_card_rendering(upcoming, options['card_render_pages'])
+        if not options['keep_bookings']:
+            report['cleanup_cancelled'] = self.cancel_bench_bookings()
+
+        if options['output']:
+            write_report(options['output'], report)
+        self.print_report(report)
+
+    def bench_users(self, total):
+        existing = {user.username: user for user in User.objects.filter(username__startswith=BENCH_USER_PREFIX)}
+        users = []
+        for n in range(total):
+            username = f'{BENCH_USER_PREFIX}{n:04d}'
+            user = existing.get(username)
+            if user is None:
+                user = User(username=username, email=f'{username}@example.com')
+                user.set_unusable_password()
+                user.save()
+            users.append(user)
+        return users
+
+    def run_session(self, job):
+        number, seed = job
+        rng = random.Random(seed)
+        user = self.users[number % len(self.users)]
+        # Server errors (e.g. "database is locked") come back as 500s instead of killing the thread
+        client = Client(HTTP_HOST=self.options['host'], raise_request_exception=False)
+        samples = []
+        try:
+            client.force_login(user)
+        except DatabaseError:
+            return [('session', 'login_error')]
+
+        source, destination = rng.choice(self.routes)
+        self.request(client, samples, 'get', reverse('travel_list'), {'source': source})
+        self.request(client, samples, 'get', reverse('travel_list'), {'source': source, 'destination': destination})
+        self.request(client, samples, 'get', reverse('travel_detail', args=[rng.choice(self.detail_ids)]))
+
+        if rng.random() < self.options['book_ratio']:
+            travel_id = rng.choice(self.hot_ids)
+            self.request(client, samples, 'get', reverse('book_travel', args=[travel_id]))
+            seats = rng.randint(1, 3)
+            response = self.request(client, samples, 'post', reverse('book_travel', args=[travel_id]), {
+                'number_of_seats': seats,
+                'passenger_names': ', '.join(f'Bench Passenger {i + 1}' for i in range(seats)),
+                'contact_email': user.email,
+                'contact_phone': '9000000000',
+            })
+            booked = response.status_code == 302 and response['Location'] == reverse('my_bookings')
+            samples.append(('booking', 'confirmed' if booked else 'conflict'))
+
+            self.request(client, samples, 'get', reverse('my_bookings'))
+            if booked and rng.random() < self.options['cancel_ratio']:
+                booking_id = Booking.objects.filter(
+                    user=user, travel_option_id=travel_id, status='confirmed'
+                ).values_list('booking_id', flat=True).first()
+                if booking_id:
+                    self.request(client, samples, 'get', reverse('cancel_booking', args=[booking_id]))
+                    self.request(client, samples, 'post', reverse('cancel_booking', args=[booking_id]))
+                    samples.append(('cancellation', 'done'))
+        else:
+            self.request(client, samples, 'get', reverse('my_bookings'))
+        return samples
+
+    def request(self, client, samples, method, path, data=None):
+        counter = QueryTimer()
+        started = clock.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = getattr(client, method)(path, data or {})
+        elapsed = clock.perf_counter() - started
+        view = resolve(path).url_name
+        if method == 'post':
+            view += ' (POST)'
+        samples.append(('request', {
+            'view': view,
+            'status': response.status_code,
+            'seconds': elapsed,
+            'queries': counter.count,
+            'db_seconds': counter.seconds,
+        }))
+        return response
+
+    def build_report(self, samples, elapsed):
+        per_view = defaultdict(list)
+        outcomes = defaultdict(int)
+        for kind, value in samples:
+            if kind == 'request':
+                per_view[value['view']].append(value)
+            else:
+                outcomes[f'{kind}_{value}'] += 1
+
+        views = {}
+        for view, requests in sorted(per_view.items()):
+            stats = summarize_latencies([r['seconds'] for r in requests])
+            stats['queries_per_request'] = round(sum(r['queries'] for r in requests) / len(requests), 2)
+            stats['db_ms_per_request'] = round(sum(r['db_seconds'] for r in requests) / len(requests) * 1000, 3)
+            stats['errors'] = sum(1 for r in requests if r['status'] >= 500)
+            views[view] = stats
+
+        total = sum(len(requests) for requests in per_view.values())
+        return {
+            'commit': self.git_revision(),
+            'database': connection.vendor,
+            'sessions': self.options['sessions'],
+            'concurrency': self.options['concurrency'],
+            'seed': self.options['seed'],
+            'elapsed_s': round(elapsed, 3),
+            'requests': total,
+            'requests_per_s': round(total / elapsed, 1) if elapsed else 0.0,
+            'bookings_confirmed': outcomes['booking_confirmed'],
+            'booking_conflicts': outcomes['booking_conflict'],
+            'cancellations': outcomes['cancellation_done'],
+            'login_errors': outcomes['session_login_error'],
+            'views': views,
+        }
+
+    def compare_card_rendering(self, queryset, pages):
+        """Milliseconds to render travel_list pages with the card cache off, cold and warm.
+
+        The pages are fetched up front, so only template rendering is timed.
+        """
+        paginator = Paginator(queryset, 10)
+        page_objs = []
+        for number in range(1, min(pages, paginator.num_pages) + 1):
+            page_obj = paginator.page(number)
+            page_obj.object_list = list(page_obj.object_list)
+            page_objs.append(page_obj)
+        request = RequestFactory().get(reverse('travel_list'), HTTP_HOST=self.options['host'])
+        request.user = AnonymousUser()
+        form = TravelSearchForm({})
+
+        def render_all():
+            timings = []
+            for page_obj in page_objs:
+                started = clock.perf_counter()
+                render_to_string('booking/travel_list.html', {
+                    'form': form, 'page_obj': page_obj, 'travels': page_obj,
+                }, request)
+                timings.append(clock.perf_counter() - started)
+            return summarize_latencies(timings)
+
+        with override_settings(TRAVEL_CARD_CACHE=False):
+            uncached = render_all()
+        fragment_cache().clear()
+        cold = render_all()
+        warm = render_all()
+        return {'pages': len(page_objs), 'uncached': uncached, 'cold': cold, 'warm': warm}
+
+    def cancel_bench_bookings(self):
+        cancelled = 0
+        bookings = Booking.objects.select_related('travel_option').filter(
+            user__username__startswith=BENCH_USER_PREFIX, status='confirmed'
+        )
+        for booking in bookings:
+            with transaction.atomic():
+                cancelled += booking.cancel()
+        return cancelled
+
+    @staticmethod
+    def git_revision():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['requests']} requests from {report['sessions']} sessions in {report['elapsed_s']}s "
+            f"({report['requests_per_s']} req/s, concurrency {report['concurrency']})"
+        )
+        self.stdout.write(f"{'view':<24}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'errors':>8}")
+        for view, stats in report['views'].items():
+            self.stdout.write(
+                f"{view:<24}{stats['count']:>7}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+                f"{stats['p99_ms']:>10}{stats['queries_per_request']:>9}{stats['errors']:>8}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Bookings confirmed {report['bookings_confirmed']}, conflicts {report['booking_conflicts']}, "
+            f"cancellations {report['cancellations']}"
+        ))
+        if 'card_rendering' in report:
+            rendering = report['card_rendering']
+            self.stdout.write(f"travel_list render over {rendering['pages']} pages (p50 / p95 ms):")
+            for label in ('uncached', 'cold', 'warm'):
+                stats = rendering[label]
+                self.stdout.write(f"  card cache {label:<9}{stats['p50_ms']:>10}{stats['p95_ms']:>10}")
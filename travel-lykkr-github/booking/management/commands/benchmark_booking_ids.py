@@ -0,0 +1,103 @@
+import time as clock
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from booking.benchmarking import write_report
+from booking.ids import new_booking_id
+from booking.models import Booking, TravelOption
+
+
+BENCH_USERNAME = 'bench_booking_ids'
+
+
+def legacy_booking_id():
+    """The id scheme Booking.save() used before booking.ids"""
+    return f"BK{str(uuid.uuid4().hex)[:8].upper()}"
+
+
+SCHEMES = {
+    'uuid4': legacy_booking_id,
+    'time_ordered': new_booking_id,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare booking insert throughput with random uuid4-prefix ids and time-ordered ids. '
+        'Rows are inserted in batched transactions into the real bookings table and deleted afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Bookings inserted per scheme')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT and transaction')
+        parser.add_argument('--scheme', choices=['both', *SCHEMES], default='both')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        travel = TravelOption.objects.order_by('id').first()
+        if travel is None:
+            raise CommandError('No travel options; run populate_sample_data first.')
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME, defaults={'email': 'bench@example.com'})
+        Booking.objects.filter(user=user).delete()
+
+        schemes = list(SCHEMES) if options['scheme'] == 'both' else [options['scheme']]
+        report = {
+            'database': connection.vendor,
+            'rows': options['rows'],
+            'batch_size': options['batch_size'],
+            'existing_bookings': Booking.objects.count(),
+        }
+        for scheme in schemes:
+            try:
+                report[scheme] = self.run_scheme(SCHEMES[scheme], travel, user, options['rows'], options['batch_size'])
+            finally:
+                Booking.objects.filter(user=user).delete()
+
+        if options['output']:
+            write_report(options['output'], report)
+        self.stdout.write(f"{'scheme':<14}{'rows/s':>12}{'id us':>10}{'collisions':>12}")
+        for scheme in schemes:
+            stats = report[scheme]
+            self.stdout.write(
+                f"{scheme:<14}{stats['rows_per_s']:>12}{stats['id_us']:>10}{stats['collisions']:>12}"
+            )
+
+    def run_scheme(self, generate, travel, user, rows, batch_size):
+        started = clock.perf_counter()
+        ids = [generate() for _ in range(rows)]
+        id_seconds = clock.perf_counter() - started
+
+        # Clashes the old scheme silently risked; bulk_create would fail on them
+        collisions = len(ids) - len(set(ids))
+        ids = list(dict.fromkeys(ids))
+
+        now = timezone.now()
+        started = clock.perf_counter()
+        for start in range(0, len(ids), batch_size):
+            with transaction.atomic():
+                Booking.objects.bulk_create([
+                    Booking(
+                        booking_id=booking_id,
+                        user=user,
+                        travel_option=travel,
+                        number_of_seats=1,
+                        total_price=travel.price,
+                        booking_date=now,
+                        status='cancelled',
+                        passenger_names='Bench Passenger',
+                        contact_email='bench@example.com',
+                        contact_phone='0000000000',
+                    )
+                    for booking_id in ids[start:start + batch_size]
+                ])
+        elapsed = clock.perf_counter() - started
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'rows_per_s': round(len(ids) / elapsed, 1) if elapsed else 0.0,
+            'id_us': round(id_seconds / rows * 1e6, 3) if rows else 0.0,
+            'collisions': collisions,
+        }
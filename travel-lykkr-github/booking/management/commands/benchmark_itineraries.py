@@ -0,0 +1,154 @@
+import random
+from collections import Counter
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+from django.db.models import Count, Sum
+
+from booking.benchmarking import run_concurrently, summarize_latencies, write_report
+from booking.models import Booking, Itinerary, RouteDaySummary, SeatsUnavailable, TravelOption
+
+
+BENCH_TRAVEL_PREFIX = 'BENCHLEG'
+BENCH_USERNAME = 'bench_itinerary'
+ROUTES = [('Mumbai', 'Delhi'), ('Delhi', 'Mumbai'), ('Delhi', 'Chennai'), ('Chennai', 'Mumbai')]
+
+
+class Command(BaseCommand):
+    help = (
+        'Book many overlapping multi-leg itineraries at once and report throughput, deadlocks, '
+        'oversold seats and partially booked itineraries'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--itineraries', type=int, default=300, help='Number of itinerary booking attempts')
+        parser.add_argument('--threads', type=int, default=20, help='Number of concurrent buyers')
+        parser.add_argument('--options', type=int, default=6,
+                            help='Travel options the itineraries are drawn from; fewer means more overlap')
+        parser.add_argument('--max-legs', type=int, default=3, help='Legs per itinerary (at least 2)')
+        parser.add_argument('--capacity', type=int, default=100, help='Seats on each benchmark option')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the itineraries')
+        parser.add_argument('--output', help='Write the report as JSON to this file')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark options and bookings')
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME, defaults={'email': 'bench@example.com'})
+        self.cleanup(user)
+        travels = self.create_options(options['options'], options['capacity'])
+
+        # Legs are shuffled so buyers ask for the same options in different orders
+        rng = random.Random(options['seed'])
+        jobs = []
+        for _ in range(options['itineraries']):
+            legs = rng.sample(travels, rng.randint(2, max(2, min(options['max_legs'], len(travels)))))
+            seats = rng.randint(1, 3)
+            jobs.append([(travel, seats, ', '.join(['Bench Passenger'] * seats)) for travel in legs])
+
+        def worker(legs):
+            try:
+                itinerary = Itinerary.objects.book(user, legs, 'bench@example.com', '0000000000')
+            except SeatsUnavailable:
+                return 'sold_out'
+            except DatabaseError as e:
+                return 'deadlock' if 'deadlock' in str(e).lower() else 'error'
+            return ('booked', itinerary.pk)
+
+        results, elapsed = run_concurrently(worker, jobs, options['threads'])
+
+        outcomes = Counter(outcome if isinstance(outcome, str) else outcome[0] for _, outcome, _ in results)
+        report = {
+            'attempts': options['itineraries'],
+            'threads': options['threads'],
+            'options': len(travels),
+            'capacity': options['capacity'],
+            'outcomes': dict(outcomes),
+            'elapsed_s': round(elapsed, 3),
+            'itineraries_per_s': round(len(results) / elapsed, 1) if elapsed else 0.0,
+            'latency': summarize_latencies([latency for _, _, latency in results]),
+        }
+        report.update(self.check_consistency(travels, options['capacity'], results))
+
+        if not options['keep']:
+            self.cleanup(user)
+
+        if options['output']:
+            write_report(options['output'], report)
+
+        self.stdout.write(
+            f"{report['attempts']} itineraries on {report['threads']} threads over {report['options']} options "
+            f"in {report['elapsed_s']}s ({report['itineraries_per_s']}/s), outcomes {report['outcomes']}"
+        )
+        self.stdout.write(
+            f"p50 {report['latency']['p50_ms']}ms, p95 {report['latency']['p95_ms']}ms, "
+            f"p99 {report['latency']['p99_ms']}ms"
+        )
+        clean = not any(report[key] for key in ('oversold_seats', 'lost_updates', 'partial_itineraries', 'summary_drift'))
+        style = self.style.SUCCESS if clean and not outcomes['deadlock'] else self.style.ERROR
+        self.stdout.write(style(
+            f"Deadlocks {outcomes['deadlock']}, oversold {report['oversold_seats']}, "
+            f"lost updates {report['lost_updates']}, partial itineraries {report['partial_itineraries']}, "
+            f"summary drift {report['summary_drift']}"
+        ))
+
+    def create_options(self, count, capacity):
+        travels = []
+        for n in range(count):
+            source, destination = ROUTES[n % len(ROUTES)]
+            departure = date.today() + timedelta(days=30 + n % 3)
+            travels.append(TravelOption.objects.create(
+                travel_id=f'{BENCH_TRAVEL_PREFIX}{n + 1:03d}',
+                type='flight',
+                source=source,
+                destination=destination,
+                departure_date=departure,
+                departure_time=time(6 + n % 12, 0),
+                arrival_date=departure,
+                arrival_time=time(8 + n % 12, 0),
+                price=Decimal('2999.00'),
+                available_seats=capacity,
+                total_seats=capacity,
+            ))
+        return travels
+
+    def check_consistency(self, travels, capacity, results):
+        """Seats, legs and summaries must all add up once the buyers are done"""
+        booked = dict(
+            Booking.objects.filter(travel_option__in=travels, status='confirmed')
+            .values('travel_option').annotate(seats=Sum('number_of_seats'))
+            .values_list('travel_option', 'seats')
+        )
+        oversold = lost = 0
+        for travel in travels:
+            travel.refresh_from_db(fields=['available_seats'])
+            seats = booked.get(travel.pk, 0)
+            oversold += max(0, seats - capacity)
+            lost += abs((capacity - seats) - travel.available_seats)
+
+        expected_legs = {outcome[1]: len(job) for job, outcome, _ in results if not isinstance(outcome, str)}
+        legs = dict(
+            Itinerary.objects.filter(pk__in=expected_legs).annotate(legs=Count('bookings')).values_list('pk', 'legs')
+        )
+        partial = sum(1 for pk, count in expected_legs.items() if legs.get(pk) != count)
+
+        drift = 0
+        for key in {travel.summary_key for travel in travels}:
+            lookup = dict(zip(RouteDaySummary.KEY_FIELDS, key))
+            expected = TravelOption.objects.filter(**lookup).aggregate(seats=Sum('available_seats'))['seats']
+            actual = RouteDaySummary.objects.filter(**lookup).values_list('available_seats', flat=True).first()
+            drift += abs((expected or 0) - (actual or 0))
+
+        return {
+            'seats_booked': sum(booked.values()),
+            'oversold_seats': oversold,
+            'lost_updates': lost,
+            'partial_itineraries': partial,
+            'summary_drift': drift,
+        }
+
+    def cleanup(self, user):
+        for travel in TravelOption.objects.filter(travel_id__startswith=BENCH_TRAVEL_PREFIX):
+            travel.delete()
+        Itinerary.objects.filter(user=user).delete()
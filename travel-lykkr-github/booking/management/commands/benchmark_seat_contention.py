@@ -0,0 +1,137 @@
+from collections import Counter
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, transaction
+from django.db.models import Sum
+
+from booking.benchmarking import run_concurrently, summarize_latencies, write_report
+from booking.models import TravelOption, Booking
+
+
+BENCH_TRAVEL_ID = 'BENCHSEAT001'
+
+
+class Command(BaseCommand):
+    help = 'Fire many simultaneous bookings at one travel option and report throughput and oversells'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=300, help='Number of booking attempts')
+        parser.add_argument('--threads', type=int, default=50, help='Number of concurrent buyers')
+        parser.add_argument('--capacity', type=int, default=100, help='Seats on the benchmark option')
+        parser.add_argument('--seats-per-booking', type=int, default=1)
+        parser.add_argument(
+            '--strategy',
+            choices=['conditional', 'naive'],
+            default='conditional',
+            help='conditional = TravelOption.reserve_seats, naive = read, check, save (the old code path)',
+        )
+        parser.add_argument('--output', help='Write the report as JSON to this file')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark option and bookings')
+
+    def handle(self, *args, **options):
+        seats = options['seats_per_booking']
+        TravelOption.objects.filter(travel_id=BENCH_TRAVEL_ID).delete()
+        user, _ = User.objects.get_or_create(username='bench_contention', defaults={'email': 'bench@example.com'})
+        departure = date.today() + timedelta(days=30)
+        travel = TravelOption.objects.create(
+            travel_id=BENCH_TRAVEL_ID,
+            type='flight',
+            source='Mumbai',
+            destination='Delhi',
+            departure_date=departure,
+            departure_time=time(9, 0),
+            arrival_date=departure,
+            arrival_time=time(11, 0),
+            price=Decimal('4999.00'),
+            available_seats=options['capacity'],
+            total_seats=options['capacity'],
+        )
+
+        attempt = self._attempt_conditional if options['strategy'] == 'conditional' else self._attempt_naive
+
+        def worker(job):
+            try:
+                return attempt(travel, user, seats)
+            except DatabaseError:
+                # e.g. "database is locked" on SQLite
+                return 'error'
+
+        results, elapsed = run_concurrently(worker, range(options['bookings']), options['threads'])
+
+        outcomes = Counter(outcome for _, outcome, _ in results)
+        travel.refresh_from_db()
+        booked = Booking.objects.filter(travel_option=travel, status='confirmed').aggregate(
+            seats=Sum('number_of_seats')
+        )['seats'] or 0
+        report = {
+            'strategy': options['strategy'],
+            'attempts': options['bookings'],
+            'threads': options['threads'],
+            'capacity': options['capacity'],
+            'outcomes': dict(outcomes),
+            'elapsed_s': round(elapsed, 3),
+            'attempts_per_s': round(len(results) / elapsed, 1) if elapsed else 0.0,
+            'latency': summarize_latencies([latency for _, _, latency in results]),
+            'seats_booked': booked,
+            'seats_left': travel.available_seats,
+            'oversold_seats': max(0, booked - options['capacity']),
+            'lost_updates': (options['capacity'] - booked) - travel.available_seats,
+        }
+
+        if not options['keep']:
+            travel.delete()
+
+        if options['output']:
+            write_report(options['output'], report)
+
+        self.stdout.write(
+            f"{report['strategy']}: {report['attempts']} attempts on {report['threads']} threads "
+            f"in {report['elapsed_s']}s ({report['attempts_per_s']}/s), outcomes {report['outcomes']}"
+        )
+        self.stdout.write(
+            f"p50 {report['latency']['p50_ms']}ms, p95 {report['latency']['p95_ms']}ms, "
+            f"p99 {report['latency']['p99_ms']}ms"
+        )
+        style = self.style.SUCCESS if not report['oversold_seats'] and not report['lost_updates'] else self.style.ERROR
+        self.stdout.write(style(
+            f"Seats booked {booked}/{options['capacity']}, left {report['seats_left']}, "
+            f"oversold {report['oversold_seats']}, lost updates {report['lost_updates']}"
+        ))
+
+    @staticmethod
+    def _attempt_conditional(travel, user, seats):
+        with transaction.atomic():
+            if not travel.reserve_seats(seats):
+                return 'sold_out'
+            Booking.objects.create(
+                user=user,
+                travel_option=travel,
+                number_of_seats=seats,
+                total_price=travel.price * seats,
+                passenger_names=', '.join(['Bench Passenger'] * seats),
+                contact_email='bench@example.com',
+                contact_phone='0000000000',
+            )
+        return 'booked'
+
+    @staticmethod
+    def _attempt_naive(travel, user, seats):
+        with transaction.atomic():
+            current = TravelOption.objects.get(pk=travel.pk)
+            if current.available_seats < seats:
+                return 'sold_out'
+            Booking.objects.create(
+                user=user,
+                travel_option=current,
+                number_of_seats=seats,
+                total_price=current.price * seats,
+                passenger_names=', '.join(['Bench Passenger'] * seats),
+                contact_email='bench@example.com',
+                contact_phone='0000000000',
+            )
+            current.available_seats -= seats
+            current.save()
+        return 'booked'
@@ -0,0 +1,210 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.backends.signals import connection_created
+
+from booking.benchmarking import run_concurrently, summarize_latencies, write_report
+from booking.models import Booking, SeatHold, TravelOption
+
+
+BENCH_TRAVEL_PREFIX = 'BENCHSQL'
+BENCH_USERNAME = 'bench_sqlite'
+
+# Django's SQLite defaults, as settings.py had them before SQLITE_OPTIONS
+BASELINE = {'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent bookers and browsers against copies of the SQLite database, once with '
+        "Django's defaults (rollback journal, 5s timeout, DEFERRED transactions, a connection per "
+        'request) and once with settings.py\'s profile, and report write throughput and lock errors'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=1000, help='Booking attempts per profile')
+        parser.add_argument('--browses', type=int, default=1000, help='Search page reads per profile')
+        parser.add_argument('--threads', type=int, default=32, help='Concurrent clients')
+        parser.add_argument('--options', type=int, default=10, help='Travel options the bookings spread over')
+        parser.add_argument('--profile', choices=['both', 'baseline', 'tuned'], default='both')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        default = settings.DATABASES['default']
+        if default['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('The default database is not SQLite.')
+        profiles = {
+            'baseline': BASELINE,
+            'tuned': {
+                'OPTIONS': default.get('OPTIONS', {}),
+                'CONN_MAX_AGE': default.get('CONN_MAX_AGE', 0),
+                'CONN_HEALTH_CHECKS': default.get('CONN_HEALTH_CHECKS', False),
+            },
+        }
+        names = list(profiles) if options['profile'] == 'both' else [options['profile']]
+
+        rng = random.Random(options['seed'])
+        jobs = [('book', rng.randint(1, 3)) for _ in range(options['bookings'])]
+        jobs += [('browse', None)] * options['browses']
+        rng.shuffle(jobs)
+
+        report = {
+            'threads': options['threads'],
+            'bookings': options['bookings'],
+            'browses': options['browses'],
+            'options': options['options'],
+        }
+        workdir = tempfile.mkdtemp(prefix='benchmark_sqlite_')
+        try:
+            for name in names:
+                path = os.path.join(workdir, f'{name}.sqlite3')
+                self.copy_database(default['NAME'], path)
+                with database_profile(path, profiles[name]):
+                    report[name] = self.run_profile(jobs, options['options'], options['threads'])
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if options['output']:
+            write_report(options['output'], report)
+        self.stdout.write(
+            f"{'profile':<10}{'bookings/s':>12}{'locked':>8}{'lock %':>8}{'book p50':>10}{'book p99':>10}"
+            f"{'browse p50':>12}{'connections':>13}"
+        )
+        for name in names:
+            stats = report[name]
+            self.stdout.write(
+                f"{name:<10}{stats['bookings_per_s']:>12}{stats['locked']:>8}{stats['lock_error_pct']:>8}"
+                f"{stats['book_latency']['p50_ms']:>10}{stats['book_latency']['p99_ms']:>10}"
+                f"{stats['browse_latency']['p50_ms']:>12}{stats['connections_opened']:>13}"
+            )
+
+    @staticmethod
+    def copy_database(source, path):
+        """Copy with SQLite's backup API (consistent while the app writes), in rollback-journal mode"""
+        src, dst = sqlite3.connect(source), sqlite3.connect(path)
+        try:
+            src.backup(dst)
+            dst.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            src.close()
+            dst.close()
+
+    def run_profile(self, jobs, option_count, threads):
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME, defaults={'email': 'bench@example.com'})
+        travels = self.create_options(option_count, capacity=3 * len(jobs))
+        connection.close()
+
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        connection_created.connect(count_connection, weak=False)
+
+        def worker(job):
+            kind, seats = job
+            try:
+                if kind == 'browse':
+                    list(TravelOption.objects.filter(type='flight').order_by('departure_date', 'departure_time', 'id')[:10])
+                    return 'browsed'
+                return book(random.choice(travels).pk, user, seats)
+            except DatabaseError as e:
+                return 'locked' if 'locked' in str(e) else 'error'
+            finally:
+                # What request_finished does: close unless CONN_MAX_AGE keeps it
+                connection.close_if_unusable_or_obsolete()
+
+        try:
+            results, elapsed = run_concurrently(worker, jobs, threads)
+        finally:
+            connection_created.disconnect(count_connection)
+
+        outcomes = Counter(outcome for _, outcome, _ in results)
+        attempts = sum(1 for (kind, _), _, _ in results if kind == 'book')
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'outcomes': dict(outcomes),
+            'bookings_per_s': round(outcomes['booked'] / elapsed, 1) if elapsed else 0.0,
+            'locked': outcomes['locked'],
+            'lock_error_pct': round(100.0 * outcomes['locked'] / len(results), 2) if results else 0.0,
+            'book_attempts': attempts,
+            'book_latency': summarize_latencies([latency for (kind, _), _, latency in results if kind == 'book']),
+            'browse_latency': summarize_latencies([latency for (kind, _), _, latency in results if kind == 'browse']),
+            'connections_opened': len(opened),
+        }
+
+    @staticmethod
+    def create_options(count, capacity):
+        departure = date.today() + timedelta(days=30)
+        TravelOption.objects.filter(travel_id__startswith=BENCH_TRAVEL_PREFIX).delete()
+        return [
+            TravelOption.objects.create(
+                travel_id=f'{BENCH_TRAVEL_PREFIX}{n:03d}',
+                type='flight',
+                source='Mumbai',
+                destination='Delhi',
+                departure_date=departure,
+                departure_time=time(6 + n % 16, 0),
+                arrival_date=departure,
+                arrival_time=time(8 + n % 16, 0),
+                price=Decimal('4999.00'),
+                available_seats=capacity,
+                total_seats=capacity,
+            )
+            for n in range(count)
+        ]
+
+
+def book(travel_id, user, seats):
+    """The queries of a booking POST (see views.book_travel), without the HTTP layer"""
+    travel = TravelOption.objects.get(pk=travel_id)
+    SeatHold.objects.held_by(travel, user)
+    with transaction.atomic():
+        held = SeatHold.objects.take(travel, user)
+        if seats > held and not travel.reserve_seats(seats - held):
+            return 'sold_out'
+        Booking(
+            user=user,
+            travel_option=travel,
+            number_of_seats=seats,
+            total_price=travel.price * seats,
+            passenger_names=', '.join(['Bench Passenger'] * seats),
+            contact_email='bench@example.com',
+            contact_phone='0000000000',
+        ).save()
+    return 'booked'
+
+
+@contextmanager
+def database_profile(path, profile):
+    """Point the default alias at ``path`` with ``profile``'s settings, in every thread"""
+    original = connections.settings['default']
+    reset_default_connection()
+    connections.settings['default'] = {**original, 'NAME': path, **profile}
+    try:
+        yield
+    finally:
+        reset_default_connection()
+        connections.settings['default'] = original
+
+
+def reset_default_connection():
+    # Close and drop this thread's connection so the next query opens one
+    # from connections.settings; worker threads close theirs on exit
+    connection.close()
+    try:
+        del connections['default']
+    except AttributeError:
+        pass
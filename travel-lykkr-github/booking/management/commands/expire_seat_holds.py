@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from booking.models import SeatHold
+
+
+class Command(BaseCommand):
+    help = 'Return the seats of expired seat holds to their travel options (run every minute)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Holds released per transaction',
+        )
+
+    def handle(self, *args, **options):
+        released = SeatHold.objects.release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired seat holds'))
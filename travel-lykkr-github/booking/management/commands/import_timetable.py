@@ -0,0 +1,67 @@
+import sys
+import time as clock
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from booking.timetable import COLUMNS, TimetableImport, format_for, open_text, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Create or update travel options from a CSV or JSON-lines timetable, matched on travel_id. '
+        f"Columns: {', '.join(COLUMNS)} and optionally available_seats (new options only)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Timetable file (.csv, .jsonl or .ndjson), or - for standard input")
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='File format; by default taken from the file extension',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows written per transaction',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            file_format = options['format'] or format_for(path)
+        except ValidationError as e:
+            raise CommandError(e.messages[0])
+
+        self.started = clock.perf_counter()
+        self.last_report = self.started
+        importer = TimetableImport(batch_size=options['batch_size'])
+        binary = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            importer.run(read_rows(open_text(binary), file_format), progress=self.report_progress)
+        except ValidationError as e:
+            raise CommandError(e.messages[0])
+        finally:
+            if binary is not sys.stdin.buffer:
+                binary.close()
+
+        for line, message in importer.errors:
+            self.stderr.write(f'line {line}: {message}')
+        if importer.invalid > len(importer.errors):
+            self.stderr.write(f'... and {importer.invalid - len(importer.errors)} more invalid rows')
+
+        elapsed = clock.perf_counter() - self.started
+        style = self.style.SUCCESS if not importer.invalid else self.style.WARNING
+        self.stdout.write(style(
+            f'Imported {importer.rows} rows in {elapsed:.1f}s ({importer.rows / elapsed:,.0f} rows/s): '
+            f'{importer.created} created, {importer.updated} updated, {importer.invalid} invalid'
+            + (f', {importer.superseded} superseded by later rows' if importer.superseded else '')
+        ))
+
+    def report_progress(self, importer):
+        now = clock.perf_counter()
+        if now - self.last_report < 5:
+            return
+        self.last_report = now
+        self.stdout.write(f'{importer.rows} rows ({importer.rows / (now - self.started):,.0f} rows/s)')
@@ -1,13 +1,52 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
 from django.utils import timezone
 from datetime import date, time, timedelta
 from decimal import Decimal
 import random
-from booking.models import TravelOption
+import time as clock
+from booking.cache import bump_all_versions
+from booking.models import City, Passenger, RouteDaySummary, TravelOption, Booking
+
+
+# Sample Indian cities
+CITIES = [
+    'Mumbai', 'Delhi', 'Bengaluru', 'Hyderabad', 'Chennai', 'Kolkata',
+    'Pune', 'Ahmedabad', 'Jaipur', 'Lucknow', 'Kanpur', 'Nagpur',
+    'Indore', 'Bhopal', 'Visakhapatnam', 'Vadodara', 'Ludhiana', 'Agra',
+    'Nashik', 'Faridabad', 'Meerut', 'Varanasi', 'Srinagar', 'Amritsar'
+]
+
+FIRST_NAMES = [
+    'Aarav', 'Vivaan', 'Aditya', 'Vihaan', 'Arjun', 'Sai', 'Reyansh', 'Krishna',
+    'Ananya', 'Diya', 'Saanvi', 'Aadhya', 'Pari', 'Anika', 'Navya', 'Meera',
+]
+
+LAST_NAMES = [
+    'Sharma', 'Verma', 'Patel', 'Reddy', 'Iyer', 'Nair', 'Gupta', 'Singh',
+    'Das', 'Mehta', 'Joshi', 'Khan', 'Rao', 'Kulkarni', 'Bose', 'Chopra',
+]
+
+# (duration hours, price range in ₹, seat range) per travel type
+TRAVEL_PROFILES = {
+    'flight': ((1, 6), (3000, 15000), (50, 300)),
+    'train': ((3, 12), (500, 3000), (100, 500)),
+    'bus': ((4, 15), (300, 2000), (30, 60)),
+}
+
+PREFIXES = {
+    'flight': 'FL',
+    'train': 'TR',
+    'bus': 'BS'
+}
+
+SAMPLE_USER_PREFIX = 'sample_user_'
 
 
 class Command(BaseCommand):
-    help = 'Populate the database with sample travel options'
+    help = 'Populate the database with sample travel options, users and bookings'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -16,101 +55,203 @@ class Command(BaseCommand):
             default=20,
             help='Number of travel options to create',
         )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=0,
+            help='Number of sample users to create (password: sample123)',
+        )
+        parser.add_argument(
+            '--bookings',
+            type=int,
+            default=0,
+            help='Number of bookings to spread over the travel options (needs --users)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Random seed, for a reproducible dataset',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per bulk_create batch',
+        )
 
     def handle(self, *args, **options):
         count = options['count']
-        
-        # Sample Indian cities
-        cities = [
-            'Mumbai', 'Delhi', 'Bengaluru', 'Hyderabad', 'Chennai', 'Kolkata',
-            'Pune', 'Ahmedabad', 'Jaipur', 'Lucknow', 'Kanpur', 'Nagpur',
-            'Indore', 'Bhopal', 'Visakhapatnam', 'Vadodara', 'Ludhiana', 'Agra',
-            'Nashik', 'Faridabad', 'Meerut', 'Varanasi', 'Srinagar', 'Amritsar'
-        ]
-        
-        travel_types = ['flight', 'train', 'bus']
-        
-        # Clear existing sample data
-        TravelOption.objects.filter(travel_id__startswith='SAMPLE').delete()
-        
-        created_count = 0
-        
-        for i in range(count):
+        batch_size = options['batch_size']
+        if options['bookings'] and not options['users']:
+            raise CommandError('--bookings needs sample users; pass --users as well.')
+
+        self.rng = random.Random(options['seed'])
+        self.started = clock.perf_counter()
+        self.last_report = self.started
+
+        with transaction.atomic():
+            # Clear existing sample data
+            Booking.objects.filter(travel_option__travel_id__startswith='SAMPLE').delete()
+            TravelOption.objects.filter(travel_id__startswith='SAMPLE').delete()
+            User.objects.filter(username__startswith=SAMPLE_USER_PREFIX).delete()
+
+            self.city_ids = {name: City.objects.for_name(name).pk for name in CITIES}
+            user_ids = self.create_users(options['users'], batch_size)
+
+            created_options = 0
+            created_bookings = 0
+            for start in range(0, count, batch_size):
+                stop = min(count, start + batch_size)
+                options_batch, plans = self.build_options(start, stop, count, options['bookings'])
+                TravelOption.objects.bulk_create(options_batch, batch_size=batch_size)
+                self.assign_ids(TravelOption, 'travel_id', options_batch)
+                created_options += len(options_batch)
+
+                bookings = self.build_bookings(options_batch, plans, user_ids, created_bookings)
+                Booking.objects.bulk_create(bookings, batch_size=batch_size)
+                self.assign_ids(Booking, 'booking_id', bookings)
+                Passenger.objects.bulk_create_for(bookings, batch_size=batch_size)
+                created_bookings += len(bookings)
+
+                self.report_progress(created_options, count, created_bookings, final=stop == count)
+
+            # bulk_create skips the per-option summary upkeep
+            summaries = RouteDaySummary.objects.rebuild(batch_size=batch_size)
+
+        bump_all_versions()
+        elapsed = clock.perf_counter() - self.started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully created {created_options} travel options, {len(user_ids)} users '
+                f'and {created_bookings} bookings ({summaries} route day summaries) in {elapsed:.1f}s'
+            )
+        )
+
+    def create_users(self, total, batch_size):
+        if not total:
+            return []
+        # Hashing once keeps user creation cheap; every sample user shares the password
+        password = make_password('sample123')
+        for start in range(0, total, batch_size):
+            User.objects.bulk_create(
+                [
+                    User(
+                        username=f'{SAMPLE_USER_PREFIX}{n:07d}',
+                        email=f'{SAMPLE_USER_PREFIX}{n:07d}@example.com',
+                        first_name=self.rng.choice(FIRST_NAMES),
+                        last_name=self.rng.choice(LAST_NAMES),
+                        password=password,
+                    )
+                    for n in range(start + 1, min(total, start + batch_size) + 1)
+                ],
+                batch_size=batch_size,
+            )
+        self.stdout.write(f'Created {total} sample users')
+        return list(
+            User.objects.filter(username__startswith=SAMPLE_USER_PREFIX).order_by('id').values_list('id', flat=True)
+        )
+
+    def build_options(self, start, stop, count, total_bookings):
+        """Build a batch of unsaved options plus the seats each of their bookings takes"""
+        rng = self.rng
+        options_batch = []
+        plans = []
+        for i in range(start, stop):
             # Random source and destination (make sure they're different)
-            source = random.choice(cities)
-            destination = random.choice([city for city in cities if city != source])
-            
+            source = rng.choice(CITIES)
+            destination = rng.choice([city for city in CITIES if city != source])
+
             # Random travel type
-            travel_type = random.choice(travel_types)
-            
-            # Generate travel ID
-            prefix = {
-                'flight': 'FL',
-                'train': 'TR',
-                'bus': 'BS'
-            }[travel_type]
-            travel_id = f"SAMPLE{prefix}{str(i+1).zfill(3)}"
-            
-            # Random departure date (next 30 days)
-            departure_date = date.today() + timedelta(days=random.randint(1, 30))
-            
-            # Random departure time
-            departure_hour = random.randint(6, 22)
-            departure_minute = random.choice([0, 15, 30, 45])
-            departure_time = time(departure_hour, departure_minute)
-            
+            travel_type = rng.choice(list(TRAVEL_PROFILES))
+            duration_range, price_range, seat_range = TRAVEL_PROFILES[travel_type]
+
+            # Random departure date (next 30 days) and time
+            departure_date = date.today() + timedelta(days=rng.randint(1, 30))
+            departure_time = time(rng.randint(6, 22), rng.choice([0, 15, 30, 45]))
+
             # Calculate arrival (add random travel time based on type)
-            if travel_type == 'flight':
-                travel_duration = timedelta(hours=random.randint(1, 6))
-                price_range = (3000, 15000)  # ₹3,000 to ₹15,000
-                seat_range = (50, 300)
-            elif travel_type == 'train':
-                travel_duration = timedelta(hours=random.randint(3, 12))
-                price_range = (500, 3000)   # ₹500 to ₹3,000
-                seat_range = (100, 500)
-            else:  # bus
-                travel_duration = timedelta(hours=random.randint(4, 15))
-                price_range = (300, 2000)   # ₹300 to ₹2,000
-                seat_range = (30, 60)
-            
+            travel_duration = timedelta(hours=rng.randint(*duration_range))
             arrival_datetime = timezone.datetime.combine(departure_date, departure_time) + travel_duration
-            arrival_date = arrival_datetime.date()
-            arrival_time = arrival_datetime.time()
-            
-            # Random price
-            price = Decimal(str(random.randint(*price_range) + random.random())).quantize(Decimal('0.01'))
-            
-            # Random seat configuration
-            total_seats = random.randint(*seat_range)
-            available_seats = random.randint(0, total_seats)
-            
-            try:
-                travel_option = TravelOption.objects.create(
-                    travel_id=travel_id,
-                    type=travel_type,
-                    source=source,
-                    destination=destination,
-                    departure_date=departure_date,
-                    departure_time=departure_time,
-                    arrival_date=arrival_date,
-                    arrival_time=arrival_time,
-                    price=price,
-                    available_seats=available_seats,
-                    total_seats=total_seats
-                )
-                created_count += 1
-                
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'Created: {travel_option.travel_id} - {source} to {destination}'
-                    )
-                )
-                
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f'Error creating travel option: {e}')
-                )
-        
+
+            price = Decimal(str(rng.randint(*price_range) + rng.random())).quantize(Decimal('0.01'))
+            total_seats = rng.randint(*seat_range)
+
+            # Spread the bookings evenly; each takes 1-4 seats while any are left
+            plan = []
+            if total_bookings:
+                remaining = total_seats
+                for _ in range((i + 1) * total_bookings // count - i * total_bookings // count):
+                    seats = min(rng.randint(1, 4), remaining)
+                    if not seats:
+                        break
+                    cancelled = rng.random() < 0.1
+                    plan.append((seats, cancelled))
+                    if not cancelled:
+                        remaining -= seats
+                available_seats = remaining
+            else:
+                available_seats = rng.randint(0, total_seats)
+            plans.append(plan)
+
+            options_batch.append(TravelOption(
+                travel_id=f"SAMPLE{PREFIXES[travel_type]}{str(i+1).zfill(3)}",
+                type=travel_type,
+                source=source,
+                destination=destination,
+                source_city_id=self.city_ids[source],
+                destination_city_id=self.city_ids[destination],
+                departure_date=departure_date,
+                departure_time=departure_time,
+                arrival_date=arrival_datetime.date(),
+                arrival_time=arrival_datetime.time(),
+                price=price,
+                available_seats=available_seats,
+                total_seats=total_seats
+            ))
+        return options_batch, plans
+
+    def assign_ids(self, model, field, objs):
+        # Backends that cannot return ids from bulk inserts (MySQL) need a lookup
+        if all(obj.pk for obj in objs):
+            return
+        ids = dict(
+            model.objects.filter(**{f'{field}__in': [getattr(obj, field) for obj in objs]})
+            .values_list(field, 'id')
+        )
+        for obj in objs:
+            obj.pk = ids[getattr(obj, field)]
+
+    def build_bookings(self, options_batch, plans, user_ids, offset):
+        rng = self.rng
+        bookings = []
+        for option, plan in zip(options_batch, plans):
+            for seats, cancelled in plan:
+                n = offset + len(bookings) + 1
+                bookings.append(Booking(
+                    # 'U' is neither a hex digit (old ids) nor Crockford base32 (new
+                    # ids, see booking.ids), so these never clash with generated ids
+                    booking_id=f'BKU{n:09d}',
+                    user_id=rng.choice(user_ids),
+                    travel_option_id=option.pk,
+                    number_of_seats=seats,
+                    total_price=option.price * seats,
+                    status='cancelled' if cancelled else 'confirmed',
+                    passenger_names=', '.join(
+                        f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}' for _ in range(seats)
+                    ),
+                    contact_email=f'passenger{n}@example.com',
+                    contact_phone=f'9{rng.randint(0, 999999999):09d}',
+                ))
+        return bookings
+
+    def report_progress(self, created_options, count, created_bookings, final=False):
+        now = clock.perf_counter()
+        if not final and now - self.last_report < 5:
+            return
+        self.last_report = now
+        elapsed = now - self.started
+        rows = created_options + created_bookings
         self.stdout.write(
-            self.style.SUCCESS(f'Successfully created {created_count} travel options')
+            f'{created_options}/{count} travel options, {created_bookings} bookings '
+            f'({rows / elapsed:,.0f} rows/s)'
         )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from booking.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than IDEMPOTENCY_KEY_RETENTION (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Keys deleted per query',
+        )
+
+    def handle(self, *args, **options):
+        purged = IdempotencyKey.objects.purge_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} expired idempotency keys'))
@@ -0,0 +1,23 @@
+import time as clock
+
+from django.core.management.base import BaseCommand
+
+from booking.models import RouteDaySummary
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the RouteDaySummary table from scratch out of TravelOption'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per bulk_create batch',
+        )
+
+    def handle(self, *args, **options):
+        started = clock.perf_counter()
+        created = RouteDaySummary.objects.rebuild(batch_size=options['batch_size'])
+        elapsed = clock.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} route day summaries in {elapsed:.1f}s'))
@@ -0,0 +1,249 @@
+"""Per-view request metrics with Prometheus text exposition.
+
+MetricsMiddleware records latency, status, query count and DB time per
+URL name into an in-process registry; recording is a dict update under a
+lock. Queries are counted by an execute wrapper that every connection gets
+when it is created (see BookingConfig.ready). Every METRICS_FLUSH_INTERVAL seconds the registry writes its
+cumulative totals to the shared cache under a per-worker key, and the
+exposition endpoint sums the snapshots of every live worker. Each worker
+only ever overwrites its own key, so no increments are lost when several
+processes share a file-based or network cache. The snapshots need a cache
+alias of their own that never culls: a snapshot evicted between flushes
+would drop that worker out of the sums, which Prometheus reads as a
+counter reset.
+"""
+import os
+import socket
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .cache import search_cache_stats
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WORKERS_KEY = 'metrics:workers'
+# Snapshots of workers that stop flushing drop out after this long
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+
+# QueryTimer of the request being served. A context variable follows the
+# request into sync_to_async threads, where the async ORM runs its queries
+# on connections of its own that a per-request execute_wrapper never sees.
+current_timer = ContextVar('booking_query_timer', default=None)
+
+
+def metrics_cache():
+    return caches[settings.METRICS_CACHE_ALIAS]
+
+
+class QueryTimer:
+    """connection.execute_wrapper that counts queries and their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver: report every connection's queries to the current request"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+        self.worker_key = f"metrics:worker:{socket.gethostname()}:{os.getpid()}"
+        self.last_flush = time.monotonic()
+
+    def observe(self, view, method, status, seconds, queries, db_seconds):
+        with self.lock:
+            series = self.series.get((view, method))
+            if series is None:
+                series = self.series[(view, method)] = {
+                    'count': 0,
+                    'sum': 0.0,
+                    'buckets': [0] * len(BUCKETS),
+                    'queries': 0,
+                    'db_seconds': 0.0,
+                    'statuses': {},
+                }
+            series['count'] += 1
+            series['sum'] += seconds
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    series['buckets'][index] += 1
+                    break
+            series['queries'] += queries
+            series['db_seconds'] += db_seconds
+            series['statuses'][status] = series['statuses'].get(status, 0) + 1
+            due = time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Publish this worker's cumulative totals to the shared cache"""
+        with self.lock:
+            self.last_flush = time.monotonic()
+            snapshot = {
+                key: dict(series, buckets=list(series['buckets']), statuses=dict(series['statuses']))
+                for key, series in self.series.items()
+            }
+        cache = metrics_cache()
+        cache.set(self.worker_key, snapshot, SNAPSHOT_TIMEOUT)
+        workers = cache.get(WORKERS_KEY) or set()
+        if self.worker_key not in workers:
+            # get/set is not atomic across processes, but every flush re-registers
+            cache.set(WORKERS_KEY, workers | {self.worker_key}, None)
+
+
+registry = MetricsRegistry()
+
+
+def collect():
+    """Sum the snapshots of every worker that is still reporting"""
+    registry.flush()
+    cache = metrics_cache()
+    workers = cache.get(WORKERS_KEY) or set()
+    snapshots = cache.get_many(list(workers))
+    if len(snapshots) != len(workers):
+        cache.set(WORKERS_KEY, set(snapshots), None)
+
+    totals = {}
+    for snapshot in snapshots.values():
+        for key, series in snapshot.items():
+            total = totals.setdefault(key, {
+                'count': 0, 'sum': 0.0, 'buckets': [0] * len(BUCKETS),
+                'queries': 0, 'db_seconds': 0.0, 'statuses': {},
+            })
+            total['count'] += series['count']
+            total['sum'] += series['sum']
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], series['buckets'])]
+            total['queries'] += series['queries']
+            total['db_seconds'] += series['db_seconds']
+            for status, count in series['statuses'].items():
+                total['statuses'][status] = total['statuses'].get(status, 0) + count
+    return totals, len(snapshots)
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    totals, workers = collect()
+    lines = [
+        '# HELP travellykkr_http_request_duration_seconds Request latency by URL name.',
+        '# TYPE travellykkr_http_request_duration_seconds histogram',
+    ]
+    for (view, method), series in sorted(totals.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS, series['buckets']):
+            cumulative += count
+            lines.append(f"travellykkr_http_request_duration_seconds_bucket{_labels(view=view, method=method, le=bound)} {cumulative}")
+        lines.append(f"travellykkr_http_request_duration_seconds_bucket{_labels(view=view, method=method, le='+Inf')} {series['count']}")
+        lines.append(f"travellykkr_http_request_duration_seconds_sum{_labels(view=view, method=method)} {series['sum']:.6f}")
+        lines.append(f"travellykkr_http_request_duration_seconds_count{_labels(view=view, method=method)} {series['count']}")
+
+    lines += [
+        '# HELP travellykkr_http_responses_total Responses by URL name and status code.',
+        '# TYPE travellykkr_http_responses_total counter',
+    ]
+    for (view, method), series in sorted(totals.items()):
+        for status, count in sorted(series['statuses'].items()):
+            lines.append(f"travellykkr_http_responses_total{_labels(view=view, method=method, status=status)} {count}")
+
+    lines += [
+        '# HELP travellykkr_db_queries_total Database queries run while serving requests.',
+        '# TYPE travellykkr_db_queries_total counter',
+    ]
+    for (view, method), series in sorted(totals.items()):
+        lines.append(f"travellykkr_db_queries_total{_labels(view=view, method=method)} {series['queries']}")
+
+    lines += [
+        '# HELP travellykkr_db_query_seconds_total Time spent in database queries while serving requests.',
+        '# TYPE travellykkr_db_query_seconds_total counter',
+    ]
+    for (view, method), series in sorted(totals.items()):
+        lines.append(f"travellykkr_db_query_seconds_total{_labels(view=view, method=method)} {series['db_seconds']:.6f}")
+
+    stats = search_cache_stats()
+    lines += [
+        '# HELP travellykkr_search_cache_hits_total Travel search result cache hits.',
+        '# TYPE travellykkr_search_cache_hits_total counter',
+        f"travellykkr_search_cache_hits_total {stats['hits']}",
+        '# HELP travellykkr_search_cache_misses_total Travel search result cache misses.',
+        '# TYPE travellykkr_search_cache_misses_total counter',
+        f"travellykkr_search_cache_misses_total {stats['misses']}",
+        '# HELP travellykkr_metrics_workers Worker processes contributing to these metrics.',
+        '# TYPE travellykkr_metrics_workers gauge',
+        f"travellykkr_metrics_workers {workers}",
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Record latency, query count and DB time for every request by URL name"""
+
+    # Both, so async views under ASGI are not pushed onto the sync thread pool
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = QueryTimer()
+        token = current_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        self.observe(request, response, time.perf_counter() - started, timer)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        token = current_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        self.observe(request, response, time.perf_counter() - started, timer)
+        return response
+
+    @staticmethod
+    def observe(request, response, elapsed, timer):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.observe(view, request.method, response.status_code, elapsed, timer.count, timer.seconds)
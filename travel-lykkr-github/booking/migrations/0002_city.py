@@ -0,0 +1,56 @@
+# Generated by Django 5.2.1 on 2026-10-16 22:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='City',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('name_key', models.CharField(editable=False, max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'cities',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CityAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=100)),
+                ('alias_key', models.CharField(editable=False, max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'city aliases',
+            },
+        ),
+        migrations.AddField(
+            model_name='traveloption',
+            name='destination_city',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='arrivals', to='booking.city'),
+        ),
+        migrations.AddField(
+            model_name='traveloption',
+            name='source_city',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='departures', to='booking.city'),
+        ),
+        migrations.AddIndex(
+            model_name='traveloption',
+            index=models.Index(fields=['source_city', 'destination_city', 'departure_date', 'type'], name='travel_route_idx'),
+        ),
+        migrations.AddField(
+            model_name='cityalias',
+            name='city',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='booking.city'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+CHUNK_SIZE = 1000
+
+
+def normalize(name):
+    return ' '.join(name.casefold().split())
+
+
+def populate_cities(apps, schema_editor):
+    City = apps.get_model('booking', 'City')
+    TravelOption = apps.get_model('booking', 'TravelOption')
+    cities = {city.name_key: city.pk for city in City.objects.all()}
+
+    def city_id(name):
+        key = normalize(name)
+        if key not in cities:
+            cities[key] = City.objects.create(name=' '.join(name.split()), name_key=key).pk
+        return cities[key]
+
+    batch = []
+    for travel in TravelOption.objects.only('id', 'source', 'destination').order_by('id').iterator(chunk_size=CHUNK_SIZE):
+        travel.source_city_id = city_id(travel.source)
+        travel.destination_city_id = city_id(travel.destination)
+        batch.append(travel)
+        if len(batch) >= CHUNK_SIZE:
+            TravelOption.objects.bulk_update(batch, ['source_city', 'destination_city'])
+            batch = []
+    if batch:
+        TravelOption.objects.bulk_update(batch, ['source_city', 'destination_city'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0002_city'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_cities, migrations.RunPython.noop),
+    ]
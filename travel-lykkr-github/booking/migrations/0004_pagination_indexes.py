@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-16 22:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0003_populate_cities'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', '-booking_date', '-id'], name='booking_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='traveloption',
+            index=models.Index(fields=['departure_date', 'departure_time', 'id'], name='travel_departure_idx'),
+        ),
+    ]
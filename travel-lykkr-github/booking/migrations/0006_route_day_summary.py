@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-16 22:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0005_seat_holds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteDaySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('flight', 'Flight'), ('train', 'Train'), ('bus', 'Bus')], max_length=10)),
+                ('departure_date', models.DateField()),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('available_seats', models.PositiveIntegerField()),
+                ('departures', models.PositiveIntegerField()),
+                ('destination_city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='booking.city')),
+                ('source_city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='booking.city')),
+            ],
+            options={
+                'verbose_name_plural': 'route day summaries',
+                'constraints': [models.UniqueConstraint(fields=('source_city', 'destination_city', 'departure_date', 'type'), name='route_day_summary_key_uniq')],
+            },
+        ),
+    ]
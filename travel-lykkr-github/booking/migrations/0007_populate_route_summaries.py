@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+CHUNK_SIZE = 1000
+
+
+def populate_route_summaries(apps, schema_editor):
+    RouteDaySummary = apps.get_model('booking', 'RouteDaySummary')
+    TravelOption = apps.get_model('booking', 'TravelOption')
+    rows = (
+        TravelOption.objects.filter(source_city__isnull=False, destination_city__isnull=False)
+        .values('source_city_id', 'destination_city_id', 'type', 'departure_date')
+        .annotate(min_price=Min('price'), available_seats=Sum('available_seats'), departures=Count('id'))
+        .order_by()
+    )
+    batch = []
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        batch.append(RouteDaySummary(**row))
+        if len(batch) >= CHUNK_SIZE:
+            RouteDaySummary.objects.bulk_create(batch)
+            batch = []
+    RouteDaySummary.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_route_day_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_route_summaries, migrations.RunPython.noop),
+    ]
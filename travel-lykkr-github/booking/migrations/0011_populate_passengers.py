@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+CHUNK_SIZE = 1000
+
+
+def normalize(name):
+    return ' '.join(name.casefold().split())
+
+
+def populate_passengers(apps, schema_editor):
+    Booking = apps.get_model('booking', 'Booking')
+    Passenger = apps.get_model('booking', 'Passenger')
+
+    batch = []
+    for booking_id, names in Booking.objects.values_list('id', 'passenger_names').order_by('id').iterator(chunk_size=CHUNK_SIZE):
+        names = [name.strip()[:100] for name in names.split(',') if name.strip()]
+        for position, name in enumerate(names, start=1):
+            batch.append(Passenger(booking_id=booking_id, position=position, name=name, name_key=normalize(name)[:100]))
+        if len(batch) >= CHUNK_SIZE:
+            Passenger.objects.bulk_create(batch)
+            batch = []
+    Passenger.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0010_passengers'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_passengers, migrations.RunPython.noop),
+    ]
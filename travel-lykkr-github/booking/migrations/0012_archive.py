@@ -0,0 +1,62 @@
+# Generated by Django 5.2.1 on 2026-10-16 23:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0011_populate_passengers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTravelOption',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('travel_id', models.CharField(db_index=True, max_length=20)),
+                ('type', models.CharField(choices=[('flight', 'Flight'), ('train', 'Train'), ('bus', 'Bus')], max_length=10)),
+                ('source', models.CharField(max_length=100)),
+                ('destination', models.CharField(max_length=100)),
+                ('departure_date', models.DateField()),
+                ('departure_time', models.TimeField()),
+                ('arrival_date', models.DateField()),
+                ('arrival_time', models.TimeField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('available_seats', models.PositiveIntegerField()),
+                ('total_seats', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('destination_city', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='booking.city')),
+                ('source_city', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='booking.city')),
+            ],
+            options={
+                'ordering': ['departure_date', 'departure_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('booking_id', models.CharField(max_length=20, unique=True)),
+                ('number_of_seats', models.PositiveIntegerField()),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('booking_date', models.DateTimeField()),
+                ('status', models.CharField(choices=[('confirmed', 'Confirmed'), ('cancelled', 'Cancelled')], max_length=10)),
+                ('passenger_names', models.TextField()),
+                ('contact_email', models.EmailField(max_length=254)),
+                ('contact_phone', models.CharField(max_length=15)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('itinerary', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='booking.itinerary')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('travel_option', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='booking.archivedtraveloption')),
+            ],
+            options={
+                'ordering': ['-booking_date'],
+                'indexes': [models.Index(fields=['user', '-booking_date', '-id'], name='archived_booking_user_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-16 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0013_booking_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='traveloption',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
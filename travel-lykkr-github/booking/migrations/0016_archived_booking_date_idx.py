@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-17 00:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0015_idempotency_fingerprint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['booking_date', 'id'], name='archived_booking_date_idx'),
+        ),
+    ]
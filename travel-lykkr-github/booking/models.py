@@ -1,7 +1,13 @@
-from django.db import models
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import BooleanField, Case, Count, F, Min, Q, Sum, Value, When
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from .cache import bump_route_version
+from .ids import new_booking_id, new_itinerary_reference
 
 
 class UserProfile(models.Model):
@@ -14,6 +20,78 @@ class UserProfile(models.Model):
         return f"{self.user.username}'s Profile"
 
 
+class CityManager(models.Manager):
+    def lookup(self, name):
+        """The city a free-text name or alias refers to, or None"""
+        key = City.normalize(name)
+        city = self.filter(name_key=key).first()
+        if city is None:
+            alias = CityAlias.objects.select_related('city').filter(alias_key=key).first()
+            if alias is not None:
+                return alias.city
+        return city
+    
+    def for_name(self, name):
+        """Return the city a free-text name refers to, creating it on first use"""
+        city = self.lookup(name)
+        if city is None:
+            city, created = self.get_or_create(name_key=City.normalize(name), defaults={'name': ' '.join(name.split())})
+        return city
+    
+    def matching(self, text):
+        """Cities whose canonical name or an alias starts with the search text"""
+        key = City.normalize(text)
+        return self.filter(
+            Q(name_key__startswith=key)
+            | Q(id__in=CityAlias.objects.filter(alias_key__startswith=key).values('city_id'))
+        )
+    
+    def ids_matching(self, text):
+        return list(self.matching(text).values_list('id', flat=True))
+    
+    async def aids_matching(self, text):
+        return [pk async for pk in self.matching(text).values_list('id', flat=True)]
+
+
+class City(models.Model):
+    name = models.CharField(max_length=100)
+    name_key = models.CharField(max_length=100, unique=True, editable=False)
+    
+    objects = CityManager()
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = 'cities'
+    
+    def __str__(self):
+        return self.name
+    
+    @staticmethod
+    def normalize(name):
+        """Case-folded, whitespace-collapsed form used for lookups"""
+        return ' '.join(name.casefold().split())
+    
+    def save(self, *args, **kwargs):
+        self.name_key = City.normalize(self.name)
+        super().save(*args, **kwargs)
+
+
+class CityAlias(models.Model):
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='aliases')
+    alias = models.CharField(max_length=100)
+    alias_key = models.CharField(max_length=100, unique=True, editable=False)
+    
+    class Meta:
+        verbose_name_plural = 'city aliases'
+    
+    def __str__(self):
+        return f"{self.alias} ({self.city.name})"
+    
+    def save(self, *args, **kwargs):
+        self.alias_key = City.normalize(self.alias)
+        super().save(*args, **kwargs)
+
+
 class TravelOption(models.Model):
     TRAVEL_TYPES = [
         ('flight', 'Flight'),
@@ -25,6 +103,8 @@ class TravelOption(models.Model):
     type = models.CharField(max_length=10, choices=TRAVEL_TYPES)
     source = models.CharField(max_length=100)
     destination = models.CharField(max_length=100)
+    source_city = models.ForeignKey(City, on_delete=models.PROTECT, related_name='departures', null=True, editable=False)
+    destination_city = models.ForeignKey(City, on_delete=models.PROTECT, related_name='arrivals', null=True, editable=False)
     departure_date = models.DateField()
     departure_time = models.TimeField()
     arrival_date = models.DateField()
@@ -33,16 +113,423 @@ class TravelOption(models.Model):
     available_seats = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     total_seats = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also set by every queryset update of the row (seat changes, imports),
+    # so travel_detail can answer conditional GETs from it
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['departure_date', 'departure_time']
+        indexes = [
+            models.Index(fields=['source_city', 'destination_city', 'departure_date', 'type'], name='travel_route_idx'),
+            models.Index(fields=['departure_date', 'departure_time', 'id'], name='travel_departure_idx'),
+        ]
     
     def __str__(self):
         return f"{self.travel_id} - {self.source} to {self.destination}"
     
+    @property
+    def summary_key(self):
+        """(source_city_id, destination_city_id, type, departure_date) of the RouteDaySummary row"""
+        return tuple(getattr(self, field) for field in RouteDaySummary.KEY_FIELDS)
+    
+    def save(self, *args, **kwargs):
+        previous_key = None
+        if self.pk:
+            previous_key = TravelOption.objects.filter(pk=self.pk).values_list(*RouteDaySummary.KEY_FIELDS).first()
+        if kwargs.get('update_fields') is None:
+            # Keep the normalized city references in step with the display names
+            self.source_city = City.objects.for_name(self.source)
+            self.destination_city = City.objects.for_name(self.destination)
+        else:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at'}
+        # The option and the day summaries it leaves and joins commit together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            RouteDaySummary.objects.refresh([self.summary_key] + ([previous_key] if previous_key else []))
+        
+        # Seats, prices or schedule may have changed; drop cached searches
+        bump_route_version(self.source_city_id, self.destination_city_id)
+        if previous_key and previous_key[:2] != (self.source_city_id, self.destination_city_id):
+            bump_route_version(*previous_key[:2])
+    
+    def delete(self, *args, **kwargs):
+        key = self.summary_key
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            RouteDaySummary.objects.refresh([key])
+        bump_route_version(*key[:2])
+        return result
+    
     @property
     def is_available(self):
         return self.available_seats > 0 and self.departure_date >= timezone.now().date()
+    
+    def is_available_for(self, held_seats):
+        """Like is_available, counting seats the viewer already holds as free"""
+        return self.available_seats + held_seats > 0 and self.departure_date >= timezone.now().date()
+    
+    def reserve_seats(self, seats):
+        """Take seats with a single conditional UPDATE so concurrent bookings cannot oversell.
+        
+        Returns False when fewer than ``seats`` are left. Only the seat column is
+        written; the in-memory ``available_seats`` is not refreshed.
+        """
+        updated = TravelOption.objects.filter(pk=self.pk, available_seats__gte=seats).update(
+            available_seats=F('available_seats') - seats, updated_at=timezone.now()
+        )
+        if updated:
+            bump_route_version(self.source_city_id, self.destination_city_id)
+            RouteDaySummary.objects.adjust_seats(self.summary_key, -seats)
+        return updated == 1
+    
+    def release_seats(self, seats):
+        """Give seats back to the pool (e.g. on cancellation)"""
+        TravelOption.objects.filter(pk=self.pk).update(
+            available_seats=F('available_seats') + seats, updated_at=timezone.now()
+        )
+        bump_route_version(self.source_city_id, self.destination_city_id)
+        RouteDaySummary.objects.adjust_seats(self.summary_key, seats)
+
+
+class RouteDaySummaryManager(models.Manager):
+    def adjust_seats(self, key, delta):
+        """Apply a seat change on one option to its day's row, in the caller's transaction"""
+        self.filter(**dict(zip(RouteDaySummary.KEY_FIELDS, key))).update(
+            available_seats=F('available_seats') + delta
+        )
+    
+    def adjust_many(self, deltas):
+        """adjust_seats() for a {key: delta} mapping, in key order.
+        
+        Writers that touch several rows in one transaction lock them in the
+        same order, so they cannot deadlock on each other.
+        """
+        for key, delta in sorted(deltas.items()):
+            self.adjust_seats(key, delta)
+    
+    def refresh(self, keys):
+        """Recount the rows for these keys from TravelOption (options were added, edited or removed).
+        
+        Runs in the caller's transaction, or in one of its own when there is none.
+        """
+        with transaction.atomic():
+            # In key order, like adjust_many, so concurrent writers cannot deadlock
+            for key in sorted({key for key in keys if key[0] is not None and key[1] is not None}):
+                lookup = dict(zip(RouteDaySummary.KEY_FIELDS, key))
+                # Lock the row before counting; the transaction holds the lock
+                # through the upsert, so a concurrent adjust_seats on it waits
+                # and applies its delta on top of this recount
+                list(self.select_for_update().filter(**lookup).values_list('id', flat=True))
+                totals = TravelOption.objects.filter(**lookup).aggregate(
+                    min_price=Min('price'), available_seats=Sum('available_seats'), departures=Count('id')
+                )
+                if not totals['departures']:
+                    self.filter(**lookup).delete()
+                    continue
+                unique_fields = {}
+                if connection.features.supports_update_conflicts_with_target:
+                    unique_fields['unique_fields'] = ['source_city', 'destination_city', 'departure_date', 'type']
+                self.bulk_create(
+                    [self.model(**lookup, **totals)],
+                    update_conflicts=True,
+                    update_fields=['min_price', 'available_seats', 'departures'],
+                    **unique_fields,
+                )
+    
+    def rebuild(self, batch_size=5000):
+        """Replace every row with a fresh aggregate over TravelOption; returns the row count"""
+        rows = (
+            TravelOption.objects.filter(source_city__isnull=False, destination_city__isnull=False)
+            .values(*RouteDaySummary.KEY_FIELDS)
+            .annotate(min_price=Min('price'), available_seats=Sum('available_seats'), departures=Count('id'))
+            .order_by()
+        )
+        created = 0
+        with transaction.atomic():
+            self.all().delete()
+            batch = []
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(self.model(**row))
+                if len(batch) >= batch_size:
+                    self.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            self.bulk_create(batch)
+            created += len(batch)
+        return created
+
+
+class RouteDaySummary(models.Model):
+    """Cheapest fare, seats left and departures per route, travel type and day.
+    
+    Materialized from TravelOption so route and calendar pages read one row
+    per day. Seat changes apply their delta in the same transaction
+    (TravelOption.reserve_seats / release_seats); adding, editing or removing
+    an option recounts its rows; ``rebuild_route_summaries`` starts over.
+    """
+    KEY_FIELDS = ('source_city_id', 'destination_city_id', 'type', 'departure_date')
+    
+    source_city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='+')
+    destination_city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='+')
+    type = models.CharField(max_length=10, choices=TravelOption.TRAVEL_TYPES)
+    departure_date = models.DateField()
+    min_price = models.DecimalField(max_digits=10, decimal_places=2)
+    available_seats = models.PositiveIntegerField()
+    departures = models.PositiveIntegerField()
+    
+    objects = RouteDaySummaryManager()
+    
+    class Meta:
+        verbose_name_plural = 'route day summaries'
+        constraints = [
+            # Date before type, so a calendar over all types is one range scan
+            models.UniqueConstraint(
+                fields=['source_city', 'destination_city', 'departure_date', 'type'],
+                name='route_day_summary_key_uniq',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.source_city.name} to {self.destination_city.name} ({self.type}, {self.departure_date})"
+
+
+class SeatHoldManager(models.Manager):
+    def held_by(self, travel_option, user):
+        """Seats ``user`` currently holds on ``travel_option`` (0 without a hold)"""
+        return self.filter(travel_option=travel_option, user=user).values_list('seats', flat=True).first() or 0
+    
+    def place(self, travel_option, user, seats):
+        """Hold ``seats`` on ``travel_option`` for ``user`` until the TTL runs out.
+        
+        A user holds seats on one option at a time: the seats of a hold on
+        any other option go back first, so opening booking pages (or a
+        browser prefetching them) cannot tie up more than one hold's worth
+        of inventory. An existing hold on this option is resized and
+        extended rather than stacked. Returns the hold, or None when the
+        seats are gone (an existing hold is then kept as it was).
+        """
+        self.release_other_holds(travel_option, user)
+        holds = self.filter(travel_option=travel_option, user=user)
+        try:
+            with transaction.atomic():
+                # Write before reading: the no-op UPDATE locks the hold row (and takes
+                # SQLite's write lock up front, so the transaction cannot deadlock)
+                hold = holds.first() if holds.update(seats=F('seats')) else None
+                held = hold.seats if hold else 0
+                if seats > held and not travel_option.reserve_seats(seats - held):
+                    return None
+                if seats < held:
+                    travel_option.release_seats(held - seats)
+                
+                expires_at = timezone.now() + timezone.timedelta(seconds=settings.SEAT_HOLD_TTL)
+                if hold is None:
+                    return self.create(travel_option=travel_option, user=user, seats=seats, expires_at=expires_at)
+                hold.seats = seats
+                hold.expires_at = expires_at
+                hold.save(update_fields=['seats', 'expires_at'])
+                return hold
+        except IntegrityError:
+            # A concurrent request from the same user created the hold first
+            return holds.first()
+    
+    def release_other_holds(self, travel_option, user):
+        """Give back the seats of ``user``'s holds on options other than ``travel_option``.
+        
+        Its own transaction, committed before place() touches the new
+        option, so option rows are never locked two at a time.
+        """
+        with transaction.atomic():
+            holds = list(
+                self.select_for_update()
+                .filter(user=user)
+                .exclude(travel_option=travel_option)
+                .values_list('id', 'travel_option_id', 'seats')
+            )
+            if holds:
+                self._return_seats(holds)
+        return len(holds)
+    
+    def take(self, travel_option, user):
+        """Delete the user's hold and return its seats, now owned by the caller.
+        
+        A hold the sweeper expired in the meantime yields 0. Call inside a
+        transaction.
+        """
+        holds = self.filter(travel_option=travel_option, user=user)
+        # Lock the row with a no-op write, as in place(), before reading it
+        if not holds.update(seats=F('seats')):
+            return 0
+        seats = holds.values_list('seats', flat=True).first()
+        holds.delete()
+        return seats
+    
+    def release_expired(self, batch_size=1000, now=None):
+        """Delete expired holds in chunks and give their seats back in bulk.
+        
+        Each chunk is one transaction: the expired rows are locked (skipping
+        any a checkout is converting), deleted together, and the seats are
+        returned with one UPDATE per travel option. Returns the holds released.
+        """
+        now = now or timezone.now()
+        released = 0
+        while True:
+            with transaction.atomic():
+                holds = list(
+                    self.select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+                    .filter(expires_at__lte=now)
+                    .order_by('expires_at')
+                    .values_list('id', 'travel_option_id', 'seats')[:batch_size]
+                )
+                if not holds:
+                    return released
+                self._return_seats(holds)
+            released += len(holds)
+    
+    def _return_seats(self, holds):
+        """Delete locked holds, given as (id, travel_option_id, seats), and give their seats back"""
+        self.filter(id__in=[hold_id for hold_id, _, _ in holds]).delete()
+        
+        seats_by_option = Counter()
+        for _, option_id, seats in holds:
+            seats_by_option[option_id] += seats
+        # Option rows in id order, as Itinerary bookings lock them
+        for option_id, seats in sorted(seats_by_option.items()):
+            TravelOption.objects.filter(pk=option_id).update(
+                available_seats=F('available_seats') + seats, updated_at=timezone.now()
+            )
+        
+        seats_by_key = Counter()
+        keys = TravelOption.objects.filter(pk__in=seats_by_option).values_list('id', *RouteDaySummary.KEY_FIELDS)
+        for option_id, *key in keys:
+            seats_by_key[tuple(key)] += seats_by_option[option_id]
+        RouteDaySummary.objects.adjust_many(seats_by_key)
+        for route in {key[:2] for key in seats_by_key}:
+            bump_route_version(*route)
+
+
+class SeatHold(models.Model):
+    """Seats set aside for one user while they fill in the booking form.
+    
+    The seats are taken out of ``TravelOption.available_seats`` when the hold
+    is placed, so holds count against availability for everyone else.
+    Expired holds are returned by the ``expire_seat_holds`` command.
+    """
+    travel_option = models.ForeignKey(TravelOption, on_delete=models.CASCADE, related_name='seat_holds')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    seats = models.PositiveIntegerField(validators=[MinValueValidator(1), MaxValueValidator(10)])
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    objects = SeatHoldManager()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['travel_option', 'user'], name='seat_hold_user_option_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.seats} seat(s) on {self.travel_option.travel_id} for {self.user.username}"
+
+
+class SeatsUnavailable(Exception):
+    """A leg of an itinerary no longer has the seats asked for"""
+    
+    def __init__(self, travel_option):
+        super().__init__(f"Not enough seats left on {travel_option.travel_id}")
+        self.travel_option = travel_option
+
+
+class ItineraryManager(models.Manager):
+    def book(self, user, legs, contact_email, contact_phone):
+        """Book every leg of an itinerary, or none of them.
+        
+        ``legs`` is a list of ``(travel_option, seats, passenger_names)``.
+        Seats are taken with the conditional UPDATE of reserve_seats, one
+        leg at a time in option id order, and the summary rows are adjusted
+        afterwards in key order: two buyers whose itineraries share options
+        wait for each other's row locks in the same order and never
+        deadlock. Raises SeatsUnavailable for the first leg that is short;
+        the whole transaction is rolled back then.
+        """
+        legs = sorted(legs, key=lambda leg: leg[0].pk)
+        with transaction.atomic():
+            # The insert comes first so SQLite takes its write lock before any read
+            itinerary = self.create(
+                user=user,
+                total_price=sum(travel.price * seats for travel, seats, _ in legs),
+            )
+            seats_by_key = Counter()
+            for travel, seats, _ in legs:
+                updated = TravelOption.objects.filter(pk=travel.pk, available_seats__gte=seats).update(
+                    available_seats=F('available_seats') - seats, updated_at=timezone.now()
+                )
+                if not updated:
+                    raise SeatsUnavailable(travel)
+                seats_by_key[travel.summary_key] -= seats
+            RouteDaySummary.objects.adjust_many(seats_by_key)
+            
+            for travel, seats, passenger_names in legs:
+                Booking.objects.create(
+                    user=user,
+                    travel_option=travel,
+                    itinerary=itinerary,
+                    number_of_seats=seats,
+                    total_price=travel.price * seats,
+                    passenger_names=passenger_names,
+                    contact_email=contact_email,
+                    contact_phone=contact_phone,
+                )
+        for route in {(travel.source_city_id, travel.destination_city_id) for travel, _, _ in legs}:
+            bump_route_version(*route)
+        return itinerary
+
+
+class Itinerary(models.Model):
+    """Several bookings (outbound and return, or connecting legs) made together"""
+    reference = models.CharField(max_length=20, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='itineraries')
+    total_price = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = ItineraryManager()
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'itineraries'
+    
+    def __str__(self):
+        return f"Itinerary {self.reference} - {self.user.username}"
+    
+    def save(self, *args, **kwargs):
+        if not self.reference:
+            self.reference = new_itinerary_reference()
+        super().save(*args, **kwargs)
+
+
+class BookingQuerySet(models.QuerySet):
+    def for_passenger(self, name):
+        """Bookings with a passenger of this name, via the Passenger.name_key index"""
+        return self.filter(passengers__name_key=Passenger.normalize(name)).distinct()
+    
+    def with_cancellable(self):
+        """Join the travel option and itinerary and annotate ``cancellable`` in SQL.
+        
+        Mirrors ``Booking.can_cancel``: confirmed and departing more than 24
+        hours from now. Comparing the date and time columns separately keeps
+        the expression portable and avoids a lazy FK fetch per row.
+        """
+        cutoff = timezone.localtime(timezone.now() + timezone.timedelta(hours=24))
+        departs_after_cutoff = (
+            Q(travel_option__departure_date__gt=cutoff.date())
+            | Q(travel_option__departure_date=cutoff.date(), travel_option__departure_time__gt=cutoff.time())
+        )
+        return self.select_related('travel_option', 'itinerary').annotate(
+            cancellable=Case(
+                When(Q(status='confirmed') & departs_after_cutoff, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            )
+        )
 
 
 class Booking(models.Model):
@@ -54,30 +541,81 @@ class Booking(models.Model):
     booking_id = models.CharField(max_length=20, unique=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     travel_option = models.ForeignKey(TravelOption, on_delete=models.CASCADE)
+    itinerary = models.ForeignKey(Itinerary, on_delete=models.SET_NULL, null=True, blank=True, related_name='bookings')
     number_of_seats = models.PositiveIntegerField(validators=[MinValueValidator(1), MaxValueValidator(10)])
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     booking_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='confirmed')
     passenger_names = models.TextField(help_text="Enter passenger names separated by commas")
     contact_email = models.EmailField()
     contact_phone = models.CharField(max_length=15)
     
+    # ArchivedBooking says True; my_bookings lists both kinds
+    archived = False
+    
+    objects = BookingQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-booking_date']
+        indexes = [
+            models.Index(fields=['user', '-booking_date', '-id'], name='booking_user_date_idx'),
+            # Manifests: confirmed bookings of one travel option
+            models.Index(fields=['travel_option', 'status'], name='booking_option_status_idx'),
+            # Exports walk a booking_date range in (booking_date, id) order
+            models.Index(fields=['booking_date', 'id'], name='booking_date_idx'),
+        ]
     
     def __str__(self):
         return f"Booking {self.booking_id} - {self.user.username}"
     
+    ID_ATTEMPTS = 3
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # As stored, so save() can tell whether the Passenger rows are still current
+        instance._saved_passenger_names = instance.__dict__.get('passenger_names')
+        return instance
+    
     def save(self, *args, **kwargs):
-        if not self.booking_id:
-            # Generate booking ID
-            import uuid
-            self.booking_id = f"BK{str(uuid.uuid4().hex)[:8].upper()}"
-        
+        adding = self._state.adding
         if not self.total_price:
             self.total_price = self.travel_option.price * self.number_of_seats
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            # Unknown stored names (a deferred field, an instance not loaded
+            # from the database) count as changed
+            names_changed = adding or self.passenger_names != getattr(self, '_saved_passenger_names', None)
+        else:
+            names_changed = 'passenger_names' in update_fields
+            kwargs['update_fields'] = {*update_fields, 'updated_at'}
         
-        super().save(*args, **kwargs)
+        if self.booking_id:
+            super().save(*args, **kwargs)
+        else:
+            self._insert_with_new_id(*args, **kwargs)
+        
+        if names_changed:
+            if not adding:
+                self.passengers.all().delete()
+            Passenger.objects.bulk_create_for([self])
+            self._saved_passenger_names = self.passenger_names
+    
+    def _insert_with_new_id(self, *args, **kwargs):
+        for attempt in range(self.ID_ATTEMPTS):
+            self.booking_id = new_booking_id()
+            try:
+                # A savepoint, so a clash leaves the caller's transaction usable
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                # Another process issued the same id in the same millisecond
+                clash = Booking.objects.filter(booking_id=self.booking_id).exists()
+                self.booking_id = ''
+                if not clash or attempt == self.ID_ATTEMPTS - 1:
+                    raise
     
     def can_cancel(self):
         """Check if booking can be cancelled (at least 24 hours before departure)"""
@@ -91,3 +629,214 @@ class Booking(models.Model):
         departure_datetime = timezone.make_aware(departure_datetime)
         
         return departure_datetime > timezone.now() + timezone.timedelta(hours=24)
+    
+    def cancel(self):
+        """Cancel the booking and restore its seats.
+        
+        The status flip is a conditional UPDATE, so when two cancellations race
+        only one of them restores the seats. Call inside a transaction.
+        """
+        cancelled = Booking.objects.filter(pk=self.pk, status='confirmed').update(
+            status='cancelled', updated_at=timezone.now()
+        )
+        if not cancelled:
+            return False
+        
+        self.status = 'cancelled'
+        self.travel_option.release_seats(self.number_of_seats)
+        return True
+
+
+class IdempotencyKeyManager(models.Manager):
+    def purge_expired(self, batch_size=1000, now=None):
+        """Delete keys older than IDEMPOTENCY_KEY_RETENTION in chunks; returns the keys deleted"""
+        cutoff = (now or timezone.now()) - timezone.timedelta(seconds=settings.IDEMPOTENCY_KEY_RETENTION)
+        purged = 0
+        while True:
+            ids = list(self.filter(created_at__lte=cutoff).order_by('created_at').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return purged
+            purged += self.filter(id__in=ids).delete()[0]
+
+
+class IdempotencyKey(models.Model):
+    """Outcome of a booking or cancellation POST, replayed when the client retries it.
+    
+    Keys come from the ``Idempotency-Key`` header or the ``idempotency_key``
+    form field (see booking.idempotency) and are kept for
+    IDEMPOTENCY_KEY_RETENTION seconds; ``purge_idempotency_keys`` deletes
+    older ones.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    scope = models.CharField(max_length=30)
+    key = models.CharField(max_length=64)
+    booking = models.ForeignKey(Booking, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    itinerary = models.ForeignKey(Itinerary, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    location = models.CharField(max_length=200)
+    # Digest of the path and form fields the key was first sent with (see booking.idempotency)
+    fingerprint = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    objects = IdempotencyKeyManager()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='idempotency_key_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.scope} {self.key} for {self.user.username}"
+
+
+class PassengerManager(models.Manager):
+    def bulk_create_for(self, bookings, batch_size=None):
+        """Create the Passenger rows for saved bookings from their passenger_names"""
+        return self.bulk_create(
+            [
+                self.model(booking_id=booking.pk, position=position, name=name, name_key=Passenger.normalize(name)[:100])
+                for booking in bookings
+                for position, name in enumerate(Passenger.split(booking.passenger_names), start=1)
+            ],
+            batch_size=batch_size,
+        )
+    
+    def manifest(self, travel_option):
+        """Passengers of the confirmed bookings on ``travel_option``, in booking order.
+        
+        One query over booking_option_status_idx and the passengers' booking index.
+        """
+        return self.filter(booking__travel_option=travel_option, booking__status='confirmed').order_by(
+            'booking__booking_date', 'booking_id', 'position'
+        ).values_list(
+            'booking__booking_id', 'position', 'name', 'booking__contact_email', 'booking__contact_phone'
+        )
+
+
+class Passenger(models.Model):
+    """One traveller on a booking, parsed from Booking.passenger_names when it is saved"""
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='passengers')
+    position = models.PositiveSmallIntegerField()
+    name = models.CharField(max_length=100)
+    name_key = models.CharField(max_length=100, db_index=True, editable=False)
+    
+    objects = PassengerManager()
+    
+    class Meta:
+        ordering = ['booking', 'position']
+    
+    def __str__(self):
+        return self.name
+    
+    @staticmethod
+    def split(names):
+        """The names in a comma-separated passenger_names string"""
+        return [name.strip()[:100] for name in names.split(',') if name.strip()]
+    
+    @staticmethod
+    def normalize(name):
+        """Case-folded, whitespace-collapsed form used for lookups"""
+        return ' '.join(name.casefold().split())
+
+
+def archived_copy(model, obj):
+    """Unsaved ``model`` archive row with the values (and id) of the live ``obj``"""
+    return model(**{
+        field.attname: getattr(obj, field.attname)
+        for field in model._meta.concrete_fields
+        if field.name != 'archived_at'
+    })
+
+
+class ArchivedTravelOptionManager(models.Manager):
+    def archive_chunk(self, cutoff, batch_size=500):
+        """Move up to ``batch_size`` options departing before ``cutoff`` and their bookings to the archive.
+        
+        The ids are picked first; then one short transaction locks those
+        options with a no-op write (which also takes SQLite's write lock
+        up front), reads them and their bookings, copies them and deletes
+        exactly the rows copied. A booking made or edited at the cutoff, or
+        by an admin, waits for the lock and is either archived or left
+        alone, never deleted without a copy. Passenger rows are dropped;
+        the archive keeps ``passenger_names``. Returns the (options,
+        bookings) moved, (0, 0) once nothing is left.
+        """
+        option_ids = list(
+            TravelOption.objects.filter(departure_date__lt=cutoff)
+            .order_by('departure_date', 'departure_time', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not option_ids:
+            return 0, 0
+        
+        with transaction.atomic():
+            # New bookings reference the option row, so they wait on this lock
+            TravelOption.objects.filter(id__in=option_ids).update(total_seats=F('total_seats'))
+            options = list(TravelOption.objects.filter(id__in=option_ids))
+            bookings = list(Booking.objects.select_for_update().filter(travel_option_id__in=option_ids))
+            self.bulk_create([archived_copy(self.model, option) for option in options])
+            ArchivedBooking.objects.bulk_create(
+                [archived_copy(ArchivedBooking, booking) for booking in bookings], batch_size=batch_size
+            )
+            Booking.objects.filter(id__in=[booking.pk for booking in bookings]).delete()
+            TravelOption.objects.filter(id__in=option_ids).delete()
+        return len(options), len(bookings)
+
+
+class ArchivedTravelOption(models.Model):
+    """A departed TravelOption, moved out of the live table by ``archive_departed``"""
+    id = models.BigIntegerField(primary_key=True)
+    travel_id = models.CharField(max_length=20, db_index=True)
+    type = models.CharField(max_length=10, choices=TravelOption.TRAVEL_TYPES)
+    source = models.CharField(max_length=100)
+    destination = models.CharField(max_length=100)
+    source_city = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, related_name='+')
+    destination_city = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, related_name='+')
+    departure_date = models.DateField()
+    departure_time = models.TimeField()
+    arrival_date = models.DateField()
+    arrival_time = models.TimeField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    available_seats = models.PositiveIntegerField()
+    total_seats = models.PositiveIntegerField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = ArchivedTravelOptionManager()
+    
+    class Meta:
+        ordering = ['departure_date', 'departure_time']
+    
+    def __str__(self):
+        return f"{self.travel_id} - {self.source} to {self.destination}"
+
+
+class ArchivedBooking(models.Model):
+    """A booking of an archived travel option; ids and booking_id are kept"""
+    id = models.BigIntegerField(primary_key=True)
+    booking_id = models.CharField(max_length=20, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    travel_option = models.ForeignKey(ArchivedTravelOption, on_delete=models.CASCADE, related_name='bookings')
+    itinerary = models.ForeignKey(Itinerary, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    number_of_seats = models.PositiveIntegerField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    booking_date = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Booking.STATUS_CHOICES)
+    passenger_names = models.TextField()
+    contact_email = models.EmailField()
+    contact_phone = models.CharField(max_length=15)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    archived = True
+    # Archived trips have departed
+    cancellable = False
+    
+    class Meta:
+        ordering = ['-booking_date']
+        indexes = [
+            models.Index(fields=['user', '-booking_date', '-id'], name='archived_booking_user_date_idx'),
+            # Exports walk a booking_date range in (booking_date, id) order
+            models.Index(fields=['booking_date', 'id'], name='archived_booking_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Booking {self.booking_id} - {self.user.username}"
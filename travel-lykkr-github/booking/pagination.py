@@ -0,0 +1,308 @@
+"""Keyset (cursor) pagination.
+
+Paginator issues COUNT(*) plus OFFSET on every page, so deep pages get
+slower as tables grow. CursorPaginator instead seeks past the last row of
+the previous page on a unique ordering, which stays an index range scan
+however deep the user goes. Tokens are signed so they stay opaque and
+cannot be forged into arbitrary filters.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+TOKEN_SALT = 'booking.pagination'
+# Below this many rows an exact COUNT(*) is cheap enough
+ESTIMATE_MIN_ROWS = 10000
+# Filtered changelists count at most this many rows
+MAX_EXACT_COUNT = 10000
+
+
+class CursorPage:
+    is_cursor = True
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class CursorPaginator:
+    """Paginate ``queryset`` on ``ordering``, which must end in a unique field.
+
+    ``ordering`` uses the usual ``'-field'`` syntax, e.g.
+    ``('departure_date', 'departure_time', 'id')``.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+
+    def get_page(self, cursor):
+        queryset, values, backwards = self._query(cursor)
+        return self._page(list(queryset[:self.per_page + 1]), values, backwards)
+
+    async def aget_page(self, cursor):
+        """Async version of get_page()"""
+        queryset, values, backwards = self._query(cursor)
+        return self._page([obj async for obj in queryset[:self.per_page + 1]], values, backwards)
+
+    def _query(self, cursor, queryset=None):
+        position = self._decode(cursor)
+        if position is None:
+            direction, values = 'next', None
+        else:
+            direction, values = position
+
+        backwards = direction == 'previous'
+        queryset = (self.queryset if queryset is None else queryset).order_by(*self._ordering(reverse=backwards))
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, reverse=backwards))
+        return queryset, values, backwards
+
+    def _page(self, rows, values, backwards):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        return CursorPage(
+            rows,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=self._encode('next', rows[-1]) if has_next and rows else None,
+            previous_cursor=self._encode('previous', rows[0]) if has_previous and rows else None,
+        )
+
+    def _ordering(self, reverse=False):
+        ordering = []
+        for field, descending in zip(self.fields, self.descending):
+            ordering.append(f"-{field}" if descending != reverse else field)
+        return ordering
+
+    def _seek(self, values, reverse=False):
+        """Build (a > x) | (a = x & b > y) | ... for the sort direction"""
+        condition = Q()
+        for index, (field, descending) in enumerate(zip(self.fields, self.descending)):
+            lookup = 'lt' if descending != reverse else 'gt'
+            equal = {name: value for name, value in zip(self.fields[:index], values[:index])}
+            condition |= Q(**equal, **{f"{field}__{lookup}": values[index]})
+        return condition
+
+    def _encode(self, direction, obj):
+        values = []
+        for field in self.fields:
+            value = obj.pk if field in ('id', 'pk') else getattr(obj, field)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return signing.dumps([direction, values], salt=TOKEN_SALT, compress=True)
+
+    def _decode(self, cursor):
+        if not cursor:
+            return None
+        try:
+            direction, raw_values = signing.loads(cursor, salt=TOKEN_SALT)
+        except (signing.BadSignature, ValueError, TypeError):
+            return None
+        if direction not in ('next', 'previous') or len(raw_values) != len(self.fields):
+            return None
+        model = self.queryset.model
+        try:
+            values = [
+                model._meta.pk.to_python(value) if field in ('id', 'pk') else model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, raw_values)
+            ]
+        except ValidationError:
+            return None
+        return direction, values
+
+
+def _sort_key(fields):
+    def key(obj):
+        return tuple(obj.pk if field in ('id', 'pk') else getattr(obj, field) for field in fields)
+    return key
+
+
+def _single_direction(ordering):
+    descending = {name.startswith('-') for name in ordering}
+    if len(descending) != 1:
+        raise ValueError('Merged pagination needs every ordering field sorted the same way')
+    return descending.pop()
+
+
+class MergedList:
+    """Querysets with the same fields read as one list in ``ordering``, for Paginator.
+
+    A slice fetches the first ``stop`` rows of each queryset and merges
+    them, so it suits short lists such as one user's bookings.
+    """
+
+    def __init__(self, querysets, ordering):
+        self.querysets = [queryset.order_by(*ordering) for queryset in querysets]
+        self.key = _sort_key([name.lstrip('-') for name in ordering])
+        self.descending = _single_direction(ordering)
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        rows = heapq.merge(
+            *(queryset[:stop] for queryset in self.querysets), key=self.key, reverse=self.descending
+        )
+        return list(islice(rows, start, stop))
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """CursorPaginator over several querysets with the same fields (e.g. live and archived rows).
+
+    Each queryset seeks past the cursor on its own index; the pages are
+    merged in Python, so a page costs one query per queryset.
+    """
+
+    def __init__(self, querysets, ordering, per_page):
+        super().__init__(querysets[0], ordering, per_page)
+        self.querysets = querysets
+        self.key = _sort_key(self.fields)
+        _single_direction(ordering)
+
+    def get_page(self, cursor):
+        rows = []
+        for queryset in self.querysets:
+            queryset, values, backwards = self._query(cursor, queryset)
+            rows.extend(queryset[:self.per_page + 1])
+        # Sorted the way _query ordered each queryset for this direction
+        rows.sort(key=self.key, reverse=self.descending[0] != backwards)
+        return self._page(rows[:self.per_page + 1], values, backwards)
+
+
+def paginate(request, queryset, cursor_ordering, per_page=10):
+    """Page numbers by default, keyset cursors when BOOKING_CURSOR_PAGINATION is on"""
+    if settings.BOOKING_CURSOR_PAGINATION:
+        return CursorPaginator(queryset, cursor_ordering, per_page).get_page(request.GET.get('cursor'))
+
+    paginator = Paginator(queryset, per_page)
+    return paginator.get_page(request.GET.get('page'))
+
+
+async def apaginate(request, queryset, cursor_ordering, per_page=10):
+    """Async version of paginate(); the page's object_list is already evaluated"""
+    if settings.BOOKING_CURSOR_PAGINATION:
+        return await CursorPaginator(queryset, cursor_ordering, per_page).aget_page(request.GET.get('cursor'))
+
+    # Paginator counts and slices synchronously, so do both here and hand it the results
+    paginator = Paginator(queryset, per_page)
+    paginator.count = await queryset.acount()
+    try:
+        number = paginator.validate_number(request.GET.get('page'))
+    except PageNotAnInteger:
+        number = 1
+    except EmptyPage:
+        number = paginator.num_pages
+    bottom = (number - 1) * per_page
+    return Page([obj async for obj in queryset[bottom:bottom + per_page]], number, paginator)
+
+
+def paginate_merged(request, querysets, cursor_ordering, per_page=10):
+    """paginate() over several querysets read as one list, e.g. live plus archived rows"""
+    if settings.BOOKING_CURSOR_PAGINATION:
+        return MergedCursorPaginator(querysets, cursor_ordering, per_page).get_page(request.GET.get('cursor'))
+
+    paginator = Paginator(MergedList(querysets, cursor_ordering), per_page)
+    return paginator.get_page(request.GET.get('page'))
+
+
+def estimated_row_count(model, using='default'):
+    """The database's own estimate of a table's size, or None where there is none.
+
+    PostgreSQL and MySQL keep one in their statistics, SQLite in
+    sqlite_stat1 once ANALYZE has run.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            # MAX(rowid) would keep counting rows deleted since (e.g. archived ones)
+            if 'sqlite_stat1' not in connection.introspection.table_names(cursor):
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+            # Each stat starts with the rows in its index; partial indexes hold fewer
+            counts = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+            return max(counts) if counts else None
+        else:
+            return None
+        row = cursor.fetchone()
+    # reltuples is -1 for a table that was never analyzed
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator for admin changelists over large tables.
+
+    An unfiltered list takes its count from the table statistics once the
+    table is large, and a filtered one counts no further than
+    MAX_EXACT_COUNT rows past the page being viewed (``rows_before``), so
+    no page load runs a full COUNT(*) scan. ``capped`` is set when rows
+    were left uncounted, so the total can be shown as a lower bound while
+    the last page link still leads further on.
+    """
+
+    def __init__(self, *args, rows_before=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rows_before = rows_before
+        self.capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATE_MIN_ROWS:
+                return estimate
+            return queryset.count()
+        limit = self.rows_before + MAX_EXACT_COUNT
+        count = queryset.order_by()[:limit + 1].count()
+        self.capped = count > limit
+        return min(count, limit)
@@ -0,0 +1,115 @@
+"""Read replicas for the browsing views.
+
+Views wrapped in ``replica_reads`` read booking data from one of
+``settings.DATABASE_REPLICAS``, picked at random per query; everything
+else, and every write, uses the primary (``default``). Sessions and users
+always come from the primary, so a fresh login is never lost to replica
+lag.
+
+A replica may lag the primary by a moment, so a user who just booked or
+cancelled would not see it in My Bookings. Views wrapped in
+``pins_primary`` (the booking and cancellation POSTs) therefore store a
+deadline in the session; until it passes, that user's browsing views read
+from the primary as well. Other users may see the change up to the
+replica lag late. Searches over a route changed that recently are cached
+from the primary (``primary_reads``), so a lagging replica's rows are not
+stored under the route's new version.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+
+# Session key holding the time.time() until which reads stay on the primary
+PIN_KEY = '_primary_pinned_until'
+REPLICATED_APPS = {'booking'}
+
+# Set while a replica_reads view runs. A context variable follows the request
+# into the sync_to_async threads the async ORM queries from
+reading_from_replica = ContextVar('booking_reading_from_replica', default=False)
+
+
+class PrimaryReplicaRouter:
+    """Send reads from replica_reads views to a replica, all else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if replicas and reading_from_replica.get() and model._meta.app_label in REPLICATED_APPS:
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, even in a replica_reads view"""
+    token = reading_from_replica.set(False)
+    try:
+        yield
+    finally:
+        reading_from_replica.reset(token)
+
+
+def pinned(deadline):
+    return deadline is not None and deadline > time.time()
+
+
+async def apinned_session(request):
+    session = getattr(request, 'session', None)
+    return session is not None and pinned(await session.aget(PIN_KEY))
+
+
+def pinned_session(request):
+    session = getattr(request, 'session', None)
+    return session is not None and pinned(session.get(PIN_KEY))
+
+
+def replica_reads(view):
+    """Run the view's booking reads on a replica unless the session is pinned to the primary"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if await apinned_session(request):
+                return await view(request, *args, **kwargs)
+            token = reading_from_replica.set(True)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                reading_from_replica.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if pinned_session(request):
+            return view(request, *args, **kwargs)
+        token = reading_from_replica.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            reading_from_replica.reset(token)
+    return wrapper
+
+
+def pins_primary(view):
+    """After a POST that redirects (succeeded), read from the primary for REPLICA_PIN_SECONDS"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if request.method == 'POST' and response.status_code in (301, 302, 303, 307, 308):
+            request.session[PIN_KEY] = time.time() + settings.REPLICA_PIN_SECONDS
+        return response
+    return wrapper
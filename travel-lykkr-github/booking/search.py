@@ -0,0 +1,180 @@
+"""Travel search with a versioned result cache in front of the query.
+
+Entries are keyed by the normalized TravelSearchForm data, the page or
+cursor, today's date and the current route versions from booking.cache,
+so a booking or schedule change on a route makes its cached pages
+unreachable immediately.
+
+Misses are filled from a read replica in replica_reads views, except for
+routes bumped within REPLICA_PIN_SECONDS: a replica may not have the
+change behind the new version yet, and its rows would otherwise be
+cached under that version for TRAVEL_SEARCH_CACHE_TIMEOUT.
+"""
+import hashlib
+import json
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import replicas
+from .cache import (
+    KEY_PREFIX, aget_versions, arecently_bumped, arecord_hit, arecord_miss, get_versions, recently_bumped,
+    record_hit, record_miss, search_cache, version_scopes,
+)
+from .models import TravelOption
+from .pagination import CursorPage, apaginate, paginate
+
+
+PER_PAGE = 10
+TRAVEL_CURSOR_ORDERING = ('departure_date', 'departure_time', 'id')
+
+
+def search_queryset(source_ids=None, destination_ids=None, travel_type=None, departure_date=None):
+    """Upcoming travel options for the resolved search criteria"""
+    travels = TravelOption.objects.filter(departure_date__gte=timezone.now().date())
+    
+    # City ids keep the lookup on the (source, destination, date, type) index
+    if source_ids is not None:
+        travels = travels.filter(source_city__in=source_ids)
+    if destination_ids is not None:
+        travels = travels.filter(destination_city__in=destination_ids)
+    if travel_type:
+        travels = travels.filter(type=travel_type)
+    if departure_date:
+        travels = travels.filter(departure_date=departure_date)
+    return travels
+
+
+def search_criteria(form):
+    """Resolved criteria for a TravelSearchForm; an invalid form searches everything"""
+    if not form.is_valid():
+        return {'source_ids': None, 'destination_ids': None, 'travel_type': '', 'departure_date': None}
+    source_ids, destination_ids = form.route_city_ids()
+    return {
+        'source_ids': source_ids,
+        'destination_ids': destination_ids,
+        'travel_type': form.cleaned_data.get('travel_type') or '',
+        'departure_date': form.cleaned_data.get('departure_date'),
+    }
+
+
+async def asearch_criteria(form):
+    """Async version of search_criteria()"""
+    if not form.is_valid():
+        return search_criteria(form)
+    source_ids, destination_ids = await form.aroute_city_ids()
+    return {
+        'source_ids': source_ids,
+        'destination_ids': destination_ids,
+        'travel_type': form.cleaned_data.get('travel_type') or '',
+        'departure_date': form.cleaned_data.get('departure_date'),
+    }
+
+
+class TravelSearch:
+    """One search request: resolved criteria, its cache key and its page of results"""
+    
+    def __init__(self, form, request, criteria=None):
+        self.request = request
+        self.criteria = search_criteria(form) if criteria is None else criteria
+        if settings.BOOKING_CURSOR_PAGINATION:
+            self.position = ['cursor', request.GET.get('cursor', '')]
+        else:
+            self.position = ['page', request.GET.get('page', '')]
+    
+    @cached_property
+    def scopes(self):
+        return version_scopes(self.criteria['source_ids'], self.criteria['destination_ids'])
+    
+    @cached_property
+    def versions(self):
+        return get_versions(self.scopes)
+    
+    @cached_property
+    def fingerprint(self):
+        """Digest of criteria, position and route versions; changes whenever the results can"""
+        criteria = self.criteria
+        key_data = {
+            'source': sorted(criteria['source_ids']) if criteria['source_ids'] is not None else None,
+            'destination': sorted(criteria['destination_ids']) if criteria['destination_ids'] is not None else None,
+            'type': criteria['travel_type'],
+            'date': criteria['departure_date'].isoformat() if criteria['departure_date'] else '',
+            'position': self.position,
+            'today': timezone.now().date().isoformat(),
+            'versions': self.versions,
+        }
+        return hashlib.sha1(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+    
+    @property
+    def cache_key(self):
+        return f"{KEY_PREFIX}:result:{self.fingerprint}"
+    
+    def page(self):
+        """Return the requested page of results, from the cache when possible"""
+        travels = search_queryset(**self.criteria)
+        cache = search_cache()
+        cached = cache.get(self.cache_key)
+        if cached is not None:
+            record_hit()
+            return _thaw(cached, travels)
+        
+        record_miss()
+        lagging = replicas.reading_from_replica.get() and recently_bumped(self.scopes)
+        with replicas.primary_reads() if lagging else nullcontext():
+            page_obj = paginate(self.request, travels, TRAVEL_CURSOR_ORDERING, PER_PAGE)
+            # Evaluates the page's rows inside the block
+            frozen = _freeze(page_obj)
+        cache.set(self.cache_key, frozen, settings.TRAVEL_SEARCH_CACHE_TIMEOUT)
+        return page_obj
+    
+    async def apage(self):
+        """Async version of page(); every query and cache call is awaited"""
+        travels = search_queryset(**self.criteria)
+        # Fill the versions cached_property so the fingerprint does not fetch them synchronously
+        self.versions = await aget_versions(self.scopes)
+        cache = search_cache()
+        cached = await cache.aget(self.cache_key)
+        if cached is not None:
+            await arecord_hit()
+            return _thaw(cached, travels)
+        
+        await arecord_miss()
+        lagging = replicas.reading_from_replica.get() and await arecently_bumped(self.scopes)
+        with replicas.primary_reads() if lagging else nullcontext():
+            page_obj = await apaginate(self.request, travels, TRAVEL_CURSOR_ORDERING, PER_PAGE)
+        await cache.aset(self.cache_key, _freeze(page_obj), settings.TRAVEL_SEARCH_CACHE_TIMEOUT)
+        return page_obj
+
+
+def search_travel_page(form, request):
+    """Return the requested page of search results, from the cache when possible"""
+    return TravelSearch(form, request).page()
+
+
+async def asearch_travel_page(form, request):
+    """Async version of search_travel_page()"""
+    search = TravelSearch(form, request, criteria=await asearch_criteria(form))
+    return await search.apage()
+
+
+def _freeze(page_obj):
+    if isinstance(page_obj, CursorPage):
+        return page_obj
+    return {
+        'count': page_obj.paginator.count,
+        'number': page_obj.number,
+        'per_page': page_obj.paginator.per_page,
+        'objects': list(page_obj.object_list),
+    }
+
+
+def _thaw(value, queryset):
+    if isinstance(value, CursorPage):
+        return value
+    paginator = Paginator(queryset, value['per_page'])
+    # count is a cached_property; setting it skips the COUNT(*)
+    paginator.count = value['count']
+    return Page(value['objects'], value['number'], paginator)
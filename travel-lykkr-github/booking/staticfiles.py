@@ -0,0 +1,135 @@
+"""Hashed, pre-compressed static files with far-future caching.
+
+``CompressedManifestStaticFilesStorage`` is Django's manifest storage
+(``base.css`` is collected as ``base.<content hash>.css`` and ``{% static %}``
+links to that name) that also writes ``.gz`` and, when the ``brotli``
+package is installed, ``.br`` copies of each hashed text file at
+collectstatic time, so no request pays for compression.
+
+A hashed name changes whenever the file does, so its response can be
+cached for a year without revalidating. ``serve`` does that for
+deployments where Django serves STATIC_ROOT itself (``SERVE_STATIC``);
+a front-end server should be set up the same way: immutable caching for
+hashed names, and the ``.br``/``.gz`` sibling when Accept-Encoding allows.
+"""
+import gzip
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.txt', '.html', '.json', '.xml', '.map'}
+# Content-Encoding and file suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Unhashed names (files not in the manifest) may change under the same URL
+SHORT_CACHE_CONTROL = 'public, max-age=300'
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    # mtime=0 keeps the output identical between collectstatic runs
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also saves .gz/.br copies of hashed text files"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for hashed_name in sorted(hashed_names):
+            if os.path.splitext(hashed_name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                self.save_compressed(hashed_name)
+
+    def save_compressed(self, name):
+        with self.open(name) as original:
+            data = original.read()
+        for encoding, suffix in ENCODINGS:
+            if encoding == 'br' and brotli is None:
+                continue
+            compressed = compress(data, encoding)
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            # Not worth a Content-Encoding when it saves nothing
+            if len(compressed) < len(data):
+                self._save(name + suffix, ContentFile(compressed))
+
+
+def accepted_encodings(request):
+    """Content codings the client accepts (those without q=0)"""
+    accepted = set()
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = item.partition(';')
+        quality = params.strip().removeprefix('q=').strip()
+        try:
+            if quality and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+@require_safe
+def serve(request, path):
+    """Serve a file from STATIC_ROOT, pre-compressed when possible, cached for a year when hashed"""
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid path')
+    if not os.path.isfile(fullpath):
+        raise Http404(f'"{path}" does not exist')
+
+    hashed = path in getattr(staticfiles_storage, 'hashed_files', {}).values()
+    stat = os.stat(fullpath)
+    if not hashed and not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type, original_encoding = mimetypes.guess_type(fullpath)
+    variants = [
+        (encoding, fullpath + suffix)
+        for encoding, suffix in ENCODINGS
+        if original_encoding is None and os.path.isfile(fullpath + suffix)
+    ]
+    encoding, filepath = None, fullpath
+    accepted = accepted_encodings(request)
+    for variant_encoding, variant_path in variants:
+        if variant_encoding in accepted:
+            encoding, filepath = variant_encoding, variant_path
+            break
+
+    response = FileResponse(
+        open(filepath, 'rb'),
+        content_type=content_type or 'application/octet-stream',
+        filename=os.path.basename(fullpath),
+    )
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if variants:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if hashed else SHORT_CACHE_CONTROL
+    return response
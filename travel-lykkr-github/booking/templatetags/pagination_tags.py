@@ -0,0 +1,15 @@
+from django import template
+
+
+register = template.Library()
+
+
+@register.filter
+def page_window(page_obj, on_each_side=2):
+    """Page numbers within ``on_each_side`` of the current page.
+
+    Looping over ``paginator.page_range`` to pick these out costs one
+    template iteration per page, which dominates rendering on large result sets.
+    """
+    number = page_obj.number
+    return range(max(1, number - on_each_side), min(page_obj.paginator.num_pages, number + on_each_side) + 1)
@@ -0,0 +1,18 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from booking.fragments import render_fragments
+
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def travel_cards(context, travels):
+    """All cards of a result page, fetched from the fragment cache in one round trip"""
+    return mark_safe(''.join(render_fragments('card', list(travels), context['user'])))
+
+
+@register.simple_tag(takes_context=True)
+def travel_detail_body(context, travel):
+    return mark_safe(render_fragments('detail', [travel], context['user'])[0])
@@ -1,10 +1,31 @@
-from django.test import TestCase, Client
-from django.contrib.auth.models import User
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import Http404
 from django.urls import reverse
 from django.utils import timezone
 from datetime import date, time, timedelta
 from decimal import Decimal
-from .models import UserProfile, TravelOption, Booking
+from .models import (
+    UserProfile, City, CityAlias, TravelOption, Booking, IdempotencyKey, Itinerary, Passenger, SeatHold,
+    SeatsUnavailable, RouteDaySummary, ArchivedBooking, ArchivedTravelOption,
+)
+from .cache import get_versions, search_cache, search_cache_stats, state_cache
+from .fragments import fragment_cache, fragment_key
+from .pagination import CursorPaginator, EstimatedCountPaginator, estimated_row_count
+from . import exports, ids, metrics, replicas, staticfiles, timetable, views
 
 
 class UserProfileModelTest(TestCase):
@@ -93,6 +114,29 @@ class BookingModelTest(TestCase):
         self.assertEqual(booking.status, 'confirmed')
         self.assertTrue(booking.can_cancel())
     
+    def book(self):
+        return Booking.objects.create(
+            user=self.user,
+            travel_option=self.travel,
+            number_of_seats=1,
+            passenger_names='John Doe',
+            contact_email='test@example.com',
+            contact_phone='1234567890'
+        )
+    
+    def test_booking_ids_are_time_ordered(self):
+        booking_ids = [ids.new_booking_id() for _ in range(1000)]
+        self.assertEqual(booking_ids, sorted(booking_ids))
+        self.assertEqual(len(set(booking_ids)), len(booking_ids))
+        self.assertTrue(all(len(booking_id) == 16 for booking_id in booking_ids))
+        self.assertEqual(ids.normalize(' bk01jc8z3qw7k2O '), 'BK01JC8Z3QW7K20')
+    
+    def test_clashing_booking_id_is_retried(self):
+        first = self.book()
+        with mock.patch('booking.models.new_booking_id', side_effect=[first.booking_id, 'BK0000000000001']):
+            second = self.book()
+        self.assertEqual(second.booking_id, 'BK0000000000001')
+    
     def test_booking_cannot_cancel_near_departure(self):
         # Set departure to tomorrow
         self.travel.departure_date = date.today() + timedelta(days=1)
@@ -312,3 +356,1702 @@ class SearchFilterTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'TR001')
         self.assertNotContains(response, 'FL001')
+
+
+class SeatReservationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.travel = TravelOption.objects.create(
+            travel_id='FL001',
+            type='flight',
+            source='New York',
+            destination='Los Angeles',
+            departure_date=date.today() + timedelta(days=7),
+            departure_time=time(10, 0),
+            arrival_date=date.today() + timedelta(days=7),
+            arrival_time=time(13, 0),
+            price=Decimal('299.99'),
+            available_seats=3,
+            total_seats=50
+        )
+    
+    def test_reserve_seats_is_conditional(self):
+        self.assertTrue(self.travel.reserve_seats(2))
+        self.assertFalse(self.travel.reserve_seats(2))
+        self.travel.refresh_from_db()
+        self.assertEqual(self.travel.available_seats, 1)
+    
+    def test_cancel_restores_seats_once(self):
+        booking = Booking.objects.create(
+            user=self.user,
+            travel_option=self.travel,
+            number_of_seats=2,
+            passenger_names='John Doe, Jane Doe',
+            contact_email='test@example.com',
+            contact_phone='1234567890'
+        )
+        self.assertTrue(self.travel.reserve_seats(2))
+        
+        stale_copy = Booking.objects.get(pk=booking.pk)
+        self.assertTrue(booking.cancel())
+        self.assertFalse(stale_copy.cancel())
+        
+        self.travel.refresh_from_db()
+        self.assertEqual(self.travel.available_seats, 3)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'cancelled')
+
+
+class CitySearchTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.travel = TravelOption.objects.create(
+            travel_id='FL101',
+            type='flight',
+            source='Mumbai',
+            destination='  Delhi ',
+            departure_date=date.today() + timedelta(days=3),
+            departure_time=time(8, 0),
+            arrival_date=date.today() + timedelta(days=3),
+            arrival_time=time(10, 0),
+            price=Decimal('4999.00'),
+            available_seats=20,
+            total_seats=20
+        )
+    
+    def test_cities_are_resolved_on_save(self):
+        self.assertEqual(self.travel.source_city.name_key, 'mumbai')
+        self.assertEqual(self.travel.destination_city.name, 'Delhi')
+        self.assertEqual(City.objects.for_name('DELHI'), self.travel.destination_city)
+    
+    def test_search_is_case_insensitive(self):
+        response = self.client.get(reverse('travel_list'), {'source': 'mUMBAI', 'destination': 'delhi'})
+        self.assertContains(response, 'FL101')
+    
+    def test_search_by_alias(self):
+        CityAlias.objects.create(city=self.travel.source_city, alias='Bombay')
+        self.assertEqual(City.objects.for_name('bombay'), self.travel.source_city)
+        response = self.client.get(reverse('travel_list'), {'source': 'Bombay'})
+        self.assertContains(response, 'FL101')
+    
+    def test_unknown_city_returns_nothing(self):
+        response = self.client.get(reverse('travel_list'), {'source': 'Atlantis'})
+        self.assertNotContains(response, 'FL101')
+
+
+class CursorPaginationTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        for i in range(25):
+            TravelOption.objects.create(
+                travel_id=f'BS{i:03d}',
+                type='bus',
+                source='Pune',
+                destination='Nashik',
+                departure_date=date.today() + timedelta(days=1 + i % 3),
+                departure_time=time(9, 0),
+                arrival_date=date.today() + timedelta(days=1 + i % 3),
+                arrival_time=time(13, 0),
+                price=Decimal('450.00'),
+                available_seats=40,
+                total_seats=40
+            )
+        self.ordering = ('departure_date', 'departure_time', 'id')
+    
+    def test_walks_forward_and_back_in_order(self):
+        expected = list(TravelOption.objects.order_by(*self.ordering).values_list('travel_id', flat=True))
+        paginator = CursorPaginator(TravelOption.objects.all(), self.ordering, 10)
+        
+        seen = []
+        pages = []
+        page = paginator.get_page(None)
+        while True:
+            pages.append([travel.travel_id for travel in page])
+            seen.extend(pages[-1])
+            if not page.has_next():
+                break
+            page = paginator.get_page(page.next_cursor)
+        self.assertEqual(seen, expected)
+        self.assertEqual([len(p) for p in pages], [10, 10, 5])
+        
+        previous = paginator.get_page(page.previous_cursor)
+        self.assertEqual([travel.travel_id for travel in previous], pages[1])
+        self.assertTrue(previous.has_previous())
+    
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        paginator = CursorPaginator(TravelOption.objects.all(), self.ordering, 10)
+        page = paginator.get_page('not-a-cursor')
+        self.assertFalse(page.has_previous())
+        self.assertEqual(len(page), 10)
+    
+    @override_settings(BOOKING_CURSOR_PAGINATION=True)
+    def test_travel_list_uses_next_previous_links(self):
+        response = self.client.get(reverse('travel_list'), {'travel_type': 'bus'})
+        self.assertContains(response, '?cursor=')
+        self.assertNotContains(response, '?page=')
+        
+        next_cursor = response.context['page_obj'].next_cursor
+        response = self.client.get(reverse('travel_list'), {'travel_type': 'bus', 'cursor': next_cursor})
+        self.assertTrue(response.context['page_obj'].has_previous())
+
+
+class BookingCancellableTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.soon = TravelOption.objects.create(
+            travel_id='TR201',
+            type='train',
+            source='Jaipur',
+            destination='Agra',
+            departure_date=date.today(),
+            departure_time=time(23, 59),
+            arrival_date=date.today() + timedelta(days=1),
+            arrival_time=time(4, 0),
+            price=Decimal('650.00'),
+            available_seats=100,
+            total_seats=100
+        )
+        self.later = TravelOption.objects.create(
+            travel_id='TR202',
+            type='train',
+            source='Jaipur',
+            destination='Agra',
+            departure_date=date.today() + timedelta(days=10),
+            departure_time=time(6, 0),
+            arrival_date=date.today() + timedelta(days=10),
+            arrival_time=time(10, 0),
+            price=Decimal('650.00'),
+            available_seats=100,
+            total_seats=100
+        )
+    
+    def _book(self, travel, status='confirmed'):
+        return Booking.objects.create(
+            user=self.user,
+            travel_option=travel,
+            number_of_seats=1,
+            passenger_names='John Doe',
+            contact_email='test@example.com',
+            contact_phone='1234567890',
+            status=status
+        )
+    
+    def test_annotation_matches_can_cancel(self):
+        bookings = [self._book(self.soon), self._book(self.later), self._book(self.later, status='cancelled')]
+        annotated = Booking.objects.with_cancellable().in_bulk([b.pk for b in bookings])
+        for booking in bookings:
+            self.assertEqual(annotated[booking.pk].cancellable, booking.can_cancel())
+        self.assertTrue(annotated[bookings[1].pk].cancellable)
+    
+    def test_my_bookings_query_count_does_not_grow(self):
+        self.client.login(username='testuser', password='testpass123')
+        self._book(self.later)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('my_bookings'))
+        for _ in range(5):
+            self._book(self.later)
+            self._book(self.soon)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse('my_bookings'))
+        self.assertEqual(len(few), len(many))
+        self.assertContains(response, 'Cannot Cancel')
+    
+    def test_cancel_view_rejects_near_departure(self):
+        self.client.login(username='testuser', password='testpass123')
+        booking = self._book(self.soon)
+        response = self.client.post(reverse('cancel_booking', args=[booking.booking_id]))
+        self.assertRedirects(response, reverse('my_bookings'))
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'confirmed')
+
+
+class SearchCacheTest(TestCase):
+    def setUp(self):
+        search_cache().clear()
+        state_cache().clear()
+        self.client = Client()
+        self.route = TravelOption.objects.create(
+            travel_id='FL301',
+            type='flight',
+            source='Chennai',
+            destination='Kolkata',
+            departure_date=date.today() + timedelta(days=4),
+            departure_time=time(7, 30),
+            arrival_date=date.today() + timedelta(days=4),
+            arrival_time=time(10, 0),
+            price=Decimal('5200.00'),
+            available_seats=30,
+            total_seats=30
+        )
+        self.other = TravelOption.objects.create(
+            travel_id='FL302',
+            type='flight',
+            source='Lucknow',
+            destination='Indore',
+            departure_date=date.today() + timedelta(days=4),
+            departure_time=time(9, 30),
+            arrival_date=date.today() + timedelta(days=4),
+            arrival_time=time(11, 0),
+            price=Decimal('4100.00'),
+            available_seats=30,
+            total_seats=30
+        )
+        self.search = {'source': 'Chennai', 'destination': 'kolkata '}
+    
+    def test_repeated_search_is_a_hit(self):
+        self.client.get(reverse('travel_list'), self.search)
+        self.assertEqual(search_cache_stats()['misses'], 1)
+        response = self.client.get(reverse('travel_list'), self.search)
+        self.assertEqual(search_cache_stats()['hits'], 1)
+        self.assertContains(response, 'FL301')
+        self.assertContains(response, '30/30')
+    
+    def test_seat_change_invalidates_route(self):
+        self.client.get(reverse('travel_list'), self.search)
+        self.assertTrue(self.route.reserve_seats(2))
+        response = self.client.get(reverse('travel_list'), self.search)
+        self.assertEqual(search_cache_stats(), {'hits': 0, 'misses': 2, 'hit_ratio': 0.0})
+        self.assertContains(response, '28/30')
+    
+    def test_other_route_change_keeps_entry(self):
+        self.client.get(reverse('travel_list'), self.search)
+        self.other.reserve_seats(1)
+        self.other.price = Decimal('3900.00')
+        self.other.save()
+        self.client.get(reverse('travel_list'), self.search)
+        self.assertEqual(search_cache_stats()['hits'], 1)
+    
+    def test_unfiltered_search_sees_any_change(self):
+        self.client.get(reverse('travel_list'))
+        self.other.reserve_seats(1)
+        response = self.client.get(reverse('travel_list'))
+        self.assertEqual(search_cache_stats()['hits'], 0)
+        self.assertContains(response, '29/30')
+    
+    def test_versions_outlive_culled_results(self):
+        versions = get_versions(['all'])
+        self.client.get(reverse('travel_list'), self.search)
+        # What a full results cache does to its entries
+        search_cache().clear()
+        self.assertEqual(get_versions(['all']), versions)
+        self.assertEqual(search_cache_stats()['misses'], 1)
+
+
+class TravelApiTest(TestCase):
+    def setUp(self):
+        search_cache().clear()
+        state_cache().clear()
+        self.client = Client()
+        self.travel = TravelOption.objects.create(
+            travel_id='BS401',
+            type='bus',
+            source='Bhopal',
+            destination='Indore',
+            departure_date=date.today() + timedelta(days=2),
+            departure_time=time(6, 15),
+            arrival_date=date.today() + timedelta(days=2),
+            arrival_time=time(10, 0),
+            price=Decimal('399.00'),
+            available_seats=40,
+            total_seats=40
+        )
+    
+    def test_search_returns_compact_rows(self):
+        response = self.client.get(reverse('api_travel_search'), {'source': 'bhopal'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['travel_id'], 'BS401')
+        self.assertEqual(data['results'][0]['price'], '399.00')
+        self.assertEqual(data['results'][0]['departure_time'], '06:15')
+    
+    def test_search_revalidation_returns_304_until_seats_change(self):
+        url = reverse('api_travel_search')
+        etag = self.client.get(url, {'source': 'Bhopal'})['ETag']
+        
+        response = self.client.get(url, {'source': 'Bhopal'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        
+        self.travel.reserve_seats(1)
+        response = self.client.get(url, {'source': 'Bhopal'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['available_seats'], 39)
+    
+    def test_invalid_search_is_rejected(self):
+        response = self.client.get(reverse('api_travel_search'), {'departure_date': 'soon'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('departure_date', response.json()['errors'])
+    
+    def test_detail_etag(self):
+        url = reverse('api_travel_detail', args=[self.travel.id])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['available_seats'], 40)
+        
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(reverse('api_travel_detail', args=[9999])).status_code, 404)
+
+
+class PopulateSampleDataTest(TestCase):
+    def populate(self, **options):
+        call_command('populate_sample_data', stdout=StringIO(), **options)
+        return list(TravelOption.objects.order_by('travel_id').values_list('travel_id', 'source', 'price', 'available_seats'))
+    
+    def test_seed_is_reproducible(self):
+        first = self.populate(count=30, seed=11)
+        self.assertEqual(len(first), 30)
+        self.assertEqual(self.populate(count=30, seed=11), first)
+    
+    def test_bookings_consume_seats(self):
+        self.populate(count=20, users=5, bookings=60, seed=3, batch_size=7)
+        self.assertEqual(User.objects.filter(username__startswith='sample_user_').count(), 5)
+        self.assertGreater(Booking.objects.count(), 0)
+        for travel in TravelOption.objects.all():
+            booked = sum(
+                travel.booking_set.filter(status='confirmed').values_list('number_of_seats', flat=True)
+            )
+            self.assertEqual(travel.available_seats, travel.total_seats - booked)
+            self.assertEqual(travel.source_city.name, travel.source)
+        self.assertEqual(
+            Passenger.objects.count(), sum(Booking.objects.values_list('number_of_seats', flat=True))
+        )
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.staff = User.objects.create_user(
+            username='ops',
+            email='ops@example.com',
+            password='testpass123',
+            is_staff=True
+        )
+    
+    def test_metrics_are_staff_only(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+        User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+    
+    def test_exposition_includes_views_and_queries(self):
+        self.client.get(reverse('travel_list'))
+        self.client.login(username='ops', password='testpass123')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('travellykkr_http_request_duration_seconds_bucket{view="travel_list",method="GET",le="+Inf"}', body)
+        self.assertIn('travellykkr_db_queries_total{view="travel_list",method="GET"}', body)
+        self.assertIn('travellykkr_http_responses_total{view="travel_list",method="GET",status="200"}', body)
+        self.assertIn('travellykkr_search_cache_misses_total', body)
+    
+    def test_snapshots_outlive_culled_results(self):
+        self.client.get(reverse('travel_list'))
+        metrics.registry.flush()
+        # What a full search results cache does to its entries
+        search_cache().clear()
+        # collect() flushes first, so check the stored snapshot itself
+        metrics_cache = metrics.metrics_cache()
+        self.assertIn(metrics.registry.worker_key, metrics_cache.get(metrics.WORKERS_KEY))
+        snapshot = metrics_cache.get(metrics.registry.worker_key)
+        self.assertGreaterEqual(snapshot[('travel_list', 'GET')]['count'], 1)
+
+
+class SeatHoldTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123', email='test@example.com')
+        self.travel = TravelOption.objects.create(
+            travel_id='FL300',
+            type='flight',
+            source='Mumbai',
+            destination='Delhi',
+            departure_date=date.today() + timedelta(days=7),
+            departure_time=time(10, 0),
+            arrival_date=date.today() + timedelta(days=7),
+            arrival_time=time(12, 0),
+            price=Decimal('5000.00'),
+            available_seats=2,
+            total_seats=100
+        )
+        self.client.login(username='testuser', password='testpass123')
+    
+    def book(self, seats):
+        return self.client.post(reverse('book_travel', args=[self.travel.id]), {
+            'number_of_seats': seats,
+            'passenger_names': ', '.join(f'Passenger {n}' for n in range(seats)),
+            'contact_email': 'test@example.com',
+            'contact_phone': '9876543210'
+        })
+    
+    def test_opening_booking_page_holds_seats(self):
+        self.client.get(reverse('book_travel', args=[self.travel.id]), {'seats': 2})
+        self.travel.refresh_from_db()
+        self.assertEqual(self.travel.available_seats, 0)
+        self.assertEqual(SeatHold.objects.held_by(self.travel, self.user), 2)
+        
+        # Nobody else can take the held seats, but the holder can still book them
+        User.objects.create_user(username='other', password='testpass123')
+        other_client = Client()
+        other_client.login(username='other', password='testpass123')
+        response = other_client.get(reverse('book_travel', args=[self.travel.id]))
+        self.assertRedirects(response, reverse('travel_list'))
+        
+        response = self.book(2)
+        self.assertRedirects(response, reverse('my_bookings'))
+        self.travel.refresh_from_db()
+        self.assertEqual(self.travel.available_seats, 0)
+        self.assertFalse(SeatHold.objects.exists())
+        self.assertEqual(Booking.objects.get(user=self.user).number_of_seats, 2)
+    
+    def test_booking_fewer_seats_than_held_releases_the_rest(self):
+        self.client.get(reverse('book_travel', args=[self.travel.id]), {'seats': 2})
+        self.book(1)
+        self.travel.refresh_from_db()
+        self.assertEqual(self.travel.available_seats, 1)
+    
+    def test_failed_conversion_keeps_hold(self):
+        self.client.get(reverse('book_travel', args=[self.travel.id]))
+        # Another buyer takes the last free seat between validation and the update
+        with mock.patch.object(TravelOption, 'reserve_seats', return_value=False):
+            response = self.book(2)
+        self.assertRedirects(response, reverse('book_travel', args=[self.travel.id]), fetch_redirect_response=False)
+        self.assertEqual(SeatHold.objects.held_by(self.travel, self.user), 1)
+        self.assertFalse(Booking.objects.exists())
+    
+    def test_one_hold_per_user(self):
+        second = TravelOption.objects.create(
+            travel_id='FL301',
+            type='flight',
+            source='Mumbai',
+            destination='Delhi',
+            departure_date=date.today() + timedelta(days=8),
+            departure_time=time(10, 0),
+            arrival_date=date.today() + timedelta(days=8),
+            arrival_time=time(12, 0),
+            price=Decimal('5000.00'),
+            available_seats=10,
+            total_seats=100
+        )
+        self.client.get(reverse('book_travel', args=[self.travel.id]), {'seats': 2})
+        self.client.get(reverse('book_travel', args=[second.id]), {'seats': 10})
+        self.travel.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((self.travel.available_seats, second.available_seats), (2, 0))
+        self.assertEqual(list(SeatHold.objects.values_list('travel_option', 'seats')), [(second.id, 10)])
+    
+    def test_failed_resize_keeps_hold_and_expiry(self):
+        hold = SeatHold.objects.place(self.travel, self.user, 1)
+        self.assertIsNone(SeatHold.objects.place(self.travel, self.user, 5))
+        self.assertEqual(SeatHold.objects.values_list('seats', 'expires_at').get(), (1, hold.expires_at))
+    
+    def test_expired_holds_are_released_in_bulk(self):
+        other = User.objects.create_user(username='other', password='testpass123')
+        SeatHold.objects.place(self.travel, self.user, 1)
+        SeatHold.objects.place(self.travel, other, 1)
+        SeatHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        
+        out = StringIO()
+        call_command('expire_seat_holds', batch_size=1, stdout=out)
+        self.assertIn('Released 2 expired seat holds', out.getvalue())
+        self.travel.refresh_from_db()
+        self.assertEqual(self.travel.available_seats, 2)
+        self.assertFalse(SeatHold.objects.exists())
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        search_cache().clear()
+        state_cache().clear()
+        for n in range(12):
+            TravelOption.objects.create(
+                travel_id=f'FL4{n:02d}',
+                type='flight',
+                source='Mumbai',
+                destination='Delhi',
+                departure_date=date.today() + timedelta(days=n + 1),
+                departure_time=time(10, 0),
+                arrival_date=date.today() + timedelta(days=n + 1),
+                arrival_time=time(12, 0),
+                price=Decimal('5000.00'),
+                available_seats=50,
+                total_seats=100
+            )
+        self.other = TravelOption.objects.create(
+            travel_id='TR401',
+            type='train',
+            source='Chennai',
+            destination='Pune',
+            departure_date=date.today() + timedelta(days=3),
+            departure_time=time(8, 0),
+            arrival_date=date.today() + timedelta(days=4),
+            arrival_time=time(6, 0),
+            price=Decimal('900.00'),
+            available_seats=200,
+            total_seats=200
+        )
+    
+    def async_request(self, path, data=None):
+        request = AsyncRequestFactory().get(path, data or {})
+        
+        async def auser():
+            return AnonymousUser()
+        
+        request.auser = auser
+        return request
+    
+    async def test_travel_list_async_matches_sync_search(self):
+        request = self.async_request(reverse('travel_list'), {'source': 'mum', 'page': 2})
+        response = await views.travel_list_async(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'FL410')
+        self.assertNotContains(response, 'FL400')
+        self.assertNotContains(response, 'TR401')
+        
+        # The second request is answered from the search cache
+        await views.travel_list_async(self.async_request(reverse('travel_list'), {'source': 'mum', 'page': 2}))
+        self.assertEqual(search_cache_stats()['hits'], 1)
+    
+    async def test_travel_detail_async(self):
+        response = await views.travel_detail_async(self.async_request('/'), travel_id=self.other.id)
+        self.assertContains(response, 'TR401')
+        with self.assertRaises(Http404):
+            await views.travel_detail_async(self.async_request('/'), travel_id=self.other.id + 1000)
+
+
+class FragmentCacheTest(TestCase):
+    def setUp(self):
+        search_cache().clear()
+        state_cache().clear()
+        fragment_cache().clear()
+        self.client = Client()
+        self.travel = TravelOption.objects.create(
+            travel_id='FL500',
+            type='flight',
+            source='Mumbai',
+            destination='Delhi',
+            departure_date=date.today() + timedelta(days=7),
+            departure_time=time(10, 0),
+            arrival_date=date.today() + timedelta(days=7),
+            arrival_time=time(12, 0),
+            price=Decimal('5000.00'),
+            available_seats=50,
+            total_seats=100
+        )
+    
+    def test_cached_card_is_reused(self):
+        self.client.get(reverse('travel_list'))
+        key = fragment_key('card', TravelOption.objects.get(pk=self.travel.pk), AnonymousUser())
+        self.assertIn('FL500', fragment_cache().get(key))
+        
+        fragment_cache().set(key, '<div>cached card</div>')
+        response = self.client.get(reverse('travel_list'))
+        self.assertContains(response, 'cached card')
+    
+    def test_price_change_renders_new_card(self):
+        self.client.get(reverse('travel_list'))
+        self.travel.price = Decimal('6123.00')
+        self.travel.save()
+        response = self.client.get(reverse('travel_list'))
+        self.assertContains(response, '6123.00')
+        self.assertNotContains(response, '5000.00')
+    
+    def test_cards_vary_by_login(self):
+        self.assertContains(self.client.get(reverse('travel_list')), 'Login to Book')
+        User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('travel_list'))
+        self.assertContains(response, 'Book Now')
+        self.assertNotContains(response, 'Login to Book')
+    
+    def test_detail_body_is_cached(self):
+        self.client.get(reverse('travel_detail', args=[self.travel.id]))
+        key = fragment_key('detail', TravelOption.objects.get(pk=self.travel.pk), AnonymousUser())
+        fragment_cache().set(key, '<div>cached detail</div>')
+        self.assertContains(self.client.get(reverse('travel_detail', args=[self.travel.id])), 'cached detail')
+
+
+class RouteDaySummaryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123', email='test@example.com')
+        self.day = date.today() + timedelta(days=5)
+        self.first = self.create_option('FL400', Decimal('5000.00'), 10)
+        self.second = self.create_option('FL401', Decimal('4200.50'), 6)
+    
+    def create_option(self, travel_id, price, seats, **fields):
+        values = dict(
+            travel_id=travel_id,
+            type='flight',
+            source='Mumbai',
+            destination='Delhi',
+            departure_date=self.day,
+            departure_time=time(10, 0),
+            arrival_date=self.day,
+            arrival_time=time(12, 0),
+            price=price,
+            available_seats=seats,
+            total_seats=100
+        )
+        values.update(fields)
+        return TravelOption.objects.create(**values)
+    
+    def summary(self, day=None):
+        return RouteDaySummary.objects.get(departure_date=day or self.day)
+    
+    def test_options_on_the_same_day_share_a_row(self):
+        summary = self.summary()
+        self.assertEqual(summary.min_price, Decimal('4200.50'))
+        self.assertEqual(summary.available_seats, 16)
+        self.assertEqual(summary.departures, 2)
+        
+        # A different type gets a row of its own
+        self.create_option('TR400', Decimal('800.00'), 50, type='train')
+        self.assertEqual(RouteDaySummary.objects.count(), 2)
+    
+    def test_bookings_and_cancellations_adjust_seats(self):
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        client.post(reverse('book_travel', args=[self.first.id]), {
+            'number_of_seats': 3,
+            'passenger_names': 'A, B, C',
+            'contact_email': 'test@example.com',
+            'contact_phone': '9876543210'
+        })
+        self.assertEqual(self.summary().available_seats, 13)
+        
+        Booking.objects.get(user=self.user).cancel()
+        self.assertEqual(self.summary().available_seats, 16)
+    
+    def test_editing_and_deleting_options_move_rows(self):
+        later = self.day + timedelta(days=1)
+        self.second.departure_date = later
+        self.second.arrival_date = later
+        self.second.save()
+        self.assertEqual(self.summary().min_price, Decimal('5000.00'))
+        self.assertEqual(self.summary(later).departures, 1)
+        
+        self.second.delete()
+        self.assertFalse(RouteDaySummary.objects.filter(departure_date=later).exists())
+    
+    def test_rebuild_matches_incremental_upkeep(self):
+        SeatHold.objects.place(self.first, self.user, 4)
+        expected = list(RouteDaySummary.objects.values(*RouteDaySummary.KEY_FIELDS, 'min_price', 'available_seats', 'departures'))
+        
+        out = StringIO()
+        call_command('rebuild_route_summaries', stdout=out)
+        self.assertIn('Rebuilt 1 route day summaries', out.getvalue())
+        rebuilt = list(RouteDaySummary.objects.values(*RouteDaySummary.KEY_FIELDS, 'min_price', 'available_seats', 'departures'))
+        self.assertEqual(rebuilt, expected)
+        self.assertEqual(rebuilt[0]['available_seats'], 12)
+    
+    def test_calendar_api(self):
+        self.create_option('BS400', Decimal('650.00'), 40, type='bus')
+        response = self.client.get(reverse('api_route_calendar'), {'source': 'Mumbai', 'destination': 'Delhi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['days'], [{
+            'date': self.day.isoformat(),
+            'min_price': '650.00',
+            'available_seats': 56,
+            'departures': 3,
+        }])
+        
+        response = self.client.get(reverse('api_route_calendar'), {
+            'source': 'Mumbai', 'destination': 'Delhi', 'travel_type': 'flight',
+        })
+        self.assertEqual(response.json()['days'][0]['min_price'], '4200.50')
+        
+        response = self.client.get(reverse('api_route_calendar'), {'source': 'Mumbai'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RouteDaySummaryAutocommitTest(TransactionTestCase):
+    def test_saving_outside_a_transaction_locks_inside_one(self):
+        # SQLite ignores select_for_update; make Django check it as PostgreSQL
+        # and MySQL do, without emitting the clause SQLite cannot parse
+        with mock.patch.object(connection.features, 'has_select_for_update', True), \
+                mock.patch.object(connection.ops, 'for_update_sql', return_value=''):
+            day = date.today() + timedelta(days=5)
+            option = TravelOption.objects.create(
+                travel_id='FL450',
+                type='flight',
+                source='Mumbai',
+                destination='Delhi',
+                departure_date=day,
+                departure_time=time(10, 0),
+                arrival_date=day,
+                arrival_time=time(12, 0),
+                price=Decimal('5000.00'),
+                available_seats=10,
+                total_seats=100
+            )
+            option.price = Decimal('4500.00')
+            option.save()
+            self.assertEqual(RouteDaySummary.objects.get().min_price, Decimal('4500.00'))
+            
+            option.delete()
+            self.assertFalse(RouteDaySummary.objects.exists())
+
+
+class ItineraryBookingTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123', email='test@example.com')
+        self.day = date.today() + timedelta(days=10)
+        self.outbound = self.create_option('FL500', 'Mumbai', 'Delhi', 10)
+        self.inbound = self.create_option('FL501', 'Delhi', 'Mumbai', 1, departure_date=self.day + timedelta(days=3))
+        self.client.login(username='testuser', password='testpass123')
+    
+    def create_option(self, travel_id, source, destination, seats, departure_date=None):
+        departure_date = departure_date or self.day
+        return TravelOption.objects.create(
+            travel_id=travel_id,
+            type='flight',
+            source=source,
+            destination=destination,
+            departure_date=departure_date,
+            departure_time=time(10, 0),
+            arrival_date=departure_date,
+            arrival_time=time(12, 0),
+            price=Decimal('3000.00'),
+            available_seats=seats,
+            total_seats=100
+        )
+    
+    def book(self, seats, legs=None):
+        return self.client.post(reverse('book_itinerary'), {
+            'legs': legs or f'{self.outbound.id},{self.inbound.id}',
+            'number_of_seats': seats,
+            'passenger_names': ', '.join(f'Passenger {n}' for n in range(seats)),
+            'contact_email': 'test@example.com',
+            'contact_phone': '9876543210'
+        })
+    
+    def test_itinerary_books_every_leg(self):
+        response = self.client.get(reverse('book_itinerary'), {'legs': f'{self.inbound.id},{self.outbound.id}'})
+        self.assertContains(response, 'FL500')
+        self.assertContains(response, 'FL501')
+        
+        response = self.book(1)
+        self.assertRedirects(response, reverse('my_bookings'))
+        itinerary = Itinerary.objects.get(user=self.user)
+        self.assertEqual(itinerary.total_price, Decimal('6000.00'))
+        self.assertEqual(
+            sorted(itinerary.bookings.values_list('travel_option__travel_id', flat=True)), ['FL500', 'FL501']
+        )
+        self.outbound.refresh_from_db()
+        self.inbound.refresh_from_db()
+        self.assertEqual((self.outbound.available_seats, self.inbound.available_seats), (9, 0))
+        self.assertContains(self.client.get(reverse('my_bookings')), itinerary.reference)
+    
+    def test_short_leg_rolls_back_the_whole_itinerary(self):
+        legs = [(self.outbound, 2, 'A, B'), (self.inbound, 2, 'A, B')]
+        with self.assertRaises(SeatsUnavailable) as raised:
+            Itinerary.objects.book(self.user, legs, 'test@example.com', '9876543210')
+        self.assertEqual(raised.exception.travel_option, self.inbound)
+        
+        self.outbound.refresh_from_db()
+        self.assertEqual(self.outbound.available_seats, 10)
+        self.assertEqual(RouteDaySummary.objects.get(departure_date=self.day).available_seats, 10)
+        self.assertFalse(Itinerary.objects.exists())
+        self.assertFalse(Booking.objects.exists())
+    
+    def test_seats_are_taken_in_option_id_order(self):
+        legs = [(self.inbound, 1, 'A'), (self.outbound, 1, 'A')]
+        with CaptureQueriesContext(connection) as queries:
+            Itinerary.objects.book(self.user, legs, 'test@example.com', '9876543210')
+        updates = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "booking_traveloption"')
+        ]
+        self.assertEqual(len(updates), 2)
+        self.assertIn(f'"id" = {self.outbound.id}', updates[0])
+        self.assertIn(f'"id" = {self.inbound.id}', updates[1])
+    
+    def test_invalid_itineraries_are_rejected(self):
+        response = self.client.get(reverse('book_itinerary'), {'legs': str(self.outbound.id)})
+        self.assertRedirects(response, reverse('travel_list'))
+        
+        response = self.book(2)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Only 1 seats available on FL501')
+        self.assertFalse(Itinerary.objects.exists())
+
+
+class IdempotencyKeyTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123', email='test@example.com')
+        self.travel = TravelOption.objects.create(
+            travel_id='FL600',
+            type='flight',
+            source='Mumbai',
+            destination='Delhi',
+            departure_date=date.today() + timedelta(days=7),
+            departure_time=time(10, 0),
+            arrival_date=date.today() + timedelta(days=7),
+            arrival_time=time(12, 0),
+            price=Decimal('5000.00'),
+            available_seats=10,
+            total_seats=100
+        )
+        self.client.login(username='testuser', password='testpass123')
+    
+    def book(self, key):
+        return self.client.post(reverse('book_travel', args=[self.travel.id]), {
+            'idempotency_key': key,
+            'number_of_seats': 2,
+            'passenger_names': 'A, B',
+            'contact_email': 'test@example.com',
+            'contact_phone': '9876543210'
+        }, follow=True)
+    
+    def test_retried_booking_is_replayed(self):
+        response = self.client.get(reverse('book_travel', args=[self.travel.id]))
+        key = response.context['form'].initial['idempotency_key']
+        self.book(key)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('book_travel', args=[self.travel.id]), {
+                'idempotency_key': key,
+                'number_of_seats': 2,
+                'passenger_names': 'A, B',
+                'contact_email': 'test@example.com',
+                'contact_phone': '9876543210'
+            })
+        self.assertRedirects(response, reverse('my_bookings'), fetch_redirect_response=False)
+        self.assertFalse(any('booking_traveloption' in query['sql'] for query in queries.captured_queries))
+        
+        booking = Booking.objects.get(user=self.user)
+        self.assertEqual(IdempotencyKey.objects.get(key=key).booking, booking)
+        self.travel.refresh_from_db()
+        self.assertEqual(self.travel.available_seats, 8)
+        self.assertContains(self.client.get(reverse('my_bookings')), f'Booking {booking.booking_id} was already processed')
+    
+    def test_retried_cancellation_is_replayed(self):
+        self.book('booking-key')
+        booking = Booking.objects.get(user=self.user)
+        for _ in range(2):
+            response = self.client.post(
+                reverse('cancel_booking', args=[booking.booking_id]), HTTP_IDEMPOTENCY_KEY='cancel-key', follow=True
+            )
+        self.assertContains(response, 'was already processed')
+        self.assertNotContains(response, 'cannot be cancelled')
+        self.travel.refresh_from_db()
+        self.assertEqual(self.travel.available_seats, 10)
+    
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.book('shared-key')
+        other = TravelOption.objects.create(
+            travel_id='FL601',
+            type='flight',
+            source='Mumbai',
+            destination='Delhi',
+            departure_date=date.today() + timedelta(days=8),
+            departure_time=time(10, 0),
+            arrival_date=date.today() + timedelta(days=8),
+            arrival_time=time(12, 0),
+            price=Decimal('5000.00'),
+            available_seats=10,
+            total_seats=100
+        )
+        response = self.client.post(reverse('book_travel', args=[other.id]), {
+            'idempotency_key': 'shared-key',
+            'number_of_seats': 2,
+            'passenger_names': 'A, B',
+            'contact_email': 'test@example.com',
+            'contact_phone': '9876543210'
+        })
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 1)
+        other.refresh_from_db()
+        self.assertEqual(other.available_seats, 10)
+        
+        # Records from before fingerprints still replay
+        IdempotencyKey.objects.update(fingerprint='')
+        self.assertContains(self.book('shared-key'), 'was already processed')
+    
+    def test_failed_attempt_is_not_stored(self):
+        with mock.patch.object(TravelOption, 'reserve_seats', return_value=False):
+            self.book('retry-me')
+        self.assertFalse(IdempotencyKey.objects.exists())
+        
+        self.book('retry-me')
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 1)
+    
+    def test_old_keys_are_purged(self):
+        self.book('old-key')
+        self.book('new-key')
+        IdempotencyKey.objects.filter(key='old-key').update(created_at=timezone.now() - timedelta(days=2))
+        
+        out = StringIO()
+        call_command('purge_idempotency_keys', batch_size=1, stdout=out)
+        self.assertIn('Purged 1 expired idempotency keys', out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new-key'])
+
+
+class PassengerTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123', email='test@example.com')
+        self.travel = TravelOption.objects.create(
+            travel_id='FL700',
+            type='flight',
+            source='Mumbai',
+            destination='Delhi',
+            departure_date=date.today() + timedelta(days=7),
+            departure_time=time(10, 0),
+            arrival_date=date.today() + timedelta(days=7),
+            arrival_time=time(12, 0),
+            price=Decimal('5000.00'),
+            available_seats=10,
+            total_seats=100
+        )
+    
+    def book(self, names, status='confirmed'):
+        return Booking.objects.create(
+            user=self.user,
+            travel_option=self.travel,
+            number_of_seats=len(names.split(',')),
+            passenger_names=names,
+            contact_email='test@example.com',
+            contact_phone='9876543210',
+            status=status
+        )
+    
+    def test_passengers_are_created_with_the_booking(self):
+        booking = self.book(' Asha  Rao, Vikram Singh ')
+        self.assertEqual(
+            list(booking.passengers.values_list('position', 'name', 'name_key')),
+            [(1, 'Asha  Rao', 'asha rao'), (2, 'Vikram Singh', 'vikram singh')]
+        )
+        self.assertEqual(list(Booking.objects.for_passenger('ASHA RAO')), [booking])
+        
+        booking.passenger_names = 'Meera Iyer'
+        booking.number_of_seats = 1
+        booking.save()
+        self.assertEqual(list(booking.passengers.values_list('name', flat=True)), ['Meera Iyer'])
+        self.assertFalse(Booking.objects.for_passenger('Asha Rao').exists())
+    
+    def test_saves_that_keep_the_names_keep_the_rows(self):
+        booking = self.book('Asha Rao, Vikram Singh')
+        rows = list(booking.passengers.values_list('id', flat=True))
+        
+        # e.g. a status change in the admin
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.status = 'cancelled'
+        with CaptureQueriesContext(connection) as queries:
+            booking.save()
+        self.assertFalse(any('booking_passenger' in query['sql'] for query in queries.captured_queries))
+        booking.save(update_fields=['status'])
+        self.assertEqual(list(booking.passengers.values_list('id', flat=True)), rows)
+        
+        booking.passenger_names = 'Asha Rao'
+        booking.save(update_fields=['passenger_names'])
+        self.assertEqual(list(booking.passengers.values_list('name', flat=True)), ['Asha Rao'])
+    
+    def test_manifest_lists_confirmed_passengers_in_one_query(self):
+        first = self.book('Asha Rao, Vikram Singh')
+        self.book('Cancelled Person', status='cancelled')
+        second = self.book('Meera Iyer')
+        
+        with self.assertNumQueries(1):
+            manifest = list(Passenger.objects.manifest(self.travel))
+        self.assertEqual([(row[0], row[2]) for row in manifest], [
+            (first.booking_id, 'Asha Rao'), (first.booking_id, 'Vikram Singh'), (second.booking_id, 'Meera Iyer'),
+        ])
+    
+    def test_manifest_export_is_staff_only(self):
+        self.book('Asha Rao')
+        url = reverse('travel_manifest', args=[self.travel.id])
+        self.client.login(username='testuser', password='testpass123')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        
+        User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.client.login(username='staff', password='testpass123')
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'booking_id,passenger_no,name,contact_email,contact_phone')
+        self.assertIn(',1,Asha Rao,test@example.com,9876543210', lines[1])
+
+
+class AdminScaleTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.admin = User.objects.create_superuser(username='admin', password='testpass123', email='admin@example.com')
+        self.client.login(username='admin', password='testpass123')
+        self.n = 0
+    
+    def add_bookings(self, count):
+        for _ in range(count):
+            self.n += 1
+            travel = TravelOption.objects.create(
+                travel_id=f'FL8{self.n:02d}',
+                type='flight',
+                source=f'City {self.n}',
+                destination='Delhi',
+                departure_date=date.today() + timedelta(days=7),
+                departure_time=time(10, 0),
+                arrival_date=date.today() + timedelta(days=7),
+                arrival_time=time(12, 0),
+                price=Decimal('5000.00'),
+                available_seats=10,
+                total_seats=100
+            )
+            user = User.objects.create_user(username=f'user{self.n}', password='testpass123')
+            Booking.objects.create(
+                user=user,
+                travel_option=travel,
+                number_of_seats=1,
+                passenger_names=f'Passenger {self.n}',
+                contact_email='test@example.com',
+                contact_phone='9876543210'
+            )
+    
+    def changelist_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+    
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        urls = [
+            reverse('admin:booking_booking_changelist'),
+            reverse('admin:booking_traveloption_changelist'),
+        ]
+        self.add_bookings(2)
+        before = [self.changelist_queries(url) for url in urls]
+        self.add_bookings(20)
+        self.assertEqual([self.changelist_queries(url) for url in urls], before)
+        self.assertLessEqual(max(before), 12)
+    
+    def test_booking_search_matches_exact_keys(self):
+        self.add_bookings(3)
+        booking = Booking.objects.get(travel_option__travel_id='FL802')
+        url = reverse('admin:booking_booking_changelist')
+        for term in [booking.booking_id.lower(), 'user2', 'fl802', 'PASSENGER 2']:
+            response = self.client.get(url, {'q': term})
+            self.assertEqual(list(response.context['cl'].result_list), [booking], term)
+    
+    def test_estimated_count_paginator(self):
+        self.add_bookings(3)
+        paginator = EstimatedCountPaginator(Booking.objects.all(), 10)
+        self.assertEqual(paginator.count, 3)
+        with mock.patch('booking.pagination.estimated_row_count', return_value=2_000_000):
+            self.assertEqual(EstimatedCountPaginator(Booking.objects.all(), 10).count, 2_000_000)
+            self.assertEqual(EstimatedCountPaginator(Booking.objects.filter(number_of_seats=1), 10).count, 3)
+        with mock.patch('booking.pagination.MAX_EXACT_COUNT', 2):
+            paginator = EstimatedCountPaginator(Booking.objects.filter(number_of_seats=1), 10)
+            self.assertEqual((paginator.count, paginator.capped), (2, True))
+            paginator = EstimatedCountPaginator(Booking.objects.filter(number_of_seats=1), 10, rows_before=2)
+            self.assertEqual((paginator.count, paginator.capped), (3, False))
+    
+    def test_capped_count_is_shown_as_a_lower_bound(self):
+        self.add_bookings(3)
+        url = reverse('admin:booking_booking_changelist')
+        with mock.patch('booking.pagination.MAX_EXACT_COUNT', 2), \
+                mock.patch('booking.admin.BookingAdmin.list_per_page', 1):
+            response = self.client.get(url, {'number_of_seats': 1})
+            self.assertContains(response, '2+ bookings')
+            # Counting reaches past the page asked for, so the third row is reachable
+            response = self.client.get(url, {'number_of_seats': 1, 'p': 3})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['cl'].result_list), 1)
+    
+    def test_last_page_after_archiving(self):
+        self.add_bookings(6)
+        past = date.today() - timedelta(days=30)
+        TravelOption.objects.filter(travel_id__in=['FL801', 'FL802']).update(departure_date=past, arrival_date=past)
+        call_command('archive_departed', stdout=StringIO())
+        self.assertEqual(Booking.objects.count(), 4)
+        
+        url = reverse('admin:booking_booking_changelist')
+        with mock.patch('booking.pagination.ESTIMATE_MIN_ROWS', 0), \
+                mock.patch('booking.admin.BookingAdmin.list_per_page', 2):
+            # No statistics yet: the largest rowid (6) must not stand in for the count
+            self.assertIsNone(estimated_row_count(Booking))
+            response = self.client.get(url, {'p': 2})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((response.context['cl'].result_count, response.context['cl'].paginator.num_pages), (4, 2))
+            self.assertEqual(len(response.context['cl'].result_list), 2)
+            
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            self.assertEqual(estimated_row_count(Booking), 4)
+            response = self.client.get(url, {'p': 2})
+            self.assertEqual(len(response.context['cl'].result_list), 2)
+
+
+class ArchiveTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123', email='test@example.com')
+        self.departed = [self.travel(f'BS{i:03d}', -30 + i) for i in range(5)]
+        self.upcoming = self.travel('BS900', 5)
+    
+    def travel(self, travel_id, days):
+        return TravelOption.objects.create(
+            travel_id=travel_id,
+            type='bus',
+            source='Pune',
+            destination='Nashik',
+            departure_date=date.today() + timedelta(days=days),
+            departure_time=time(9, 0),
+            arrival_date=date.today() + timedelta(days=days),
+            arrival_time=time(13, 0),
+            price=Decimal('450.00'),
+            available_seats=40,
+            total_seats=40
+        )
+    
+    def book(self, travel, days_ago):
+        booking = Booking.objects.create(
+            user=self.user,
+            travel_option=travel,
+            number_of_seats=2,
+            passenger_names='Asha Rao, Vikram Singh',
+            contact_email='test@example.com',
+            contact_phone='9876543210',
+            status='confirmed'
+        )
+        Booking.objects.filter(pk=booking.pk).update(booking_date=timezone.now() - timedelta(days=days_ago))
+        return booking
+    
+    def archive(self, *args):
+        out = StringIO()
+        call_command('archive_departed', *args, stdout=out)
+        return out.getvalue()
+    
+    def test_moves_departed_options_and_their_bookings(self):
+        old = self.book(self.departed[0], 40)
+        new = self.book(self.upcoming, 1)
+        
+        output = self.archive('--batch-size', '2')
+        
+        self.assertIn('Archived 5 travel options and 1 bookings', output)
+        self.assertEqual(list(TravelOption.objects.values_list('travel_id', flat=True)), ['BS900'])
+        self.assertEqual(ArchivedTravelOption.objects.count(), 5)
+        self.assertEqual(list(Booking.objects.all()), [new])
+        self.assertFalse(Passenger.objects.filter(booking_id=old.pk).exists())
+        
+        archived = ArchivedBooking.objects.get()
+        self.assertEqual((archived.pk, archived.booking_id, archived.passenger_names), (old.pk, old.booking_id, old.passenger_names))
+        self.assertEqual(archived.travel_option.travel_id, 'BS000')
+    
+    def test_booking_made_after_the_scan_is_archived(self):
+        real_atomic = transaction.atomic
+        late = []
+        
+        def atomic(*args, **kwargs):
+            # Between picking the options and the transaction that moves them
+            if not late:
+                late.append(None)
+                late[0] = self.book(self.departed[0], 0)
+            return real_atomic(*args, **kwargs)
+        
+        with mock.patch.object(transaction, 'atomic', atomic):
+            moved = ArchivedTravelOption.objects.archive_chunk(date.today(), batch_size=10)
+        self.assertEqual(moved, (5, 1))
+        self.assertEqual(ArchivedBooking.objects.get().booking_id, late[0].booking_id)
+        self.assertFalse(Booking.objects.exists())
+    
+    def test_keeps_recent_departures_until_the_cutoff(self):
+        self.archive('--days', '27')
+        self.assertEqual(
+            sorted(TravelOption.objects.values_list('travel_id', flat=True)), ['BS003', 'BS004', 'BS900']
+        )
+        self.archive('--days', '27')
+        self.assertEqual(ArchivedTravelOption.objects.count(), 3)
+    
+    def test_refuses_a_future_cutoff(self):
+        with self.assertRaises(CommandError):
+            self.archive('--before', (date.today() + timedelta(days=1)).isoformat())
+        self.assertEqual(ArchivedTravelOption.objects.count(), 0)
+    
+    def test_my_bookings_lists_live_and_archived_bookings_together(self):
+        bookings = [self.book(self.departed[i % 5] if i % 2 else self.upcoming, days_ago=i) for i in range(14)]
+        self.archive()
+        self.assertEqual(ArchivedBooking.objects.count(), 7)
+        expected = [booking.booking_id for booking in bookings]
+        self.client.login(username='testuser', password='testpass123')
+        
+        response = self.client.get(reverse('my_bookings'))
+        self.assertEqual([booking.booking_id for booking in response.context['page_obj']], expected[:10])
+        self.assertContains(response, 'Departed trip')
+        response = self.client.get(reverse('my_bookings'), {'page': 2})
+        self.assertEqual([booking.booking_id for booking in response.context['page_obj']], expected[10:])
+        
+        with override_settings(BOOKING_CURSOR_PAGINATION=True):
+            response = self.client.get(reverse('my_bookings'))
+            first = response.context['page_obj']
+            self.assertEqual([booking.booking_id for booking in first], expected[:10])
+            response = self.client.get(reverse('my_bookings'), {'cursor': first.next_cursor})
+            second = response.context['page_obj']
+            self.assertEqual([booking.booking_id for booking in second], expected[10:])
+            response = self.client.get(reverse('my_bookings'), {'cursor': second.previous_cursor})
+            self.assertEqual([booking.booking_id for booking in response.context['page_obj']], expected[:10])
+
+
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123', email='test@example.com')
+        self.travel = TravelOption.objects.create(
+            travel_id='FL800',
+            type='flight',
+            source='Mumbai',
+            destination='Delhi',
+            departure_date=date.today() + timedelta(days=7),
+            departure_time=time(10, 0),
+            arrival_date=date.today() + timedelta(days=7),
+            arrival_time=time(12, 0),
+            price=Decimal('5000.00'),
+            available_seats=10,
+            total_seats=100
+        )
+        self.router = replicas.PrimaryReplicaRouter()
+    
+    @override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+    def test_router_reads_booking_data_from_replicas_only_inside_replica_views(self):
+        self.assertIsNone(self.router.db_for_read(TravelOption))
+        token = replicas.reading_from_replica.set(True)
+        try:
+            self.assertIn(self.router.db_for_read(TravelOption), ['replica1', 'replica2'])
+            self.assertIsNone(self.router.db_for_read(User))
+            self.assertEqual(self.router.db_for_write(TravelOption), 'default')
+        finally:
+            replicas.reading_from_replica.reset(token)
+        
+        replica_copy = TravelOption(pk=self.travel.pk)
+        replica_copy._state.db = 'replica1'
+        self.assertTrue(self.router.allow_relation(self.user, replica_copy))
+    
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_reads_from_the_primary(self):
+        token = replicas.reading_from_replica.set(True)
+        try:
+            self.assertIsNone(self.router.db_for_read(TravelOption))
+        finally:
+            replicas.reading_from_replica.reset(token)
+    
+    @override_settings(DATABASE_REPLICAS=['default'], REPLICA_PIN_SECONDS=15)
+    def test_booking_pins_the_session_to_the_primary(self):
+        self.client.login(username='testuser', password='testpass123')
+        with mock.patch('booking.replicas.random.choice', return_value='default') as choose:
+            self.client.get(reverse('travel_list'))
+            self.client.get(reverse('travel_detail', args=[self.travel.id]))
+            self.assertTrue(choose.called)
+            
+            response = self.client.post(reverse('book_travel', args=[self.travel.id]), {
+                'number_of_seats': 1,
+                'passenger_names': 'Asha Rao',
+                'contact_email': 'test@example.com',
+                'contact_phone': '9876543210'
+            })
+            self.assertEqual(response.status_code, 302)
+            choose.reset_mock()
+            response = self.client.get(reverse('my_bookings'))
+            self.assertEqual(len(response.context['page_obj']), 1)
+            self.assertFalse(choose.called)
+            
+            with mock.patch('booking.replicas.time.time', return_value=replicas.time.time() + 16):
+                self.client.get(reverse('my_bookings'))
+            self.assertTrue(choose.called)
+    
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_searches_over_a_fresh_change_are_cached_from_the_primary(self):
+        search_cache().clear()
+        state_cache().clear()
+        with mock.patch('booking.replicas.random.choice', return_value='default') as choose:
+            with override_settings(REPLICA_PIN_SECONDS=15):
+                self.travel.price = Decimal('4500.00')
+                self.travel.save()
+                response = self.client.get(reverse('travel_list'))
+                self.assertEqual(list(response.context['page_obj']), [self.travel])
+                self.assertFalse(choose.called)
+            
+            # Once the change is older than the replica lag, misses read the replica again
+            with override_settings(REPLICA_PIN_SECONDS=0):
+                self.travel.save()
+                self.client.get(reverse('travel_list'))
+                self.assertTrue(choose.called)
+    
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_failed_booking_does_not_pin(self):
+        self.client.login(username='testuser', password='testpass123')
+        self.client.post(reverse('book_travel', args=[self.travel.id]), {'number_of_seats': 0})
+        self.assertNotIn(replicas.PIN_KEY, self.client.session)
+
+
+class TimetableImportTest(TestCase):
+    HEADER = 'travel_id,type,source,destination,departure_date,departure_time,arrival_date,arrival_time,price,total_seats\n'
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123', email='test@example.com')
+        self.day = (date.today() + timedelta(days=10)).isoformat()
+    
+    def row(self, travel_id, total_seats=50, price='1200.00', source='Mumbai'):
+        return f'{travel_id},train,{source},Pune,{self.day},08:00,{self.day},11:30,{price},{total_seats}\n'
+    
+    def run_import(self, text, file_format='csv', batch_size=2):
+        rows = timetable.read_rows(timetable.open_text(BytesIO(text.encode())), file_format)
+        return timetable.TimetableImport(batch_size=batch_size).run(rows)
+    
+    def test_creates_options_in_batches(self):
+        result = self.run_import(self.HEADER + ''.join(self.row(f'TR{n:03d}') for n in range(5)))
+        self.assertEqual((result.created, result.updated, result.invalid), (5, 0, 0))
+        travel = TravelOption.objects.get(travel_id='TR004')
+        self.assertEqual((travel.source_city.name, travel.available_seats), ('Mumbai', 50))
+        summary = RouteDaySummary.objects.get()
+        self.assertEqual((summary.departures, summary.available_seats), (5, 250))
+    
+    def test_update_keeps_booked_seats(self):
+        self.run_import(self.HEADER + self.row('TR001') + self.row('TR002'))
+        travel = TravelOption.objects.get(travel_id='TR001')
+        self.assertTrue(travel.reserve_seats(30))
+        
+        result = self.run_import(
+            self.HEADER + self.row('TR001', total_seats=60, price='999.00', source='Delhi') + self.row('TR002', total_seats=20)
+        )
+        self.assertEqual((result.created, result.updated), (0, 2))
+        travel.refresh_from_db()
+        self.assertEqual((travel.total_seats, travel.available_seats, travel.price), (60, 30, Decimal('999.00')))
+        self.assertEqual(travel.source_city.name, 'Delhi')
+        self.assertEqual(TravelOption.objects.get(travel_id='TR002').total_seats, 20)
+        
+        result = self.run_import(self.HEADER + self.row('TR001', total_seats=29))
+        self.assertEqual(result.invalid, 1)
+        self.assertIn('30 seats already booked', result.errors[0][1])
+        travel.refresh_from_db()
+        self.assertEqual((travel.total_seats, travel.available_seats), (60, 30))
+        self.assertEqual(RouteDaySummary.objects.get(source_city__name='Delhi').available_seats, 30)
+    
+    def test_invalid_rows_are_reported_and_skipped(self):
+        text = (
+            self.HEADER
+            + self.row('TR001')
+            + self.row('TR002', price='abc')
+            + f'TR003,boat,Mumbai,Pune,{self.day},08:00,{self.day},07:00,100,10\n'
+            + self.row('TR004', total_seats=0)
+        )
+        result = self.run_import(text)
+        self.assertEqual((result.created, result.invalid), (1, 3))
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5])
+        self.assertIn('price', result.errors[0][1])
+        self.assertIn('type', result.errors[1][1])
+    
+    def test_json_lines_and_later_duplicates_win(self):
+        rows = [
+            {'travel_id': 'FL001', 'type': 'flight', 'source': 'Mumbai', 'destination': 'Delhi',
+             'departure_date': self.day, 'departure_time': '06:00', 'arrival_date': self.day,
+             'arrival_time': '08:00', 'price': 4500, 'total_seats': 180, 'available_seats': 100},
+            'not an object',
+        ]
+        text = '\n'.join(json.dumps(row) for row in rows) + '\n\n' + json.dumps({**rows[0], 'price': '4800.50'}) + '\n'
+        result = self.run_import(text, 'jsonl', batch_size=10)
+        self.assertEqual((result.created, result.invalid, result.superseded), (1, 1, 1))
+        travel = TravelOption.objects.get(travel_id='FL001')
+        self.assertEqual((travel.price, travel.available_seats), (Decimal('4800.50'), 100))
+    
+    def test_command_reads_a_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(self.HEADER + self.row('TR001') + self.row('TR002', price='-1'))
+        self.addCleanup(os.remove, handle.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_timetable', handle.name, stdout=out, stderr=err)
+        self.assertIn('1 created, 0 updated, 1 invalid', out.getvalue())
+        self.assertIn('line 3: price', err.getvalue())
+        
+        with self.assertRaises(CommandError):
+            call_command('import_timetable', 'timetable.xlsx')
+    
+    def test_missing_columns_are_rejected(self):
+        with self.assertRaises(ValidationError):
+            self.run_import('travel_id,type\nTR001,train\n')
+    
+    def test_admin_upload(self):
+        User.objects.create_superuser(username='admin', password='testpass123', email='admin@example.com')
+        self.client.login(username='admin', password='testpass123')
+        url = reverse('admin:booking_traveloption_import')
+        self.assertContains(self.client.get(reverse('admin:booking_traveloption_changelist')), url)
+        
+        upload = SimpleUploadedFile('timetable.csv', (self.HEADER + self.row('TR001')).encode())
+        response = self.client.post(url, {'timetable': upload}, follow=True)
+        self.assertContains(response, '1 created, 0 updated, 0 invalid')
+        self.assertTrue(TravelOption.objects.filter(travel_id='TR001').exists())
+        
+        response = self.client.post(url, {'timetable': SimpleUploadedFile('timetable.txt', self.HEADER.encode())})
+        self.assertContains(response, 'Unsupported timetable file')
+
+
+class BookingExportTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123', email='test@example.com')
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.routes = [
+            self.travel('TR100', 'Mumbai', 'Pune'),
+            self.travel('TR200', 'Delhi', 'Jaipur'),
+        ]
+        self.bookings = []
+        for n in range(7):
+            booking = Booking.objects.create(
+                user=self.user,
+                travel_option=self.routes[n % 2],
+                number_of_seats=1,
+                passenger_names=f'Passenger {n}',
+                contact_email='test@example.com',
+                contact_phone='9876543210',
+                status='cancelled' if n == 4 else 'confirmed'
+            )
+            # Spread over four days, the last two today
+            Booking.objects.filter(pk=booking.pk).update(booking_date=timezone.now() - timedelta(days=(6 - n) // 2))
+            self.bookings.append(booking.booking_id)
+    
+    def travel(self, travel_id, source, destination):
+        return TravelOption.objects.create(
+            travel_id=travel_id,
+            type='train',
+            source=source,
+            destination=destination,
+            departure_date=date.today() + timedelta(days=7),
+            departure_time=time(8, 0),
+            arrival_date=date.today() + timedelta(days=7),
+            arrival_time=time(12, 0),
+            price=Decimal('800.00'),
+            available_seats=100,
+            total_seats=100
+        )
+    
+    def exported(self, **filters):
+        return [row[0] for row in exports.iter_rows(exports.booking_export(**filters), chunk_size=2)]
+    
+    def test_rows_come_in_booking_order_across_chunks(self):
+        self.assertEqual(self.exported(), self.bookings)
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(exports.iter_rows(exports.booking_export(), chunk_size=3))
+        # Three chunks of live bookings, one (empty) of archived ones
+        self.assertEqual(len(queries), 4)
+        self.assertEqual(rows[0][exports.HEADER.index('travel_id')], 'TR100')
+        self.assertEqual(rows[0][exports.HEADER.index('username')], 'testuser')
+    
+    def test_filters(self):
+        today = timezone.localdate()
+        self.assertEqual(self.exported(date_from=today), self.bookings[5:])
+        self.assertEqual(self.exported(date_to=today - timedelta(days=1)), self.bookings[:5])
+        self.assertEqual(self.exported(status='cancelled'), [self.bookings[4]])
+        self.assertEqual(self.exported(source=' mumbai', destination='Pune'), self.bookings[::2])
+        self.assertEqual(self.exported(source='Atlantis'), [])
+    
+    def test_archived_bookings_are_exported(self):
+        past = date.today() - timedelta(days=30)
+        TravelOption.objects.filter(travel_id='TR100').update(departure_date=past, arrival_date=past)
+        call_command('archive_departed', stdout=StringIO())
+        self.assertEqual(ArchivedBooking.objects.count(), 4)
+        
+        self.assertEqual(self.exported(), self.bookings)
+        self.assertEqual(self.exported(source='Mumbai'), self.bookings[::2])
+        self.assertEqual(self.exported(date_to=timezone.localdate() - timedelta(days=1)), self.bookings[:5])
+    
+    def test_staff_download_streams_csv(self):
+        url = reverse('export_bookings')
+        self.client.login(username='testuser', password='testpass123')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        
+        self.client.login(username='staff', password='testpass123')
+        response = self.client.get(url, {'status': 'confirmed', 'date_from': '2020-01-01'})
+        self.assertTrue(response.streaming)
+        self.assertIn('bookings-2020-01-01.csv', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(','), exports.HEADER)
+        self.assertEqual(len(lines), 7)
+        
+        response = self.client.get(url, {'date_from': '2026-02-01', 'date_to': '2026-01-01'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_command_writes_a_file(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as handle:
+            pass
+        self.addCleanup(os.remove, handle.name)
+        err = StringIO()
+        call_command('export_bookings', '--status', 'confirmed', '--output', handle.name, stderr=err)
+        self.assertIn('Exported 6 bookings', err.getvalue())
+        with open(handle.name, encoding='utf-8') as exported:
+            self.assertEqual(len(exported.read().splitlines()), 7)
+
+
+class StaticFilesTest(TestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+        settings = override_settings(
+            STATIC_ROOT=self.static_root,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'booking.staticfiles.CompressedManifestStaticFilesStorage'},
+            },
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.hashed_css = staticfiles_storage.stored_name('css/base.css')
+    
+    def get(self, path, **headers):
+        return staticfiles.serve(RequestFactory().get('/static/' + path, headers=headers), path)
+    
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        self.assertRegex(self.hashed_css, r'^css/base\.[0-9a-f]{12}\.css$')
+        with open(os.path.join(self.static_root, self.hashed_css), 'rb') as original:
+            data = original.read()
+        with open(os.path.join(self.static_root, self.hashed_css + '.gz'), 'rb') as compressed:
+            self.assertEqual(gzip.decompress(compressed.read()), data)
+        self.assertTrue(os.path.exists(os.path.join(self.static_root, 'staticfiles.json')))
+    
+    def test_hashed_file_is_immutable_and_negotiated(self):
+        response = self.get(self.hashed_css, accept_encoding='br;q=0, gzip, deflate')
+        self.assertEqual(response['Cache-Control'], staticfiles.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn(b'.navbar-brand', gzip.decompress(b''.join(response.streaming_content)))
+        
+        response = self.get(self.hashed_css, accept_encoding='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn(b'.navbar-brand', b''.join(response.streaming_content))
+    
+    def test_unhashed_and_missing_files(self):
+        response = self.get('css/base.css')
+        self.assertEqual(response['Cache-Control'], staticfiles.SHORT_CACHE_CONTROL)
+        response.close()
+        with self.assertRaises(Http404):
+            self.get('css/missing.css')
+        with self.assertRaises(Http404):
+            self.get('../manage.py')
+        request = RequestFactory().post('/static/' + self.hashed_css)
+        self.assertEqual(staticfiles.serve(request, self.hashed_css).status_code, 405)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123', email='test@example.com')
+        self.travel = TravelOption.objects.create(
+            travel_id='TR300',
+            type='train',
+            source='Mumbai',
+            destination='Pune',
+            departure_date=date.today() + timedelta(days=7),
+            departure_time=time(8, 0),
+            arrival_date=date.today() + timedelta(days=7),
+            arrival_time=time(12, 0),
+            price=Decimal('800.00'),
+            available_seats=100,
+            total_seats=100
+        )
+        self.booking = Booking.objects.create(
+            user=self.user,
+            travel_option=self.travel,
+            number_of_seats=2,
+            passenger_names='Asha, Ravi',
+            contact_email='test@example.com',
+            contact_phone='9876543210'
+        )
+    
+    def updated_at(self, obj):
+        return type(obj).objects.values_list('updated_at', flat=True).get(pk=obj.pk)
+    
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        return first, self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+    
+    def test_every_write_path_moves_updated_at(self):
+        stamps = [self.updated_at(self.travel)]
+        self.travel.reserve_seats(2)
+        stamps.append(self.updated_at(self.travel))
+        self.travel.release_seats(1)
+        stamps.append(self.updated_at(self.travel))
+        self.travel.price = Decimal('850.00')
+        self.travel.save(update_fields=['price'])
+        stamps.append(self.updated_at(self.travel))
+        timetable.TimetableImport().run([(2, {
+            'travel_id': 'TR300', 'type': 'train', 'source': 'Mumbai', 'destination': 'Pune',
+            'departure_date': str(self.travel.departure_date), 'departure_time': '09:00',
+            'arrival_date': str(self.travel.arrival_date), 'arrival_time': '13:00',
+            'price': '900', 'total_seats': '100',
+        })])
+        stamps.append(self.updated_at(self.travel))
+        self.assertEqual(stamps, sorted(set(stamps)))
+        
+        before = self.updated_at(self.booking)
+        with transaction.atomic():
+            self.assertTrue(self.booking.cancel())
+        self.assertGreater(self.updated_at(self.booking), before)
+    
+    def test_travel_detail_revalidates_until_the_option_changes(self):
+        url = reverse('travel_detail', args=[self.travel.id])
+        first, response = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Last-Modified', first)
+        self.assertIn('no-cache', first['Cache-Control'])
+        
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(len(queries), 1)
+        
+        self.travel.reserve_seats(1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        
+        # Signed in, the page offers booking instead of logging in
+        self.client.login(username='testuser', password='testpass123')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+    
+    def test_my_bookings_revalidates_until_a_booking_changes(self):
+        self.client.login(username='testuser', password='testpass123')
+        url = reverse('my_bookings')
+        first, response = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+        
+        self.travel.reserve_seats(1)
+        _, response = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+        with transaction.atomic():
+            self.booking.cancel()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+    
+    def test_my_bookings_pages_have_their_own_validators(self):
+        self.client.login(username='testuser', password='testpass123')
+        url = reverse('my_bookings')
+        first = self.client.get(url)
+        response = self.client.get(
+            url, {'page': 2}, HTTP_IF_NONE_MATCH=first['ETag'], HTTP_IF_MODIFIED_SINCE=first['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        # A date alone is not enough to skip the render
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+    
+    def test_pages_with_messages_are_not_validated(self):
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.post(reverse('cancel_booking', args=[self.booking.booking_id]), follow=True)
+        self.assertContains(response, 'Booking cancelled successfully!')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertTrue(self.client.get(reverse('my_bookings')).has_header('ETag'))
@@ -0,0 +1,253 @@
+"""Streaming timetable import: CSV or JSON lines, upserted on travel_id.
+
+Rows are read from the file one at a time and written in batches, each
+batch in its own transaction, so memory use does not grow with the file.
+An unknown travel_id creates an option; a known one gets the file's
+schedule, price and capacity. Seats that are already booked or held stay
+taken: a capacity change moves available_seats by the same amount, and a
+row that leaves fewer seats than are taken is rejected. ``available_seats``
+in the file is only used for new options.
+
+Bulk writes skip TravelOption.save(), so the importer recounts the day
+summaries it touched and bumps the search cache once at the end.
+"""
+import csv
+import io
+import json
+import os
+from datetime import date, time
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from .cache import bump_all_versions
+from .models import City, RouteDaySummary, TravelOption
+
+
+COLUMNS = (
+    'travel_id', 'type', 'source', 'destination', 'departure_date', 'departure_time',
+    'arrival_date', 'arrival_time', 'price', 'total_seats',
+)
+OPTIONAL_COLUMNS = ('available_seats',)
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+# Written on conflict; created_at keeps the first import's time
+UPDATE_FIELDS = [
+    'type', 'source', 'destination', 'source_city', 'destination_city', 'departure_date',
+    'departure_time', 'arrival_date', 'arrival_time', 'price', 'total_seats', 'available_seats',
+    'updated_at',
+]
+# Invalid rows listed in the result; any more are only counted
+MAX_ERRORS = 100
+# Past this many touched summary rows, one rebuild beats recounting each
+REBUILD_THRESHOLD = 2000
+
+TRAVEL_TYPES = {value for value, _ in TravelOption.TRAVEL_TYPES}
+MAX_PRICE = Decimal('1e8')  # max_digits=10, decimal_places=2
+
+
+def format_for(filename):
+    """'csv' or 'jsonl', from the file extension"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in FORMATS:
+        raise ValidationError(f'Unsupported timetable file {filename!r}; use .csv, .jsonl or .ndjson.')
+    return FORMATS[extension]
+
+
+def open_text(binary):
+    """Decode a binary file lazily (a UTF-8 byte order mark is skipped)"""
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def read_rows(stream, file_format):
+    """Yield (line number, raw row) from a text stream, one row at a time"""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        missing = [column for column in COLUMNS if column not in (reader.fieldnames or ())]
+        if missing:
+            raise ValidationError(f"Missing columns: {', '.join(missing)}.")
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def _text(max_length):
+    def parse(value):
+        if len(value) > max_length:
+            raise ValueError(f'longer than {max_length} characters')
+        return value
+    return parse
+
+
+def _travel_type(value):
+    value = value.lower()
+    if value not in TRAVEL_TYPES:
+        raise ValueError(f"not one of {', '.join(sorted(TRAVEL_TYPES))}")
+    return value
+
+
+def _price(value):
+    price = Decimal(value)
+    if not price.is_finite() or price < 0 or price >= MAX_PRICE or price.as_tuple().exponent < -2:
+        raise ValueError('not an amount with at most 2 decimal places')
+    return price
+
+
+def _count(minimum):
+    def parse(value):
+        count = int(value)
+        if count < minimum:
+            raise ValueError(f'less than {minimum}')
+        return count
+    return parse
+
+
+PARSERS = {
+    'travel_id': _text(20),
+    'type': _travel_type,
+    'source': _text(100),
+    'destination': _text(100),
+    'departure_date': date.fromisoformat,
+    'departure_time': time.fromisoformat,
+    'arrival_date': date.fromisoformat,
+    'arrival_time': time.fromisoformat,
+    'price': _price,
+    'total_seats': _count(1),
+    'available_seats': _count(0),
+}
+
+
+def clean_row(raw):
+    """Parse and check one raw row; raises ValidationError listing every problem"""
+    if not isinstance(raw, dict):
+        raise ValidationError('Not a JSON object.')
+    row = {}
+    errors = []
+    for name in COLUMNS + OPTIONAL_COLUMNS:
+        value = raw.get(name)
+        value = '' if value is None else str(value).strip()
+        if not value:
+            if name not in OPTIONAL_COLUMNS:
+                errors.append(f'{name}: required')
+            continue
+        try:
+            row[name] = PARSERS[name](value)
+        except (ValueError, InvalidOperation) as e:
+            errors.append(f'{name}: {value[:40]!r} is invalid ({e})')
+    if not errors:
+        if (row['arrival_date'], row['arrival_time']) < (row['departure_date'], row['departure_time']):
+            errors.append('arrives before it departs')
+        if row.get('available_seats', 0) > row['total_seats']:
+            errors.append('available_seats is more than total_seats')
+    if errors:
+        raise ValidationError('; '.join(errors))
+    return row
+
+
+class TimetableImport:
+    """Upsert cleaned rows into TravelOption in batches of ``batch_size``"""
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.created = 0
+        self.updated = 0
+        self.invalid = 0
+        self.superseded = 0  # valid rows replaced by a later row for the same travel_id
+        self.errors = []  # (line number, message) of the first MAX_ERRORS invalid rows
+        self.summary_keys = set()
+        self.city_ids = {}
+
+    @property
+    def rows(self):
+        return self.created + self.updated + self.invalid + self.superseded
+
+    def run(self, rows, progress=None):
+        """Import (line number, raw row) pairs; ``progress(self)`` is called after every batch"""
+        batch = {}
+        for line, raw in rows:
+            try:
+                row = clean_row(raw)
+            except ValidationError as e:
+                self.reject(line, e.messages[0])
+                continue
+            if row['travel_id'] in batch:
+                # The later row wins, as it would in a later batch
+                self.superseded += 1
+            batch[row['travel_id']] = (line, row)
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = {}
+                if progress:
+                    progress(self)
+        if batch:
+            self.write_batch(batch)
+        self.finish()
+        return self
+
+    def reject(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    def city_id(self, name):
+        key = City.normalize(name)
+        if key not in self.city_ids:
+            self.city_ids[key] = City.objects.for_name(name).pk
+        return self.city_ids[key]
+
+    def write_batch(self, batch):
+        for _, row in batch.values():
+            row['source_city_id'] = self.city_id(row['source'])
+            row['destination_city_id'] = self.city_id(row['destination'])
+
+        with transaction.atomic():
+            # Lock the existing rows so bookings wait until their new seat counts are written
+            existing = {
+                values['travel_id']: values
+                for values in TravelOption.objects.select_for_update().filter(travel_id__in=list(batch)).values(
+                    'travel_id', 'total_seats', 'available_seats', *RouteDaySummary.KEY_FIELDS
+                )
+            }
+            options = []
+            for travel_id, (line, row) in batch.items():
+                current = existing.get(travel_id)
+                option = TravelOption(**{
+                    field: value for field, value in row.items() if field != 'available_seats'
+                })
+                if current is None:
+                    option.available_seats = row.get('available_seats', row['total_seats'])
+                    self.created += 1
+                else:
+                    taken = current['total_seats'] - current['available_seats']
+                    if row['total_seats'] < taken:
+                        self.reject(line, f"total_seats {row['total_seats']} is less than the {taken} seats already booked or held")
+                        continue
+                    option.available_seats = row['total_seats'] - taken
+                    self.summary_keys.add(tuple(current[field] for field in RouteDaySummary.KEY_FIELDS))
+                    self.updated += 1
+                self.summary_keys.add(option.summary_key)
+                options.append(option)
+
+            conflict = {}
+            if connection.features.supports_update_conflicts_with_target:
+                conflict['unique_fields'] = ['travel_id']
+            TravelOption.objects.bulk_create(
+                options, batch_size=self.batch_size, update_conflicts=True, update_fields=UPDATE_FIELDS, **conflict
+            )
+
+    def finish(self):
+        if not (self.created or self.updated):
+            return
+        if len(self.summary_keys) > REBUILD_THRESHOLD:
+            RouteDaySummary.objects.rebuild()
+        else:
+            with transaction.atomic():
+                RouteDaySummary.objects.refresh(self.summary_keys)
+        bump_all_versions()
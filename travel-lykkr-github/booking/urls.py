@@ -1,12 +1,26 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the read-only browsing views run natively async (see asgi.py)
+if settings.BOOKING_ASYNC_VIEWS:
+    travel_list, travel_detail = views.travel_list_async, views.travel_detail_async
+else:
+    travel_list, travel_detail = views.travel_list, views.travel_detail
+
 urlpatterns = [
-    path('', views.travel_list, name='travel_list'),
+    path('', travel_list, name='travel_list'),
     path('register/', views.register, name='register'),
     path('profile/', views.profile, name='profile'),
-    path('travel/<int:travel_id>/', views.travel_detail, name='travel_detail'),
+    path('travel/<int:travel_id>/', travel_detail, name='travel_detail'),
+    path('travel/<int:travel_id>/manifest.csv', views.travel_manifest, name='travel_manifest'),
     path('book/<int:travel_id>/', views.book_travel, name='book_travel'),
+    path('book/itinerary/', views.book_itinerary, name='book_itinerary'),
     path('my-bookings/', views.my_bookings, name='my_bookings'),
     path('cancel-booking/<str:booking_id>/', views.cancel_booking, name='cancel_booking'),
+    path('bookings/export.csv', views.export_bookings, name='export_bookings'),
+    path('api/travels/', views.api_travel_search, name='api_travel_search'),
+    path('api/travels/<int:travel_id>/', views.api_travel_detail, name='api_travel_detail'),
+    path('api/routes/calendar/', views.api_route_calendar, name='api_route_calendar'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
@@ -1,40 +1,90 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import hashlib
+from decimal import Decimal
+
+from django.conf import settings
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db.models import Count, Max, Min, Q, Sum
 from django.db import transaction
+from django.urls import reverse
 from django.utils import timezone
-from django.core.paginator import Paginator
-from django.http import JsonResponse
-from .models import TravelOption, Booking, UserProfile
-from .forms import CustomUserCreationForm, UserProfileForm, UserUpdateForm, TravelSearchForm, BookingForm
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET
+from . import exports, idempotency, ids, replicas
+from .cache import get_versions, version_scopes
+from .models import ArchivedBooking, TravelOption, Booking, Itinerary, Passenger, RouteDaySummary, SeatHold, SeatsUnavailable, UserProfile
+from .metrics import render_prometheus
+from .forms import (
+    CustomUserCreationForm, UserProfileForm, UserUpdateForm, TravelSearchForm, BookingForm, ItineraryBookingForm,
+    BookingExportForm,
+)
+from .pagination import paginate_merged
+from .search import TravelSearch, asearch_travel_page, search_travel_page
+
+
+BOOKING_CURSOR_ORDERING = ('-booking_date', '-id')
+
+
+def _conditional_page(request, state, last_modified, render_page):
+    """Answer a revalidation of an HTML page with a 304 when ``state`` is unchanged.
+    
+    ``state`` lists everything the page body depends on, including the page
+    position; the viewer (whose name is in the navbar) is added here.
+    ``last_modified`` is the latest change to the rows shown, or None. It is
+    sent, but only If-None-Match is answered: a date cannot tell pages or
+    viewers apart, nor see a trip pass its booking or cancellation cutoff.
+    A page with pending flash messages is rendered and sent without
+    validators, so it is never reused.
+    """
+    if len(messages.get_messages(request)):
+        return render_page()
+    user = request.user
+    viewer = f"{user.pk}:{user.first_name or user.username}" if user.is_authenticated else 'anon'
+    raw = '|'.join(str(part) for part in [*state, viewer])
+    etag = quote_etag(hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest())
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render_page()
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    # Revalidate every time: seats change, and the page is the viewer's own
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
 
 
+@replicas.replica_reads
 def travel_list(request):
     """Display list of available travel options with search and filter functionality"""
     form = TravelSearchForm(request.GET)
-    travels = TravelOption.objects.filter(departure_date__gte=timezone.now().date())
     
-    if form.is_valid():
-        source = form.cleaned_data.get('source')
-        destination = form.cleaned_data.get('destination')
-        travel_type = form.cleaned_data.get('travel_type')
-        departure_date = form.cleaned_data.get('departure_date')
-        
-        if source:
-            travels = travels.filter(source__icontains=source)
-        if destination:
-            travels = travels.filter(destination__icontains=destination)
-        if travel_type:
-            travels = travels.filter(type=travel_type)
-        if departure_date:
-            travels = travels.filter(departure_date=departure_date)
-    
-    # Pagination
-    paginator = Paginator(travels, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Filtering, pagination and the result cache live in booking.search
+    page_obj = search_travel_page(form, request)
+    
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+        'travels': page_obj,
+    }
+    return render(request, 'booking/travel_list.html', context)
+
+
+@replicas.replica_reads
+async def travel_list_async(request):
+    """travel_list for ASGI: search, cache and pagination run on the async ORM and cache"""
+    # Resolve the user (and load the session) before the template reads them
+    request.user = await request.auser()
+    form = TravelSearchForm(request.GET)
+    page_obj = await asearch_travel_page(form, request)
     
     context = {
         'form': form,
@@ -87,27 +137,35 @@ def profile(request):
 
 
 @login_required
+@replicas.pins_primary
+@idempotency.idempotent('book_travel')
 def book_travel(request, travel_id):
     """Book a travel option"""
     travel = get_object_or_404(TravelOption, id=travel_id)
+    held_seats = SeatHold.objects.held_by(travel, request.user)
     
-    if not travel.is_available:
+    if not travel.is_available_for(held_seats):
         messages.error(request, 'This travel option is no longer available.')
         return redirect('travel_list')
     
     if request.method == 'POST':
-        form = BookingForm(request.POST, travel_option=travel)
+        form = BookingForm(request.POST, travel_option=travel, held_seats=held_seats)
         
         if form.is_valid():
             try:
                 with transaction.atomic():
-                    # Check availability again within transaction
-                    travel.refresh_from_db()
                     seats_requested = form.cleaned_data['number_of_seats']
                     
-                    if travel.available_seats < seats_requested:
+                    # Convert the hold taken when the page opened; only the
+                    # difference to the requested seats touches the option row
+                    held = SeatHold.objects.take(travel, request.user)
+                    if seats_requested > held and not travel.reserve_seats(seats_requested - held):
+                        # Keep the hold: undo its deletion along with everything else
+                        transaction.set_rollback(True)
                         messages.error(request, 'Not enough seats available.')
                         return redirect('book_travel', travel_id=travel_id)
+                    if seats_requested < held:
+                        travel.release_seats(held - seats_requested)
                     
                     # Create booking
                     booking = form.save(commit=False)
@@ -115,10 +173,7 @@ def book_travel(request, travel_id):
                     booking.travel_option = travel
                     booking.total_price = travel.price * seats_requested
                     booking.save()
-                    
-                    # Update available seats
-                    travel.available_seats -= seats_requested
-                    travel.save()
+                    idempotency.remember(request, booking=booking)
                     
                     messages.success(request, f'Booking confirmed! Your booking ID is {booking.booking_id}')
                     return redirect('my_bookings')
@@ -126,9 +181,25 @@ def book_travel(request, travel_id):
             except Exception as e:
                 messages.error(request, 'An error occurred while processing your booking. Please try again.')
                 return redirect('book_travel', travel_id=travel_id)
+        hold = None
     else:
+        # Hold seats while the form is filled in (a reload extends the hold,
+        # and a hold the user has on another option is given back)
+        try:
+            seats = min(max(int(request.GET.get('seats', held_seats or 1)), 1), 10)
+        except ValueError:
+            seats = held_seats or 1
+        hold = SeatHold.objects.place(travel, request.user, seats)
+        if hold is None:
+            messages.warning(request, f'{seats} seat(s) could not be held for you; availability is checked again when you confirm.')
+        else:
+            held_seats = hold.seats
+            travel.refresh_from_db(fields=['available_seats'])
+        
         # Pre-fill contact information from user profile
         initial_data = {
+            'idempotency_key': idempotency.new_key(),
+            'number_of_seats': held_seats or 1,
             'contact_email': request.user.email,
         }
         try:
@@ -138,54 +209,129 @@ def book_travel(request, travel_id):
         except UserProfile.DoesNotExist:
             pass
         
-        form = BookingForm(travel_option=travel, initial=initial_data)
+        form = BookingForm(travel_option=travel, held_seats=held_seats, initial=initial_data)
     
     context = {
         'form': form,
         'travel': travel,
+        'hold': hold,
     }
     return render(request, 'booking/book_travel.html', context)
 
 
 @login_required
-def my_bookings(request):
-    """Display user's bookings"""
-    bookings = Booking.objects.filter(user=request.user)
+@replicas.pins_primary
+@idempotency.idempotent('book_itinerary')
+def book_itinerary(request):
+    """Book several travel options (e.g. outbound and return) in one go, all or nothing"""
+    legs_param = request.POST.get('legs') if request.method == 'POST' else request.GET.get('legs', '')
+    try:
+        travels = ItineraryBookingForm.parse_legs(legs_param or '')
+    except ValidationError as e:
+        messages.error(request, e.messages[0])
+        return redirect('travel_list')
     
-    # Pagination
-    paginator = Paginator(bookings, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if request.method == 'POST':
+        form = ItineraryBookingForm(request.POST)
+        
+        if form.is_valid():
+            seats = form.cleaned_data['number_of_seats']
+            try:
+                itinerary = Itinerary.objects.book(
+                    request.user,
+                    [(travel, seats, form.cleaned_data['passenger_names']) for travel in form.cleaned_data['legs']],
+                    contact_email=form.cleaned_data['contact_email'],
+                    contact_phone=form.cleaned_data['contact_phone'],
+                )
+            except SeatsUnavailable as e:
+                messages.error(request, f'Not enough seats left on {e.travel_option.travel_id}; nothing was booked.')
+                return redirect(f"{reverse('book_itinerary')}?legs={','.join(str(travel.id) for travel in travels)}")
+            
+            idempotency.remember(request, itinerary=itinerary)
+            messages.success(request, f'Itinerary confirmed! Your itinerary reference is {itinerary.reference}')
+            return redirect('my_bookings')
+    else:
+        initial_data = {
+            'legs': ','.join(str(travel.id) for travel in travels),
+            'idempotency_key': idempotency.new_key(),
+            'contact_email': request.user.email,
+        }
+        try:
+            profile = request.user.userprofile
+            if profile.phone:
+                initial_data['contact_phone'] = profile.phone
+        except UserProfile.DoesNotExist:
+            pass
+        form = ItineraryBookingForm(initial=initial_data)
     
     context = {
-        'page_obj': page_obj,
-        'bookings': page_obj,
+        'form': form,
+        'travels': travels,
+        'price_per_seat': sum(travel.price for travel in travels),
     }
-    return render(request, 'booking/my_bookings.html', context)
+    return render(request, 'booking/book_itinerary.html', context)
 
 
 @login_required
+@replicas.replica_reads
+def my_bookings(request):
+    """Display user's bookings, live and archived (departed trips) as one list"""
+    bookings = Booking.objects.filter(user=request.user).with_cancellable()
+    archived = ArchivedBooking.objects.filter(user=request.user).select_related('travel_option', 'itinerary')
+    
+    # Any booking or option change, a new or archived booking, or a booking
+    # passing its cancellation cutoff changes these aggregates
+    live_state = bookings.aggregate(
+        count=Count('id'),
+        cancellable=Count('id', filter=Q(cancellable=True)),
+        booking_updated=Max('updated_at'),
+        travel_updated=Max('travel_option__updated_at'),
+    )
+    archived_state = archived.aggregate(count=Count('id'), archived=Max('archived_at'))
+    changes = [
+        stamp
+        for stamp in (live_state['booking_updated'], live_state['travel_updated'], archived_state['archived'])
+        if stamp
+    ]
+    # Each page has its own validator, as TravelSearch.position does for searches
+    if settings.BOOKING_CURSOR_PAGINATION:
+        position = ['cursor', request.GET.get('cursor', '')]
+    else:
+        position = ['page', request.GET.get('page', '')]
+    
+    def render_page():
+        page_obj = paginate_merged(request, [bookings, archived], BOOKING_CURSOR_ORDERING)
+        context = {
+            'page_obj': page_obj,
+            'bookings': page_obj,
+        }
+        return render(request, 'booking/my_bookings.html', context)
+    
+    return _conditional_page(
+        request, [*position, *live_state.values(), *archived_state.values()], max(changes, default=None), render_page
+    )
+
+
+@login_required
+@replicas.pins_primary
+@idempotency.idempotent('cancel_booking')
 def cancel_booking(request, booking_id):
     """Cancel a booking"""
-    booking = get_object_or_404(Booking, booking_id=booking_id, user=request.user)
+    booking = get_object_or_404(Booking.objects.with_cancellable(), booking_id=ids.normalize(booking_id), user=request.user)
     
-    if not booking.can_cancel():
+    if not booking.cancellable:
         messages.error(request, 'This booking cannot be cancelled.')
         return redirect('my_bookings')
     
     if request.method == 'POST':
         try:
             with transaction.atomic():
-                # Update booking status
-                booking.status = 'cancelled'
-                booking.save()
-                
-                # Restore available seats
-                travel = booking.travel_option
-                travel.available_seats += booking.number_of_seats
-                travel.save()
-                
-                messages.success(request, 'Booking cancelled successfully!')
+                # Flip the status and restore the seats in one step
+                if booking.cancel():
+                    idempotency.remember(request, booking=booking)
+                    messages.success(request, 'Booking cancelled successfully!')
+                else:
+                    messages.error(request, 'This booking has already been cancelled.')
         except Exception as e:
             messages.error(request, 'An error occurred while cancelling your booking. Please try again.')
         
@@ -193,14 +339,189 @@ def cancel_booking(request, booking_id):
     
     context = {
         'booking': booking,
+        'idempotency_key': idempotency.new_key(),
     }
     return render(request, 'booking/cancel_booking.html', context)
 
 
+def _travel_detail_state(travel):
+    # The Book button also depends on the date: departed options close
+    return [travel.pk, travel.updated_at.isoformat(), travel.is_available]
+
+
+@replicas.replica_reads
 def travel_detail(request, travel_id):
-    """Display travel option details"""
+    """Display travel option details; a revalidation costs only the option lookup"""
     travel = get_object_or_404(TravelOption, id=travel_id)
-    context = {
-        'travel': travel,
+    
+    def render_page():
+        context = {
+            'travel': travel,
+        }
+        return render(request, 'booking/travel_detail.html', context)
+    
+    return _conditional_page(request, _travel_detail_state(travel), travel.updated_at, render_page)
+
+
+@replicas.replica_reads
+async def travel_detail_async(request, travel_id):
+    """travel_detail for ASGI"""
+    request.user = await request.auser()
+    travel = await aget_object_or_404(TravelOption, id=travel_id)
+    
+    def render_page():
+        context = {
+            'travel': travel,
+        }
+        return render(request, 'booking/travel_detail.html', context)
+    
+    return _conditional_page(request, _travel_detail_state(travel), travel.updated_at, render_page)
+
+
+def serialize_travel_option(travel):
+    """Compact JSON representation of a TravelOption for the API"""
+    return {
+        'id': travel.id,
+        'travel_id': travel.travel_id,
+        'type': travel.type,
+        'source': travel.source,
+        'destination': travel.destination,
+        'departure_date': travel.departure_date.isoformat(),
+        'departure_time': travel.departure_time.isoformat(timespec='minutes'),
+        'arrival_date': travel.arrival_date.isoformat(),
+        'arrival_time': travel.arrival_time.isoformat(timespec='minutes'),
+        'price': str(travel.price),
+        'available_seats': travel.available_seats,
+        'total_seats': travel.total_seats,
     }
-    return render(request, 'booking/travel_detail.html', context)
+
+
+def _conditional_json(request, etag, build_payload):
+    """Answer If-None-Match with a 304, otherwise build and send the payload"""
+    etag = quote_etag(etag)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(build_payload(), json_dumps_params={'separators': (',', ':')})
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+@require_GET
+def api_travel_search(request):
+    """JSON search over travel options, accepting the same parameters as travel_list"""
+    form = TravelSearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    
+    # The fingerprint embeds the route versions bumped on every seat, price or
+    # schedule change, so an unchanged ETag is answered without the option query
+    search = TravelSearch(form, request)
+    
+    def build_payload():
+        page_obj = search.page()
+        payload = {'results': [serialize_travel_option(travel) for travel in page_obj]}
+        if getattr(page_obj, 'is_cursor', False):
+            payload['next_cursor'] = page_obj.next_cursor
+            payload['previous_cursor'] = page_obj.previous_cursor
+        else:
+            payload['page'] = page_obj.number
+            payload['num_pages'] = page_obj.paginator.num_pages
+            payload['count'] = page_obj.paginator.count
+        return payload
+    
+    return _conditional_json(request, search.fingerprint, build_payload)
+
+
+@require_GET
+def api_travel_detail(request, travel_id):
+    """JSON detail for one travel option"""
+    route = TravelOption.objects.filter(id=travel_id).values_list('source_city_id', 'destination_city_id').first()
+    if route is None:
+        return JsonResponse({'error': 'Travel option not found.'}, status=404)
+    
+    versions = get_versions(version_scopes([route[0]], [route[1]]))
+    etag = f"{travel_id}-" + '-'.join(str(version) for version in versions)
+    
+    def build_payload():
+        return serialize_travel_option(get_object_or_404(TravelOption, id=travel_id))
+    
+    return _conditional_json(request, etag, build_payload)
+
+
+CALENDAR_DAYS = 30
+MAX_CALENDAR_DAYS = 90
+
+
+@require_GET
+def api_route_calendar(request):
+    """Cheapest fare, seats left and departures per day for a route, from RouteDaySummary"""
+    form = TravelSearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    if not form.cleaned_data['source'] or not form.cleaned_data['destination']:
+        return JsonResponse({'errors': {'__all__': ['Both source and destination are required.']}}, status=400)
+    try:
+        days = min(max(int(request.GET.get('days', CALENDAR_DAYS)), 1), MAX_CALENDAR_DAYS)
+    except ValueError:
+        return JsonResponse({'errors': {'days': ['Enter a whole number.']}}, status=400)
+    
+    start = form.cleaned_data['departure_date'] or timezone.now().date()
+    source_ids, destination_ids = form.route_city_ids()
+    summaries = RouteDaySummary.objects.filter(
+        source_city__in=source_ids,
+        destination_city__in=destination_ids,
+        departure_date__gte=max(start, timezone.now().date()),
+        departure_date__lt=start + timezone.timedelta(days=days),
+    )
+    if form.cleaned_data['travel_type']:
+        summaries = summaries.filter(type=form.cleaned_data['travel_type'])
+    
+    # One row per day and type; fold the types (and matched cities) together
+    calendar = summaries.values('departure_date').annotate(
+        min_price=Min('min_price'),
+        available_seats=Sum('available_seats'),
+        departures=Sum('departures'),
+    ).order_by('departure_date')
+    return JsonResponse({
+        'days': [
+            {
+                'date': day['departure_date'].isoformat(),
+                # SQLite hands aggregates back unquantized
+                'min_price': str(day['min_price'].quantize(Decimal('0.01'))),
+                'available_seats': day['available_seats'],
+                'departures': day['departures'],
+            }
+            for day in calendar
+        ],
+    })
+
+
+@staff_member_required
+def travel_manifest(request, travel_id):
+    """Passenger manifest of a travel option as CSV (staff only)"""
+    travel = get_object_or_404(TravelOption, id=travel_id)
+    header = ['booking_id', 'passenger_no', 'name', 'contact_email', 'contact_phone']
+    rows = Passenger.objects.manifest(travel).iterator()
+    response = StreamingHttpResponse(exports.csv_lines(header, rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="manifest-{travel.travel_id}.csv"'
+    return response
+
+
+@staff_member_required
+def export_bookings(request):
+    """Bookings joined with their travel option and user as CSV, streamed (staff only)"""
+    form = BookingExportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text(), content_type='text/plain')
+    rows = exports.iter_rows(exports.booking_export(**form.cleaned_data))
+    response = StreamingHttpResponse(exports.csv_lines(exports.HEADER, rows), content_type='text/csv')
+    filename = '-'.join(['bookings'] + [str(form.cleaned_data[field]) for field in ('date_from', 'date_to') if form.cleaned_data[field]])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+@staff_member_required
+def metrics(request):
+    """Per-view latency and query metrics in Prometheus text format (staff only)"""
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
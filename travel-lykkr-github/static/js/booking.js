@@ -0,0 +1,15 @@
+// Real-time price calculation on the booking pages: the total is the
+// seat count times data-price-per-seat of #total-amount
+document.addEventListener('DOMContentLoaded', function() {
+    const seatsInput = document.getElementById('id_number_of_seats');
+    const totalAmount = document.getElementById('total-amount');
+
+    if (seatsInput && totalAmount) {
+        const pricePerSeat = parseFloat(totalAmount.dataset.pricePerSeat);
+        seatsInput.addEventListener('input', function() {
+            const seats = parseInt(this.value) || 1;
+            const total = seats * pricePerSeat;
+            totalAmount.textContent = '₹' + total.toFixed(2);
+        });
+    }
+});
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'travellykkr.settings')
+# Serve the browsing views with the async ORM instead of the sync-to-async thread pool
+os.environ.setdefault('BOOKING_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -25,10 +25,51 @@ DATABASES = {
 }
 """
 
+# Cache shared by all workers on the host, so search cache invalidation
+# (booking.cache) is seen by every process. A file-based cache lists its
+# directory on every write and deletes a third of its files at random once
+# MAX_ENTRIES is reached, so search results (a few per search, for 5
+# minutes) are capped on their own, and the keys that must not be culled
+# get aliases sized never to fill up. With Redis or Memcached available,
+# point every alias at it instead.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'default'),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Route versions and hit/miss counters: a few keys per route
+    'search_state': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'search_state'),
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+    # Request metric snapshots: one key per worker plus the worker index
+    'metrics': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'metrics'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'fragments'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
 # Static files settings for production
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# collectstatic writes content-hashed names (base.<hash>.css) plus .gz/.br
+# copies, which can be cached for a year; see booking.staticfiles
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'booking.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+# Set to False when the web server serves STATIC_ROOT at STATIC_URL itself
+SERVE_STATIC = True
+
 # Security headers
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'booking.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,13 +77,63 @@ WSGI_APPLICATION = 'travellykkr.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuned for concurrent bookings (see `manage.py benchmark_sqlite_profile`):
+# - WAL lets pages be read while a booking writes, and synchronous=NORMAL
+#   is durable across application crashes in WAL mode, fsyncing only at checkpoints
+# - timeout: seconds a connection waits for the write lock before
+#   "database is locked"
+# - IMMEDIATE takes the write lock at BEGIN, so two transactions that
+#   read first can never both wait to upgrade to it
+SQLITE_OPTIONS = {
+    'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+    'timeout': 20,
+    'transaction_mode': 'IMMEDIATE',
+}
+
+# Route travel_list and travel_detail to their async versions. asgi.py turns
+# this on; under WSGI every async view would need its own event loop per request
+BOOKING_ASYNC_VIEWS = os.environ.get('BOOKING_ASYNC_VIEWS', '0') == '1'
+
+# Keep connections open across requests instead of reconnecting (and
+# re-running the pragmas) on every one. Django advises against persistent
+# connections under ASGI, so the async mode closes them after each request
+CONN_MAX_AGE = 0 if BOOKING_ASYNC_VIEWS else 600
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas (booking.replicas): travel_list, travel_detail and
+# my_bookings read from these. BOOKING_REPLICA_SQLITE lists SQLite files
+# separated by commas, e.g. copies of db.sqlite3 to try it locally; in
+# production, add the replica databases here under their own aliases.
+DATABASE_REPLICAS = []
+for number, name in enumerate(filter(None, os.environ.get('BOOKING_REPLICA_SQLITE', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name.strip(),
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        # Tests read the test primary through this alias
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['booking.replicas.PrimaryReplicaRouter']
+
+# The longest replicas are expected to lag. A user's browsing views keep
+# reading from the primary this long after they book or cancel, so they see
+# their own change, and searches over a route changed this recently are
+# cached from the primary
+REPLICA_PIN_SECONDS = 15
+
 # For production, use MySQL:
 # DATABASES = {
 #     'default': {
@@ -98,6 +150,55 @@ DATABASES = {
 # }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per process; deployments with several workers should use a
+# shared backend (see production_settings.py) so search invalidation reaches all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'travellykkr',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Search cache versions and hit/miss counters (booking.cache): a few
+    # keys per route, never culled, or stale search results could return
+    'search_state': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'travellykkr-search-state',
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+    # Per-worker request metric snapshots (booking.metrics), one key per
+    # worker; a culled snapshot would read as a counter reset
+    'metrics': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'travellykkr-metrics',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Also picked up by the {% cache %} template tag
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'travellykkr-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Travel search result cache (booking.search)
+TRAVEL_SEARCH_CACHE_ALIAS = 'default'
+TRAVEL_SEARCH_CACHE_TIMEOUT = 300
+TRAVEL_SEARCH_STATE_CACHE_ALIAS = 'search_state'
+
+# Rendered travel cards and detail bodies (booking.fragments)
+TRAVEL_CARD_CACHE = True
+TRAVEL_CARD_CACHE_ALIAS = 'template_fragments'
+TRAVEL_CARD_CACHE_TIMEOUT = 60 * 60
+
+# Request metrics (booking.metrics): each worker publishes its totals to
+# this cache every METRICS_FLUSH_INTERVAL seconds; /metrics/ sums them
+METRICS_CACHE_ALIAS = 'metrics'
+METRICS_FLUSH_INTERVAL = 10
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -137,6 +238,10 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# Serve STATIC_ROOT from Django with far-future caching and pre-compressed
+# variants (booking.staticfiles.serve), for hosts without a static file server
+SERVE_STATIC = False
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -146,6 +251,19 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+# Keyset pagination for travel_list and my_bookings: next/previous links
+# with opaque cursors instead of page numbers (no COUNT(*) or OFFSET)
+BOOKING_CURSOR_PAGINATION = False
+
+# Seconds a seat hold taken when the booking page opens stays valid;
+# run `manage.py expire_seat_holds` every minute to return expired holds
+SEAT_HOLD_TTL = 10 * 60
+
+# Seconds the outcome of a booking or cancellation POST is kept for replay
+# to clients that retry with the same Idempotency-Key; run
+# `manage.py purge_idempotency_keys` daily to delete older keys
+IDEMPOTENCY_KEY_RETENTION = 24 * 60 * 60
+
 # Login/Logout URLs
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'travel_list'